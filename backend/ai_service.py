@@ -1,43 +1,343 @@
 import os
+import ast
+import re
+import json
+import time
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-def query_code(file_path: str, user_query: str) -> str:
-    # Construct full path to the file in the mounted volume
-    # Assuming the file_path passed is relative to the project root (e.g. "main.py")
-    # and the project root is mounted at /app/projects/test_project/
-    # Note: In a real app, we'd need to handle the project path dynamically or pass it in.
-    # For this task, we assume the test project path.
-    
-    base_path = "/app/projects/test_project"
-    full_path = os.path.join(base_path, file_path)
-    
-    # Check if file exists
-    if not os.path.exists(full_path):
-        # Fallback for local testing if not in docker
-        # Try to find it relative to current working directory if possible
-        # This is just for the agent's verification script to work if run locally
-        local_base = os.path.abspath(os.path.join(os.getcwd(), "../projects/test_project"))
-        full_path = os.path.join(local_base, file_path)
-        
-        if not os.path.exists(full_path):
-            return f"Error: File {file_path} not found."
+import numpy as np
 
+from database import pooled_connection
+from metrics import phase_duration
+
+# Legacy location of the single demo project, used when a query names no project.
+DEFAULT_PROJECT_ROOT = "/app/projects/test_project"
+
+# Longest chunk handed to the model; longer definitions are split into windows.
+CHUNK_MAX_LINES = 60
+# Chunks quoted back to the model for one question.
+TOP_K = 4
+# Files whose chunk embeddings are kept in the chunk_embeddings table, least
+# recently used first out.
+EMBEDDING_CACHE_FILES = int(os.environ.get("DARKTORCH_EMBEDDING_CACHE_FILES", "5000"))
+# Files and questions kept in memory, so repeating a question about an
+# unchanged file costs one stat call.
+MEMORY_CACHE_FILES = 64
+MEMORY_CACHE_QUERIES = 256
+
+_DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+_TOKEN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+# --- Chunking ---
+
+def _line_chunks(lines: List[str], start: int, end: int, name: str, max_lines: int) -> List[Dict[str, Any]]:
+    chunks = []
+    for window_start in range(start, end + 1, max_lines):
+        window_end = min(end, window_start + max_lines - 1)
+        text = "\n".join(lines[window_start - 1:window_end])
+        if text.strip():
+            chunks.append({"name": name, "start": window_start, "end": window_end, "text": text})
+    return chunks
+
+def _start_line(node: ast.AST) -> int:
+    # Decorators belong to the definition they decorate
+    decorators = getattr(node, "decorator_list", None) or []
+    return min([node.lineno] + [decorator.lineno for decorator in decorators])
+
+def _body_chunks(body: List[ast.stmt], lines: List[str], label: str, qualprefix: str, max_lines: int,
+                 group: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    # Every function and class becomes its own chunk; the statements between
+    # them are grouped into chunks of at most max_lines lines.
+    chunks = []
+    for node in body:
+        start, end = _start_line(node), node.end_lineno
+        if isinstance(node, _DEFINITIONS):
+            if group is not None:
+                chunks.extend(_line_chunks(lines, group[0], group[1], label, max_lines))
+                group = None
+            qualname = qualprefix + node.name
+            if isinstance(node, ast.ClassDef):
+                if end - start < max_lines:
+                    chunks.extend(_line_chunks(lines, start, end, f"class {qualname}", max_lines))
+                else:
+                    # Too long as a whole: one chunk per method plus the class header
+                    chunks.extend(_body_chunks(node.body, lines, f"class {qualname}", qualname + ".",
+                                               max_lines, [start, node.lineno]))
+            else:
+                chunks.extend(_line_chunks(lines, start, end, f"def {qualname}", max_lines))
+        elif group is None:
+            group = [start, end]
+        elif end - group[0] < max_lines:
+            group[1] = end
+        else:
+            chunks.extend(_line_chunks(lines, group[0], group[1], label, max_lines))
+            group = [start, end]
+    if group is not None:
+        chunks.extend(_line_chunks(lines, group[0], group[1], label, max_lines))
+    return chunks
+
+def chunk_source(source: str, max_lines: int = CHUNK_MAX_LINES) -> List[Dict[str, Any]]:
+    """
+    Splits Python source into chunks along its AST.
+
+    Returns {"name", "start", "end", "text"} dicts in file order: one per
+    function or class (methods separately when a class is longer than
+    max_lines), and one per run of other statements. Source that does not
+    parse is cut into plain max_lines windows.
+    """
+    lines = source.replace("\r\n", "\n").replace("\r", "\n").split("\n")
     try:
-        with open(full_path, "r", encoding="utf-8") as f:
-            content = f.read()
-            
-        # Simulate MCP connection
-        print("Simulating query against potential MCP knowledge base...")
-        
-        # Create simulated response
-        snippet = content[:50].replace("\n", " ") + "..." if len(content) > 50 else content.replace("\n", " ")
-        response = (
-            f"AI Analysis for {file_path}:\n"
-            f"The AI suggests that based on your question about '{user_query}', "
-            f"the file {file_path} contains: '{snippet}'\n"
-            f"It seems to be a valid Python file."
-        )
-        
-        return response
-        
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return _line_chunks(lines, 1, len(lines), "module", max_lines)
+    return _body_chunks(tree.body, lines, "module", "", max_lines)
+
+# --- Model backends ---
+
+class StubBackend:
+    """
+    Local deterministic backend, used by default and in tests.
+
+    Embeddings hash the identifier parts of a text ("loadGraph" and
+    "load_graph" both give "load" and "graph") into a fixed number of signed
+    buckets, so texts sharing words point the same way. Answers quote the
+    retrieved chunks instead of calling a language model.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"stub-hash-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashes = np.array([zlib.crc32(token.lower().encode()) for token in _TOKEN.findall(text)], dtype=np.uint32)
+            if len(hashes):
+                signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+                np.add.at(vectors[row], hashes % self.dim, signs)
+        return _normalized(vectors)
+
+    def answer(self, file_path: str, query: str, chunks: List[Dict[str, Any]]) -> str:
+        lines = [
+            f"AI Analysis for {file_path}:",
+            f"The AI suggests that based on your question about '{query}', "
+            f"the most relevant parts of {file_path} are:",
+        ]
+        for chunk in chunks:
+            first_line = chunk["text"].strip().split("\n", 1)[0]
+            lines.append(f"- {chunk['name']} (lines {chunk['start']}-{chunk['end']}, "
+                         f"similarity {chunk['score']:.2f}): '{first_line}'")
+        if not chunks:
+            lines.append("- nothing, the file is empty.")
+        return "\n".join(lines)
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+# Backends by name, selected with DARKTORCH_AI_BACKEND. A backend has a
+# unique name (embeddings are cached per name), a dim, embed(texts) returning
+# unit-length float32 rows and answer(file_path, query, chunks) returning text.
+BACKENDS: Dict[str, Callable[[], Any]] = {"stub": StubBackend}
+_backend = None
+_backend_lock = threading.Lock()
+
+def register_backend(name: str, factory: Callable[[], Any]):
+    BACKENDS[name] = factory
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = BACKENDS[os.environ.get("DARKTORCH_AI_BACKEND", "stub")]()
+        return _backend
+
+def set_backend(backend):
+    """Replaces the active backend; in-memory caches are keyed by its name."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+# --- Embedding cache ---
+
+class _LRU:
+    def __init__(self, size: int):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+_file_cache = _LRU(MEMORY_CACHE_FILES)
+_query_cache = _LRU(MEMORY_CACHE_QUERIES)
+
+def _known_hash(conn, root_path: str, rel_path: str, st: os.stat_result) -> Optional[str]:
+    # The analysis cache already knows the hash of every unchanged file
+    row = conn.execute(
+        "SELECT mtime_ns, size, content_hash FROM file_analysis_cache WHERE root_path = ? AND rel_path = ?",
+        (root_path, rel_path)
+    ).fetchone()
+    if row is not None and row["mtime_ns"] == st.st_mtime_ns and row["size"] == st.st_size:
+        return row["content_hash"]
+    return None
+
+def _load_embeddings(conn, content_hash: str, model: str) -> Optional[Tuple[List[Dict[str, Any]], np.ndarray]]:
+    row = conn.execute(
+        "SELECT chunks, vectors FROM chunk_embeddings WHERE content_hash = ? AND model = ?", (content_hash, model)
+    ).fetchone()
+    if row is None:
+        return None
+    conn.execute("UPDATE chunk_embeddings SET last_used = ? WHERE content_hash = ? AND model = ?",
+                 (time.time(), content_hash, model))
+    conn.commit()
+    chunks = json.loads(row["chunks"])
+    vectors = np.frombuffer(row["vectors"], dtype=np.float32).reshape(len(chunks), -1)
+    return chunks, vectors
+
+def _save_embeddings(conn, content_hash: str, model: str, chunks: List[Dict[str, Any]], vectors: np.ndarray):
+    conn.execute(
+        """
+        INSERT INTO chunk_embeddings (content_hash, model, chunks, vectors, last_used) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (content_hash, model) DO UPDATE SET
+            chunks = excluded.chunks, vectors = excluded.vectors, last_used = excluded.last_used
+        """,
+        (content_hash, model, json.dumps(chunks), vectors.astype(np.float32).tobytes(), time.time())
+    )
+    conn.execute(
+        "DELETE FROM chunk_embeddings WHERE rowid IN "
+        "(SELECT rowid FROM chunk_embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+        (EMBEDDING_CACHE_FILES,)
+    )
+    conn.commit()
+
+def _file_embeddings(backend, root_path: str, rel_path: str, full_path: str,
+                     st: os.stat_result) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """
+    Returns the chunks of a file and their embeddings, one row per chunk.
+
+    Looked up in memory by (mtime, size), then in chunk_embeddings by content
+    hash (taken from the analysis cache when the file is unchanged), and only
+    computed when both miss. A database error degrades to computing them.
+    """
+    key = (backend.name, full_path)
+    cached = _file_cache.get(key)
+    if cached is not None and cached[0] == (st.st_mtime_ns, st.st_size):
+        return cached[1], cached[2]
+
+    source = None
+    content_hash = None
+    result = None
+    try:
+        with pooled_connection() as conn:
+            content_hash = _known_hash(conn, root_path, rel_path, st)
+            if content_hash is None:
+                with open(full_path, "rb") as f:
+                    source = f.read()
+                content_hash = hashlib.sha1(source).hexdigest()
+            result = _load_embeddings(conn, content_hash, backend.name)
+    except OSError:
+        raise
+    except Exception as e:
+        print(f"Embedding cache unavailable: {e}")
+
+    if result is None:
+        if source is None:
+            with open(full_path, "rb") as f:
+                source = f.read()
+        chunks = chunk_source(source.decode("utf-8", "replace"))
+        with phase_duration.time(phase="embed"):
+            vectors = backend.embed([f"{chunk['name']}\n{chunk['text']}" for chunk in chunks])
+        if content_hash is None:
+            content_hash = hashlib.sha1(source).hexdigest()
+        try:
+            with pooled_connection() as conn:
+                _save_embeddings(conn, content_hash, backend.name, chunks, vectors)
+        except Exception as e:
+            print(f"Error saving embeddings: {e}")
+        result = chunks, vectors
+
+    _file_cache.put(key, ((st.st_mtime_ns, st.st_size), result[0], result[1]))
+    return result
+
+def _query_vector(backend, query: str) -> np.ndarray:
+    key = (backend.name, query)
+    vector = _query_cache.get(key)
+    if vector is None:
+        with phase_duration.time(phase="embed"):
+            vector = backend.embed([query])[0]
+        _query_cache.put(key, vector)
+    return vector
+
+def top_chunks(chunks: List[Dict[str, Any]], vectors: np.ndarray, query_vector: np.ndarray,
+               k: int = TOP_K) -> List[Dict[str, Any]]:
+    """The k chunks most similar to the query, best first, each with its cosine "score"."""
+    if not chunks:
+        return []
+    # Rows are unit length, so one matrix-vector product gives every cosine
+    scores = vectors @ query_vector
+    k = min(k, len(chunks))
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best], kind="stable")]
+    return [dict(chunks[i], score=float(scores[i])) for i in best]
+
+# --- Queries ---
+
+def _resolve(root_path: str, file_path: str) -> Optional[str]:
+    full_path = os.path.realpath(os.path.join(root_path, file_path))
+    root = os.path.realpath(root_path)
+    if full_path != root and not full_path.startswith(root + os.sep):
+        return None
+    return full_path
+
+def _default_root() -> str:
+    if os.path.isdir(DEFAULT_PROJECT_ROOT):
+        return DEFAULT_PROJECT_ROOT
+    # Fallback for local testing outside docker
+    return os.path.abspath(os.path.join(os.getcwd(), "../projects/test_project"))
+
+def query_code(file_path: str, user_query: str, root_path: Optional[str] = None, top_k: int = TOP_K) -> str:
+    """
+    Answers a question about one file of a project.
+
+    file_path is relative to root_path, the project's local_path (the legacy
+    demo project when omitted). The file's chunks most similar to the
+    question are retrieved and handed to the active backend.
+    """
+    root_path = os.path.abspath(root_path or _default_root())
+    full_path = _resolve(root_path, file_path)
+    try:
+        st = os.stat(full_path) if full_path else None
+    except OSError:
+        st = None
+    if st is None:
+        return f"Error: File {file_path} not found."
+
+    backend = get_backend()
+    try:
+        rel_path = os.path.relpath(full_path, os.path.realpath(root_path)).replace("\\", "/")
+        chunks, vectors = _file_embeddings(backend, root_path, rel_path, full_path, st)
     except Exception as e:
         return f"Error reading file: {str(e)}"
+
+    context = top_chunks(chunks, vectors, _query_vector(backend, user_query), top_k)
+    return backend.answer(file_path, user_query, context)
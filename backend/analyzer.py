@@ -1,77 +1,673 @@
 import os
 import ast
-from typing import List, Dict, Any
+import json
+import hashlib
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 
-def analyze_project(root_path: str) -> Dict[str, List[Dict[str, Any]]]:
-    nodes = []
-    edges = []
-    
-    # 1. Scan for all Python files (Nodes)
-    # Map relative path to absolute path for easy lookup later if needed, 
-    # but primarily we need a set of valid relative paths to validate imports.
+from database import pooled_connection
+from module_index import ModuleIndex
+from compact_graph import CompactGraph
+import search
+import metrics
+from metrics import PhaseTimer
+
+# Bump whenever the shape of the cached per-file data changes so stale rows
+# are re-parsed instead of being misread.
+CACHE_VERSION = 4
+
+# Number of processes used to parse files. 1 keeps parsing in the calling thread.
+ANALYSIS_WORKERS = int(os.environ.get("DARKTORCH_ANALYSIS_WORKERS", "1"))
+# Below this many files the process pool start-up costs more than it saves.
+PARALLEL_MIN_FILES = 64
+MIN_CHUNK_BYTES = 64 * 1024
+MAX_CHUNK_BYTES = 4 * 1024 * 1024
+
+# "scan" only parses the import statements found by a lexical scan,
+# "walk" parses the whole file and walks every node of its AST.
+IMPORT_ENGINE = os.environ.get("DARKTORCH_IMPORT_ENGINE", "scan")
+
+# One import statement (or one module of `import a, b`): (module, level, names).
+# names is None for `import module`, and the imported names for
+# `from module import names`; level is the number of leading dots.
+ImportRecord = Tuple[str, int, Optional[Tuple[str, ...]]]
+
+def _scan_python_files(root_path: str) -> Iterator[Tuple[str, str, os.stat_result]]:
+    """
+    Walks the project tree and yields (rel_path, full_path, stat) for every .py file.
+
+    Uses os.scandir so the directory walk and the stat pass happen together,
+    in the same order os.walk would visit the files.
+    """
+    pending = [root_path]
+
+    while pending:
+        dirpath = pending.pop()
+        try:
+            entries = list(os.scandir(dirpath))
+        except OSError as e:
+            print(f"Error scanning directory {dirpath}: {e}")
+            continue
+
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.endswith(".py") and entry.is_file():
+                    rel_path = os.path.relpath(entry.path, root_path).replace("\\", "/")
+                    yield rel_path, entry.path, entry.stat()
+            except OSError as e:
+                print(f"Error reading {entry.path}: {e}")
+
+        # Reverse so that popping from the end visits subdirectories in listing order
+        pending.extend(reversed(subdirs))
+
+def scan_file_states(root_path: str) -> Dict[str, Tuple[int, int]]:
+    """Returns {rel_path: (mtime_ns, size)} for every Python file of the project."""
+    return {rel_path: (st.st_mtime_ns, st.st_size) for rel_path, _, st in _scan_python_files(root_path)}
+
+def _collect_import(node_ast: ast.AST, imported_names: List[ImportRecord]):
+    if isinstance(node_ast, ast.Import):
+        for alias in node_ast.names:
+            imported_names.append((alias.name, 0, None))
+    elif isinstance(node_ast, ast.ImportFrom):
+        imported_names.append((node_ast.module or "", node_ast.level or 0,
+                               tuple(alias.name for alias in node_ast.names)))
+
+_FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+_SYMBOL_NODES = _FUNCTION_NODES + (ast.ClassDef,)
+_BRANCH_NODES = (ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler)
+
+# Per-file metrics stored as node attributes:
+#   loc         lines holding code, i.e. neither blank nor comment-only
+#   functions   function and method definitions, nested ones included
+#   classes     class definitions, nested ones included
+#   complexity  cyclomatic complexity of the file taken as one unit: 1 plus
+#               one per if/elif, conditional expression, for, while, except
+#               clause, comprehension for/if and and/or operator
+# Both import engines count the same constructs, so the numbers do not depend
+# on DARKTORCH_IMPORT_ENGINE, except that the lexical scanner skips
+# expressions inside f-strings (about 1% of stdlib files differ by a few).
+_CODE_LINE = re.compile(rb"^[ \t\f]*[^ \t\f\r\n#]", re.MULTILINE)
+
+def _count_loc(source: bytes) -> int:
+    return len(_CODE_LINE.findall(source))
+
+def _branches(node_ast: ast.AST) -> int:
+    if isinstance(node_ast, _BRANCH_NODES):
+        return 1
+    if isinstance(node_ast, ast.BoolOp):
+        return len(node_ast.values) - 1
+    if isinstance(node_ast, ast.comprehension):
+        return 1 + len(node_ast.ifs)
+    return 0
+
+def _walk_imports(source: bytes, filename: str, symbols: Optional[List[str]] = None,
+                  file_metrics: Optional[Dict[str, int]] = None) -> List[ImportRecord]:
+    """
+    Parses the whole file and walks every node of its AST.
+
+    If a symbols list is given, the names of the top-level functions and
+    classes are appended to it; if a file_metrics dict is given, it is filled with
+    the file's metrics during the same walk.
+    """
+    tree = ast.parse(source, filename=filename)
+    imported_names = []
+
+    if file_metrics is None:
+        for node_ast in ast.walk(tree):
+            _collect_import(node_ast, imported_names)
+    else:
+        functions = classes = branches = 0
+        for node_ast in ast.walk(tree):
+            _collect_import(node_ast, imported_names)
+            if isinstance(node_ast, _FUNCTION_NODES):
+                functions += 1
+            elif isinstance(node_ast, ast.ClassDef):
+                classes += 1
+            else:
+                branches += _branches(node_ast)
+        file_metrics.update(loc=_count_loc(source), functions=functions, classes=classes, complexity=1 + branches)
+
+    if symbols is not None:
+        symbols.extend(node_ast.name for node_ast in tree.body if isinstance(node_ast, _SYMBOL_NODES))
+    return imported_names
+
+# Import statements can only start a line or follow ";" or the ":" of a
+# one-line compound statement, and definitions always start a line (top-level
+# ones at column 0). String literals and comments are matched too so that the
+# scanner jumps over them instead of looking inside.
+_SCAN_ALTERNATIVES = (
+    rb"""(?P<string>[rRbBuUfF]{0,2}(?:\"\"\"|'''|"|'))"""
+    rb"""|(?P<comment>\#)"""
+    rb"""|(?:^|[;:])[ \t]*(?P<stmt>(?:import|from)\b)"""
+    rb"""|^(?P<indent>[ \t]*)(?:async[ \t]+)?(?P<definition>def|class)[ \t]+(?P<symbol>[^\s(:\[]+)"""
+)
+_SCAN_PATTERN = re.compile(_SCAN_ALTERNATIVES, re.MULTILINE)
+# When metrics are wanted the scanner also stops at every branching keyword
+_METRICS_SCAN_PATTERN = re.compile(
+    _SCAN_ALTERNATIVES + rb"""|\b(?P<branch>if|elif|for|while|except|and|or)\b""",
+    re.MULTILINE
+)
+_STRING_END = {
+    b'"""': re.compile(rb'(?:[^"\\]|\\.|"(?!""))*"""', re.DOTALL),
+    b"'''": re.compile(rb"(?:[^'\\]|\\.|'(?!''))*'''", re.DOTALL),
+    b'"': re.compile(rb'(?:[^"\\\n]|\\.)*["\n]', re.DOTALL),
+    b"'": re.compile(rb"(?:[^'\\\n]|\\.)*['\n]", re.DOTALL),
+}
+
+def _statement_end(source: bytes, start: int) -> int:
+    # Extend the statement over bracketed and backslash continuations
+    end = source.find(b"\n", start)
+    while end != -1:
+        text = source[start:end]
+        if text.count(b"(") <= text.count(b")") and not text.rstrip(b"\r").endswith(b"\\"):
+            return end
+        end = source.find(b"\n", end + 1)
+    return len(source)
+
+def _scan_imports(source: bytes, filename: str, symbols: Optional[List[str]] = None,
+                  file_metrics: Optional[Dict[str, int]] = None) -> List[ImportRecord]:
+    """
+    Finds the same imports (and symbols and metrics) as _walk_imports without
+    building the file's AST.
+
+    A regex scanner skips strings and comments and stops only where an import
+    statement or a definition (or, for metrics, a branching keyword) can
+    begin; just the import statements are handed to ast.parse. If a snippet
+    does not parse on its own, the whole file falls back to the walk.
+    """
+    if file_metrics is None:
+        if b"import" not in source and b"def" not in source and b"class" not in source:
+            return []
+        pattern = _SCAN_PATTERN
+    else:
+        pattern = _METRICS_SCAN_PATTERN
+
+    found_symbols = []
+    functions = classes = branches = 0
+
+    imported_names = []
+    pos = 0
+    length = len(source)
+
+    while pos < length:
+        match = pattern.search(source, pos)
+        if match is None:
+            break
+
+        if match.lastgroup == "string":
+            quote = match.group("string").lstrip(b"rRbBuUfF")
+            end_match = _STRING_END[quote].match(source, match.end())
+            if end_match is None:
+                # Unterminated string: let the real parser report it
+                return _walk_imports(source, filename, symbols, file_metrics)
+            pos = end_match.end()
+        elif match.lastgroup == "comment":
+            end = source.find(b"\n", match.end())
+            pos = length if end == -1 else end
+        elif match.lastgroup == "branch":
+            branches += 1
+            pos = match.end()
+        elif match.lastgroup == "symbol":
+            if match.group("definition") == b"def":
+                functions += 1
+            else:
+                classes += 1
+            if not match.group("indent"):
+                found_symbols.append(match.group("symbol").decode("utf-8", "replace"))
+            pos = match.end()
+        else:
+            start = match.start("stmt")
+            end = _statement_end(source, start)
+            try:
+                statements = ast.parse(source[start:end], filename=filename).body
+            except SyntaxError:
+                return _walk_imports(source, filename, symbols, file_metrics)
+            for statement in statements:
+                _collect_import(statement, imported_names)
+            pos = end
+
+    if symbols is not None:
+        symbols.extend(found_symbols)
+    if file_metrics is not None:
+        file_metrics.update(loc=_count_loc(source), functions=functions, classes=classes, complexity=1 + branches)
+    return imported_names
+
+def _extract_imports(source: bytes, filename: str, symbols: Optional[List[str]] = None,
+                     file_metrics: Optional[Dict[str, int]] = None) -> List[ImportRecord]:
+    """
+    Returns the imports found anywhere in the given source, see ImportRecord,
+    appends the top-level function and class names to symbols and fills
+    file_metrics with the file's metrics if they are given.
+    """
+    if IMPORT_ENGINE == "walk":
+        return _walk_imports(source, filename, symbols, file_metrics)
+    return _scan_imports(source, filename, symbols, file_metrics)
+
+# (rel_path, content_hash, imported_names, symbols, metrics)
+ParseResult = Tuple[str, Optional[str], Optional[List[ImportRecord]], Optional[List[str]], Optional[Dict[str, int]]]
+
+def _parse_file(rel_path: str, full_path: str, cached_hash: Optional[str], timer: PhaseTimer) -> ParseResult:
+    """
+    Reads and parses one file, adding the time spent to the "read" and
+    "parse" phases of timer.
+
+    Returns (rel_path, content_hash, imported_names, symbols, metrics),
+    symbols being the names of the top-level functions and classes. The last
+    three are None when the content hash still matches cached_hash, and
+    content_hash is None when the file could not be read at all.
+    """
+    start = time.perf_counter()
+    try:
+        with open(full_path, "rb") as f:
+            source = f.read()
+    except Exception as e:
+        print(f"Error analyzing file {rel_path}: {e}")
+        return rel_path, None, None, None, None
+
+    content_hash = hashlib.sha1(source).hexdigest()
+    read = time.perf_counter()
+    timer.span("read", start, read, rel_path)
+    if content_hash == cached_hash:
+        return rel_path, content_hash, None, None, None
+
+    symbols = []
+    file_metrics = {}
+    try:
+        imported_names = _extract_imports(source, full_path, symbols, file_metrics)
+    except Exception as e:
+        print(f"Error analyzing file {rel_path}: {e}")
+        imported_names = []
+        # Still size the node of a file that does not parse
+        file_metrics = {"loc": _count_loc(source)}
+    timer.span("parse", read, time.perf_counter(), rel_path)
+    return rel_path, content_hash, imported_names, symbols, file_metrics
+
+def _parse_files(tasks: List[Tuple[str, str, Optional[str]]], spans: bool = False) -> Tuple[List[ParseResult], PhaseTimer]:
+    # Unit of work of the process pool: one chunk of (rel_path, full_path, cached_hash)
+    # tasks. The phase timings travel back with the results.
+    timer = PhaseTimer(spans)
+    return [_parse_file(*task, timer) for task in tasks], timer
+
+def _chunk_by_bytes(tasks: List[Tuple], sizes: Dict[str, int], workers: int) -> List[List[Tuple]]:
+    # Aim for a few chunks per worker so one huge file does not leave the
+    # others idle, but keep chunks big enough to amortise the pickling overhead.
+    total_bytes = sum(sizes.get(task[0], 0) for task in tasks)
+    target = min(MAX_CHUNK_BYTES, max(MIN_CHUNK_BYTES, total_bytes // (workers * 4)))
+
+    chunks = []
+    current = []
+    current_bytes = 0
+    for task in tasks:
+        current.append(task)
+        current_bytes += sizes.get(task[0], 0)
+        if current_bytes >= target:
+            chunks.append(current)
+            current = []
+            current_bytes = 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _iter_parse_results(tasks: List[Tuple], sizes: Dict[str, int], workers: int, timer: PhaseTimer) -> Iterator[Tuple]:
+    # Counted locally and published once, not per file
+    results = Counter()
+    for result in _iter_parsed(tasks, sizes, workers, timer):
+        results["failed" if result[1] is None else "unchanged" if result[2] is None else "parsed"] += 1
+        yield result
+    for result, count in results.items():
+        metrics.analysis_files.inc(count, result=result)
+
+def _iter_parsed(tasks: List[Tuple], sizes: Dict[str, int], workers: int, timer: PhaseTimer) -> Iterator[Tuple]:
+    if workers <= 1 or len(tasks) < PARALLEL_MIN_FILES:
+        for task in tasks:
+            yield _parse_file(*task, timer)
+        return
+
+    chunks = _chunk_by_bytes(tasks, sizes, workers)
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        for chunk_results, chunk_timer in executor.map(_parse_files, chunks, repeat(timer.spans is not None)):
+            timer.merge(chunk_timer)
+            yield from chunk_results
+
+def _load_file_cache(conn, root_path: str) -> Dict[str, Dict[str, Any]]:
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT rel_path, mtime_ns, size, content_hash, imports, symbols, metrics, version FROM file_analysis_cache WHERE root_path = ?",
+        (root_path,)
+    )
+    return {row["rel_path"]: dict(row) for row in cursor.fetchall()}
+
+def _save_file_cache(conn, root_path: str, updated: List[Tuple], removed: List[str]):
+    # updated rows are (rel_path, mtime_ns, size, content_hash, imports, symbols, metrics, version)
+    # with imports, symbols and metrics JSON-encoded. The search index follows the
+    # cache in the same transaction.
+    cursor = conn.cursor()
+    if updated:
+        cursor.executemany(
+            """
+            INSERT INTO file_analysis_cache (root_path, rel_path, mtime_ns, size, content_hash, imports, symbols, metrics, version)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(root_path, rel_path) DO UPDATE SET
+                mtime_ns = excluded.mtime_ns,
+                size = excluded.size,
+                content_hash = excluded.content_hash,
+                imports = excluded.imports,
+                symbols = excluded.symbols,
+                metrics = excluded.metrics,
+                version = excluded.version
+            """,
+            [(root_path,) + row for row in updated]
+        )
+    if removed:
+        cursor.executemany(
+            "DELETE FROM file_analysis_cache WHERE root_path = ? AND rel_path = ?",
+            [(root_path, rel_path) for rel_path in removed]
+        )
+    search.index_files(conn, root_path, [(row[0], json.loads(row[5])) for row in updated], removed)
+    conn.commit()
+
+def iter_analysis(root_path: str, use_cache: bool = True, workers: Optional[int] = None,
+                  progress: Optional[Dict[str, int]] = None,
+                  timer: Optional[PhaseTimer] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Builds the import graph of a Python project as a stream of events.
+
+    Yields ("node", node) for every Python file as soon as the directory scan
+    finds it, then ("edge", edge) for the imports of each file as it is parsed,
+    so callers never have to hold the whole graph in memory. Once every edge
+    is known, ("metrics", attributes) follows for every node: its id plus the
+    per-file metrics described above and its fan_in/fan_out edge counts, to
+    be merged into the node with that id.
+
+    With use_cache enabled, the imports found in each file are persisted in the
+    file_analysis_cache table keyed by (root_path, rel_path). A file is only
+    re-parsed when its (mtime, size) changed and its content hash no longer
+    matches, so analysing an unchanged tree costs a single stat pass.
+
+    With workers > 1 (default: DARKTORCH_ANALYSIS_WORKERS), files that need
+    parsing are spread over a process pool in chunks of roughly equal size.
+
+    If a progress dict is given, its "files_scanned" and "files_parsed"
+    counters are updated in place (files served from the cache count as parsed).
+
+    The time spent scanning, reading, parsing, resolving and in the cache is
+    published to metrics.phase_duration once the analysis completes. Pass a
+    PhaseTimer(spans=True) as timer to also get the time of every file.
+    """
+    root_path = os.path.abspath(root_path)
+    if progress is None:
+        progress = {}
+    progress.setdefault("files_scanned", 0)
+    progress.setdefault("files_parsed", 0)
+    if timer is None:
+        timer = PhaseTimer()
+
+    cache = {}
+    if use_cache:
+        try:
+            with pooled_connection() as conn, timer.phase("cache_read"):
+                cache = _load_file_cache(conn, root_path)
+        except Exception as e:
+            print(f"Analysis cache unavailable, falling back to a full parse: {e}")
+            use_cache = False
+
+    updated = []
     valid_files = set()
-    
-    for dirpath, _, filenames in os.walk(root_path):
-        for filename in filenames:
-            if filename.endswith(".py"):
-                full_path = os.path.join(dirpath, filename)
-                rel_path = os.path.relpath(full_path, root_path).replace("\\", "/")
-                
-                valid_files.add(rel_path)
-                nodes.append({
-                    "id": rel_path,
-                    "name": filename,
-                    "type": "python"
-                })
-
-    # 2. Parse files for imports (Edges)
-    for node in nodes:
-        source_rel_path = node["id"]
-        source_full_path = os.path.join(root_path, source_rel_path)
-        
+
+    # 1. Scan for all Python files (Nodes)
+    # We need a set of valid relative paths to validate imports.
+    scanned = []
+    for rel_path, full_path, st in timer.iterate("scan", _scan_python_files(root_path), key=lambda entry: entry[0]):
+        scanned.append((rel_path, full_path, st))
+        valid_files.add(rel_path)
+        progress["files_scanned"] += 1
+        yield "node", _node(rel_path)
+
+    # 2. Resolve imports (Edges), from the cache or by parsing the file
+    with timer.phase("resolve"):
+        index = _module_index(root_path, valid_files)
+    file_metrics = {}
+    fan = _FanCounter()
+    to_parse = []
+    cached_files = 0
+    for rel_path, full_path, st in scanned:
+        cached = cache.get(rel_path)
+        if cached is not None and cached["version"] != CACHE_VERSION:
+            cached = None
+
+        if cached is not None and cached["mtime_ns"] == st.st_mtime_ns and cached["size"] == st.st_size:
+            progress["files_parsed"] += 1
+            cached_files += 1
+            file_metrics[rel_path] = json.loads(cached["metrics"])
+            yield from fan.count(_resolve_edges(rel_path, json.loads(cached["imports"]), index, timer))
+        else:
+            to_parse.append((rel_path, full_path, cached["content_hash"] if cached else None))
+    metrics.analysis_files.inc(cached_files, result="cached")
+
+    if workers is None:
+        workers = ANALYSIS_WORKERS
+    stats = {rel_path: st for rel_path, _, st in scanned}
+    sizes = {rel_path: st.st_size for rel_path, st in stats.items()}
+
+    for rel_path, content_hash, imported_names, symbols, node_metrics in _iter_parse_results(to_parse, sizes, workers, timer):
+        progress["files_parsed"] += 1
+        if content_hash is None:
+            # Unreadable file, already reported by the parser
+            continue
+        if imported_names is None:
+            # Touched but not modified (checkout, copy, ...): keep the cached imports
+            imported_names = json.loads(cache[rel_path]["imports"])
+            symbols = json.loads(cache[rel_path]["symbols"])
+            node_metrics = json.loads(cache[rel_path]["metrics"])
+        file_metrics[rel_path] = node_metrics
+        st = stats[rel_path]
+        updated.append((rel_path, st.st_mtime_ns, st.st_size, content_hash,
+                        json.dumps(imported_names), json.dumps(symbols), json.dumps(node_metrics), CACHE_VERSION))
+        yield from fan.count(_resolve_edges(rel_path, imported_names, index, timer))
+
+    # 3. Node metrics, now that the fan-in of every file is known
+    for rel_path, _, _ in scanned:
+        yield "metrics", fan.attributes(rel_path, file_metrics.get(rel_path))
+
+    if use_cache:
         try:
-            with open(source_full_path, "r", encoding="utf-8") as f:
-                tree = ast.parse(f.read(), filename=source_full_path)
-                
-            for node_ast in ast.walk(tree):
-                imported_names = []
-                
-                if isinstance(node_ast, ast.Import):
-                    for alias in node_ast.names:
-                        imported_names.append(alias.name)
-                elif isinstance(node_ast, ast.ImportFrom):
-                    if node_ast.module:
-                        imported_names.append(node_ast.module)
-                        
-                for imported_name in imported_names:
-                    # Convert dotted name to path
-                    # e.g. "utils" -> "utils.py"
-                    # e.g. "my_pkg.utils" -> "my_pkg/utils.py"
-                    
-                    # Simple resolution strategy:
-                    # 1. Check if it matches a file directly (e.g. utils -> utils.py)
-                    potential_path_1 = imported_name.replace(".", "/") + ".py"
-                    
-                    # 2. Check if it matches a package init (e.g. my_pkg -> my_pkg/__init__.py)
-                    potential_path_2 = imported_name.replace(".", "/") + "/__init__.py"
-                    
-                    target = None
-                    if potential_path_1 in valid_files:
-                        target = potential_path_1
-                    elif potential_path_2 in valid_files:
-                        target = potential_path_2
-                        
-                    # Also consider relative imports if we were being robust, but for now 
-                    # we'll stick to the simple requirement: "assume all found imports that match another file"
-                    
-                    if target:
-                        edges.append({
-                            "source": source_rel_path,
-                            "target": target
-                        })
-                        
+            # Drop rows of files that were deleted since the last analysis
+            removed = [rel_path for rel_path in cache if rel_path not in valid_files]
+            with pooled_connection() as conn, timer.phase("cache_write"):
+                _save_file_cache(conn, root_path, updated, removed)
         except Exception as e:
-            print(f"Error analyzing file {source_rel_path}: {e}")
+            print(f"Error saving analysis cache: {e}")
+    timer.record()
+
+def update_analysis(root_path: str, graph: Dict[str, List[Dict[str, Any]]], changes: List[Tuple[str, str, str]],
+                    workers: Optional[int] = None) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    """
+    Patches a graph built by analyze_project after the given files changed.
+
+    changes are (status, old_path, new_path) entries as returned by
+    git_service.diff_commits. Only added, modified, renamed and copied Python
+    files are read again; a pure rename whose content hash matches reuses the
+    cached imports of the old path. Every other file keeps its cached imports,
+    and all edges are re-resolved against the new module index, so imports
+    that now point to an added, moved or deleted module are updated too.
+
+    Returns None when the analysis cache does not cover the unchanged files
+    (e.g. the graph was built with use_cache=False); callers should then fall
+    back to a full analysis.
+    """
+    root_path = os.path.abspath(root_path)
+    timer = PhaseTimer()
+    try:
+        with pooled_connection() as conn, timer.phase("cache_read"):
+            cache = _load_file_cache(conn, root_path)
+    except Exception as e:
+        print(f"Analysis cache unavailable, cannot patch the graph: {e}")
+        return None
+
+    removed = set()
+    touched = []
+    renamed_from = {}
+    for status, old_path, new_path in changes:
+        if status[0] in ("D", "R") and old_path.endswith(".py"):
+            removed.add(old_path)
+        if status[0] != "D" and new_path.endswith(".py"):
+            touched.append(new_path)
+            if status[0] in ("R", "C"):
+                renamed_from[new_path] = old_path
+    removed.difference_update(touched)
+
+    tasks = []
+    stats = {}
+    for rel_path in touched:
+        full_path = os.path.join(root_path, rel_path)
+        try:
+            stats[rel_path] = os.stat(full_path)
+        except OSError:
+            # Deleted again since, or outside a sparse checkout
+            removed.add(rel_path)
             continue
+        previous = cache.get(renamed_from.get(rel_path, rel_path))
+        tasks.append((rel_path, full_path, previous["content_hash"] if previous else None))
+
+    paths = [node["id"] for node in graph["nodes"] if node["id"] not in removed]
+    files = set(paths)
+    for rel_path in stats:
+        if rel_path not in files:
+            files.add(rel_path)
+            paths.append(rel_path)
+
+    for rel_path in files.difference(stats):
+        cached = cache.get(rel_path)
+        if cached is None or cached["version"] != CACHE_VERSION:
+            return None
+
+    if workers is None:
+        workers = ANALYSIS_WORKERS
+    sizes = {rel_path: st.st_size for rel_path, st in stats.items()}
+    imports = {}
+    file_metrics = {}
+    updated = []
+    for rel_path, content_hash, imported_names, symbols, node_metrics in _iter_parse_results(tasks, sizes, workers, timer):
+        if content_hash is None:
+            imports[rel_path] = []
+            file_metrics[rel_path] = None
+            continue
+        if imported_names is None:
+            previous = cache[renamed_from.get(rel_path, rel_path)]
+            imported_names = json.loads(previous["imports"])
+            symbols = json.loads(previous["symbols"])
+            node_metrics = json.loads(previous["metrics"])
+        imports[rel_path] = imported_names
+        file_metrics[rel_path] = node_metrics
+        st = stats[rel_path]
+        updated.append((rel_path, st.st_mtime_ns, st.st_size, content_hash,
+                        json.dumps(imported_names), json.dumps(symbols), json.dumps(node_metrics), CACHE_VERSION))
+
+    with timer.phase("resolve"):
+        index = _module_index(root_path, files)
+    fan = _FanCounter()
+    edges = []
+    for rel_path in paths:
+        imported_names = imports.get(rel_path)
+        if imported_names is None:
+            imported_names = json.loads(cache[rel_path]["imports"])
+        edges.extend(edge for _, edge in fan.count(_resolve_edges(rel_path, imported_names, index, timer)))
+
+    # Fresh node dicts: the caller may still compare against the old graph
+    nodes = []
+    for rel_path in paths:
+        node_metrics = file_metrics[rel_path] if rel_path in file_metrics else json.loads(cache[rel_path]["metrics"])
+        node = _node(rel_path)
+        node.update(fan.attributes(rel_path, node_metrics))
+        nodes.append(node)
+
+    try:
+        with pooled_connection() as conn, timer.phase("cache_write"):
+            _save_file_cache(conn, root_path, updated, [rel_path for rel_path in removed if rel_path in cache])
+    except Exception as e:
+        print(f"Error saving analysis cache: {e}")
+    timer.record()
 
     return {"nodes": nodes, "edges": edges}
+
+def _node(rel_path: str) -> Dict[str, Any]:
+    return {
+        "id": rel_path,
+        "name": os.path.basename(rel_path),
+        "type": "python"
+    }
+
+class _FanCounter:
+    # Counts the edges leaving and entering every file while they stream past
+    def __init__(self):
+        self.fan_in = Counter()
+        self.fan_out = Counter()
+
+    def count(self, edges: Iterator[Tuple[str, Dict[str, str]]]) -> Iterator[Tuple[str, Dict[str, str]]]:
+        for event in edges:
+            self.fan_out[event[1]["source"]] += 1
+            self.fan_in[event[1]["target"]] += 1
+            yield event
+
+    def attributes(self, rel_path: str, file_metrics: Optional[Dict[str, int]]) -> Dict[str, Any]:
+        attributes = {"id": rel_path}
+        if file_metrics:
+            attributes.update(file_metrics)
+        attributes["fan_in"] = self.fan_in[rel_path]
+        attributes["fan_out"] = self.fan_out[rel_path]
+        return attributes
+
+def _module_index(root_path: str, files: set) -> ModuleIndex:
+    # A project root with an __init__.py is itself importable under its name
+    root_package = os.path.basename(root_path) if "__init__.py" in files else None
+    return ModuleIndex(files, root_package)
+
+def _iter_edges(source_rel_path: str, imported_names: List[ImportRecord], index: ModuleIndex) -> Iterator[Tuple[str, Dict[str, str]]]:
+    # One edge per imported file, however many statements import it
+    seen = {source_rel_path}
+    for module, level, names in imported_names:
+        for target in index.resolve(source_rel_path, module, level, names):
+            if target not in seen:
+                seen.add(target)
+                yield "edge", {
+                    "source": source_rel_path,
+                    "target": target
+                }
+
+def _resolve_edges(source_rel_path: str, imported_names: List[ImportRecord], index: ModuleIndex,
+                   timer: PhaseTimer) -> List[Tuple[str, Dict[str, str]]]:
+    # Resolved eagerly so the "resolve" phase excludes the time the consumer
+    # of the edge stream spends between two edges
+    start = time.perf_counter()
+    edges = list(_iter_edges(source_rel_path, imported_names, index))
+    timer.span("resolve", start, time.perf_counter(), source_rel_path)
+    return edges
+
+def analyze_project(root_path: str, use_cache: bool = True, workers: Optional[int] = None,
+                    progress: Optional[Dict[str, int]] = None,
+                    timer: Optional[PhaseTimer] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Builds the whole import graph of a Python project, see iter_analysis."""
+    nodes = {}
+    edges = []
+    for kind, item in iter_analysis(root_path, use_cache=use_cache, workers=workers, progress=progress, timer=timer):
+        if kind == "node":
+            nodes[item["id"]] = item
+        elif kind == "edge":
+            edges.append(item)
+        else:
+            nodes[item["id"]].update(item)
+    return {"nodes": list(nodes.values()), "edges": edges}
+
+def analyze_project_compact(root_path: str, use_cache: bool = True, workers: Optional[int] = None,
+                            progress: Optional[Dict[str, int]] = None,
+                            timer: Optional[PhaseTimer] = None) -> CompactGraph:
+    """Builds the import graph as a CompactGraph, never holding the per-node dicts."""
+    return CompactGraph.from_events(iter_analysis(root_path, use_cache=use_cache, workers=workers, progress=progress,
+                                                  timer=timer))
@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import uuid
+import random
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import git
+
+from database import pooled_connection
+from coordination import worker_id, worker_alive
+
+# Threads running the network part (clone, pull) of batch items, shared by
+# every batch, and how many of them may talk to the same host at once.
+BATCH_WORKERS = int(os.environ.get("DARKTORCH_BATCH_WORKERS", "4"))
+PER_HOST_LIMIT = int(os.environ.get("DARKTORCH_BATCH_PER_HOST", "2"))
+# Attempts per item, with exponential backoff (and jitter) in between.
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+MAX_BATCH_ITEMS = 500
+
+FINISHED_STATUSES = ("done", "failed", "interrupted")
+
+class RetryableError(Exception):
+    """A failure worth trying again later, like a network error."""
+
+def url_host(url: str) -> str:
+    """Host a repository URL talks to; local paths and file:// URLs share "local"."""
+    parsed = urlparse(url)
+    if parsed.scheme == "" and "@" in url and ":" in url.split("@", 1)[1]:
+        # scp-like syntax: git@github.com:owner/repo.git
+        return url.split("@", 1)[1].split(":", 1)[0].lower()
+    if parsed.scheme in ("", "file") or not parsed.hostname:
+        return "local"
+    return parsed.hostname.lower()
+
+class _Task:
+    __slots__ = ("batch_id", "position", "host", "fetch", "finish", "attempts", "not_before")
+
+    def __init__(self, batch_id: str, position: int, host: str, fetch: Callable, finish: Optional[Callable]):
+        self.batch_id = batch_id
+        self.position = position
+        self.host = host
+        self.fetch = fetch
+        self.finish = finish
+        self.attempts = 0
+        self.not_before = 0.0
+
+class BatchRunner:
+    """
+    Runs many clones or pulls concurrently and records per-item progress in
+    the batch_jobs and batch_items tables.
+
+    Every item is a network step, fetch(position), retried with backoff when
+    it raises git.GitCommandError or RetryableError, followed by an optional
+    local step, finish(position, fetched), whose return value is stored as the
+    item result. Workers pick the oldest queued item whose host is below the
+    per-host limit, so one slow host cannot occupy every worker, and an item
+    waiting out its backoff does not hold a worker either.
+    """
+
+    def __init__(self, workers: int = BATCH_WORKERS, per_host: int = PER_HOST_LIMIT,
+                 max_attempts: int = MAX_ATTEMPTS, backoff: float = BACKOFF_BASE):
+        self.workers = workers
+        self.per_host = per_host
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._cond = threading.Condition()
+        self._pending: List[_Task] = []
+        self._hosts = Counter()
+        self._remaining: Dict[str, int] = {}
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, kind: str, targets: List[Tuple[str, str]], fetch: Callable[[int], Any],
+               finish: Optional[Callable[[int, Any], Any]] = None) -> Dict[str, Any]:
+        """
+        Queues one item per (target, url) pair and returns the batch record.
+
+        target is what the item is reported as (a URL, a project name) and url
+        decides the host it counts against.
+        """
+        if not targets:
+            raise ValueError("A batch needs at least one item")
+        if len(targets) > MAX_BATCH_ITEMS:
+            raise ValueError(f"A batch holds at most {MAX_BATCH_ITEMS} items")
+
+        batch_id = uuid.uuid4().hex
+        hosts = [url_host(url) for _, url in targets]
+        with pooled_connection() as conn:
+            conn.execute(
+                "INSERT INTO batch_jobs (id, kind, status, total, created_at, owner) VALUES (?, ?, 'running', ?, ?, ?)",
+                (batch_id, kind, len(targets), time.time(), worker_id())
+            )
+            conn.executemany(
+                "INSERT INTO batch_items (batch_id, position, target, host, status) VALUES (?, ?, ?, ?, 'queued')",
+                [(batch_id, position, target, host) for position, ((target, _), host) in enumerate(zip(targets, hosts))]
+            )
+            conn.commit()
+
+        with self._cond:
+            self._remaining[batch_id] = len(targets)
+            for position, host in enumerate(hosts):
+                self._pending.append(_Task(batch_id, position, host, fetch, finish))
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"git-batch-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify_all()
+
+        return self.get(batch_id)
+
+    def get(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with pooled_connection() as conn:
+            row = conn.execute("SELECT * FROM batch_jobs WHERE id = ?", (batch_id,)).fetchone()
+            if row is None:
+                return None
+            items = conn.execute(
+                "SELECT * FROM batch_items WHERE batch_id = ? ORDER BY position", (batch_id,)
+            ).fetchall()
+
+        batch = dict(row)
+        del batch["owner"]
+        finished = batch.pop("finished_at")
+        batch["elapsed"] = (finished or time.time()) - batch.pop("created_at")
+        batch["counts"] = dict(Counter(item["status"] for item in items))
+        batch["items"] = []
+        for item in items:
+            item = dict(item)
+            del item["batch_id"]
+            item["result"] = json.loads(item["result"]) if item["result"] is not None else None
+            batch["items"].append(item)
+        return batch
+
+    def _next_task(self) -> Optional[_Task]:
+        now = time.monotonic()
+        for i, task in enumerate(self._pending):
+            if task.not_before <= now and self._hosts[task.host] < self.per_host:
+                return self._pending.pop(i)
+        return None
+
+    def _wait_time(self) -> Optional[float]:
+        # Until the next backoff expires; a freed host slot notifies instead
+        now = time.monotonic()
+        delays = [task.not_before - now for task in self._pending if task.not_before > now]
+        return min(delays) if delays else None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None:
+                    self._cond.wait(self._wait_time())
+                    task = self._next_task()
+                self._hosts[task.host] += 1
+            try:
+                self._run(task)
+            except Exception as e:
+                print(f"Batch worker failed on item {task.position} of batch {task.batch_id}: {e}")
+
+    def _release(self, task: _Task, retry_in: Optional[float] = None):
+        with self._cond:
+            self._hosts[task.host] -= 1
+            if retry_in is not None:
+                task.not_before = time.monotonic() + retry_in
+                self._pending.append(task)
+            self._cond.notify_all()
+
+    def _run(self, task: _Task):
+        task.attempts += 1
+        fields = dict(status="running", attempts=task.attempts)
+        if task.attempts == 1:
+            fields["started_at"] = time.time()
+        try:
+            self._update_item(task, **fields)
+            fetched = task.fetch(task.position)
+        except Exception as e:
+            retryable = isinstance(e, (git.GitCommandError, RetryableError))
+            if retryable and task.attempts < self.max_attempts:
+                delay = min(BACKOFF_MAX, self.backoff * 2 ** (task.attempts - 1)) * random.uniform(0.5, 1.0)
+                self._update_item(task, status="retrying", message=str(e))
+                self._release(task, retry_in=delay)
+            else:
+                self._release(task)
+                self._finish_item(task, status="failed", message=str(e))
+            return
+
+        # The host slot is only needed for the network part
+        self._release(task)
+        try:
+            result = task.finish(task.position, fetched) if task.finish else fetched
+            self._finish_item(task, status="done", message=None, result=json.dumps(result))
+        except Exception as e:
+            self._finish_item(task, status="failed", message=str(e))
+
+    def _update_item(self, task: _Task, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with pooled_connection() as conn:
+            conn.execute(
+                f"UPDATE batch_items SET {assignments} WHERE batch_id = ? AND position = ?",
+                (*fields.values(), task.batch_id, task.position)
+            )
+            conn.commit()
+
+    def _finish_item(self, task: _Task, **fields):
+        self._update_item(task, finished_at=time.time(), **fields)
+        with self._cond:
+            self._remaining[task.batch_id] -= 1
+            last = self._remaining[task.batch_id] == 0
+            if last:
+                del self._remaining[task.batch_id]
+        if last:
+            with pooled_connection() as conn:
+                conn.execute("UPDATE batch_jobs SET status = 'done', finished_at = ? WHERE id = ?",
+                             (time.time(), task.batch_id))
+                conn.commit()
+
+def recover_batches():
+    """Marks batches left running by worker processes that are gone as interrupted."""
+    now = time.time()
+    with pooled_connection() as conn:
+        rows = conn.execute("SELECT id, owner FROM batch_jobs WHERE status = 'running'").fetchall()
+        alive = {}
+        for row in rows:
+            if row["owner"] not in alive:
+                alive[row["owner"]] = worker_alive(row["owner"])
+        stale = [row["id"] for row in rows if not alive[row["owner"]]]
+        conn.executemany(
+            f"UPDATE batch_items SET status = 'interrupted', finished_at = ? "
+            f"WHERE batch_id = ? AND status NOT IN ({', '.join('?' * len(FINISHED_STATUSES))})",
+            [(now, batch_id, *FINISHED_STATUSES) for batch_id in stale]
+        )
+        conn.executemany(
+            "UPDATE batch_jobs SET status = 'interrupted', finished_at = ? WHERE id = ?",
+            [(now, batch_id) for batch_id in stale]
+        )
+        conn.commit()
+
+batch_runner = BatchRunner()
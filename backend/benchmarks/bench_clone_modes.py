@@ -0,0 +1,91 @@
+"""
+Compares clone time and disk usage of the clone modes of git_service.clone_repo.
+
+A local bare repository served over file:// stands in for GitHub. It holds a
+history of Python sources next to larger non-Python assets that change on
+every commit.
+
+Run from the backend/ directory:
+    python benchmarks/bench_clone_modes.py [--commits 30] [--files 300]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import git
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import git_service
+
+MODES = [
+    ("full", {}),
+    ("depth=1", {"depth": 1}),
+    ("blob:none", {"blobless": True}),
+    ("sparse *.py", {"sparse_python": True}),
+    ("blob:none + sparse *.py", {"blobless": True, "sparse_python": True}),
+    ("depth=1 + single-branch", {"depth": 1, "single_branch": True}),
+]
+
+def make_upstream(root: str, commits: int, files: int) -> str:
+    work = os.path.join(root, "work")
+    repo = git.Repo.init(work)
+    actor = git.Actor("bench", "bench@example.com")
+    for c in range(commits):
+        for i in range(files):
+            pkg = os.path.join(work, f"pkg{i % 20}")
+            os.makedirs(pkg, exist_ok=True)
+            with open(os.path.join(pkg, f"mod{i}.py"), "w") as f:
+                f.write(f"REVISION = {c}\n" + "def f(x):\n    return x\n" * 50)
+        assets = os.path.join(work, "assets")
+        os.makedirs(assets, exist_ok=True)
+        for i in range(5):
+            with open(os.path.join(assets, f"blob{i}.bin"), "wb") as f:
+                f.write(os.urandom(256 * 1024))
+        repo.git.add(A=True)
+        repo.index.commit(f"revision {c}", author=actor, committer=actor)
+        if c % 10 == 0:
+            repo.git.branch(f"release-{c}")
+
+    bare = os.path.join(root, "upstream.git")
+    git.Repo.clone_from(work, bare, bare=True)
+    git.Repo(bare).git.config("uploadpack.allowFilter", "true")
+    return "file://" + bare
+
+def disk_usage(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            total += os.lstat(os.path.join(dirpath, filename)).st_size
+    return total
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--commits", type=int, default=30)
+    parser.add_argument("--files", type=int, default=300)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="darktorch_clone_bench_")
+    git_service.PROJECTS_DIR = os.path.join(root, "projects")
+    try:
+        print(f"Building upstream with {args.commits} commits of {args.files} files...")
+        url = make_upstream(root, args.commits, args.files)
+
+        print(f"{'mode':<26}{'time':>9}{'total disk':>13}{'.git':>11}")
+        for index, (label, options) in enumerate(MODES):
+            start = time.perf_counter()
+            result = git_service.clone_repo(url, f"clone{index}", **options)
+            elapsed = time.perf_counter() - start
+            if not result["success"]:
+                print(f"{label:<26} failed: {result['message']}")
+                continue
+            total = disk_usage(result["path"])
+            git_dir = disk_usage(os.path.join(result["path"], ".git"))
+            print(f"{label:<26}{elapsed:>8.2f}s{total / 1e6:>11.1f}MB{git_dir / 1e6:>9.1f}MB")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
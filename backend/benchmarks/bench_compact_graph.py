@@ -0,0 +1,64 @@
+"""
+Compares memory and payload size of the verbose and compact graph layouts.
+
+Both graphs are decoded from JSON, as when loaded from a snapshot, so the
+verbose one holds a separate copy of a path for every node and edge end.
+
+Run from the backend/ directory:
+    python benchmarks/bench_compact_graph.py [--files 50000] [--edges-per-file 6]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tracemalloc
+import zlib
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from compact_graph import CompactGraph
+
+def generate_graph(file_count: int, edges_per_file: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    paths = [
+        f"src/project/component_{i % 97}/subsystem_{i % 13}/module_{i}.py"
+        for i in range(file_count)
+    ]
+    nodes = [{"id": path, "name": os.path.basename(path), "type": "python"} for path in paths]
+    edges = [
+        {"source": path, "target": paths[rng.randrange(file_count)]}
+        for path in paths for _ in range(edges_per_file)
+    ]
+    return {"nodes": nodes, "edges": edges}
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=50000)
+    parser.add_argument("--edges-per-file", type=int, default=6)
+    args = parser.parse_args()
+
+    verbose_json = json.dumps(generate_graph(args.files, args.edges_per_file), separators=(",", ":")).encode()
+    verbose, verbose_memory = measure(lambda: json.loads(verbose_json))
+    compact_json = json.dumps(CompactGraph.from_graph(verbose).to_json(), separators=(",", ":")).encode()
+    # Decoded from its own JSON too, so it owns its path strings
+    _, compact_memory = measure(lambda: CompactGraph.from_json(json.loads(compact_json)))
+
+    print(f"{args.files} nodes, {len(verbose['edges'])} edges")
+    print(f"memory:  verbose {verbose_memory / 1e6:.1f} MB, compact {compact_memory / 1e6:.1f} MB "
+          f"({verbose_memory / compact_memory:.1f}x)")
+    print(f"json:    verbose {len(verbose_json) / 1e6:.1f} MB, compact {len(compact_json) / 1e6:.1f} MB "
+          f"({len(verbose_json) / len(compact_json):.1f}x)")
+    verbose_deflated = len(zlib.compress(verbose_json, 6))
+    compact_deflated = len(zlib.compress(compact_json, 6))
+    print(f"deflate: verbose {verbose_deflated / 1e6:.1f} MB, compact {compact_deflated / 1e6:.1f} MB "
+          f"({verbose_deflated / compact_deflated:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Times the server-side force-directed layout on generated import graphs.
+
+Run from the backend/ directory:
+    python benchmarks/bench_graph_layout.py [--nodes 1000 10000 50000] [--edges-per-node 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from layout import compute_layout, EXACT_REPULSION_MAX, _grid_size
+
+def generate_graph(node_count: int, edges_per_node: int, seed: int = 0):
+    # Mostly local imports within a package plus some long-range ones
+    rng = random.Random(seed)
+    package_size = 50
+    paths = [f"pkg{i // package_size}/mod{i}.py" for i in range(node_count)]
+    sources, targets = [], []
+    for i in range(node_count):
+        package_start = i - i % package_size
+        for _ in range(edges_per_node):
+            if rng.random() < 0.8:
+                target = package_start + rng.randrange(package_size)
+            else:
+                target = rng.randrange(node_count)
+            sources.append(i)
+            targets.append(min(target, node_count - 1))
+    return paths, sources, targets
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--edges-per-node", type=int, default=3)
+    args = parser.parse_args()
+
+    for node_count in args.nodes:
+        paths, sources, targets = generate_graph(node_count, args.edges_per_node)
+        start = time.perf_counter()
+        coords = compute_layout(paths, sources, targets)
+        elapsed = time.perf_counter() - start
+
+        # Quality check: edges should be much shorter than random pairs
+        rng = np.random.default_rng(0)
+        pairs = rng.integers(0, node_count, (10000, 2))
+        edge_length = np.linalg.norm(coords[sources] - coords[targets], axis=1).mean()
+        pair_length = np.linalg.norm(coords[pairs[:, 0]] - coords[pairs[:, 1]], axis=1).mean()
+        mode = "exact" if node_count <= EXACT_REPULSION_MAX else f"grid {_grid_size(node_count)}x{_grid_size(node_count)}"
+        print(f"{node_count:>6} nodes, {len(sources):>6} edges, {mode:<12} {elapsed:6.2f}s  "
+              f"edge/random length {edge_length / pair_length:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares the lexical import scanner with the full ast.walk extraction.
+
+Run from the backend/ directory:
+    python benchmarks/bench_import_scanner.py [path ...]
+
+Defaults to the standard library of the running interpreter.
+"""
+import glob
+import os
+import sys
+import sysconfig
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analyzer import _scan_imports, _walk_imports
+
+def load_sources(paths):
+    sources = []
+    for path in paths:
+        for filename in glob.glob(os.path.join(path, "**", "*.py"), recursive=True):
+            with open(filename, "rb") as f:
+                source = f.read()
+            try:
+                _walk_imports(source, filename)
+            except (SyntaxError, ValueError):
+                continue
+            sources.append((filename, source))
+    return sources
+
+def measure(engine, sources):
+    start = time.perf_counter()
+    for filename, source in sources:
+        engine(source, filename)
+    elapsed = time.perf_counter() - start
+
+    peaks = []
+    for filename, source in sources[:500]:
+        tracemalloc.start()
+        engine(source, filename)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return elapsed, sum(peaks) / len(peaks)
+
+def main():
+    paths = sys.argv[1:] or [sysconfig.get_paths()["stdlib"]]
+    sources = load_sources(paths)
+    total_bytes = sum(len(source) for _, source in sources)
+    print(f"{len(sources)} files, {total_bytes / 1e6:.1f} MB")
+
+    mismatches = sum(
+        1 for filename, source in sources
+        if Counter(_walk_imports(source, filename)) != Counter(_scan_imports(source, filename))
+    )
+    print(f"files with differing imports: {mismatches}")
+
+    walk_time, walk_peak = measure(_walk_imports, sources)
+    scan_time, scan_peak = measure(_scan_imports, sources)
+    print(f"walk: {walk_time:.2f}s, mean peak allocation {walk_peak / 1024:.0f} KB/file")
+    print(f"scan: {scan_time:.2f}s, mean peak allocation {scan_peak / 1024:.0f} KB/file")
+    print(f"speedup: {walk_time / scan_time:.1f}x, allocation: {walk_peak / scan_peak:.1f}x less")
+
+if __name__ == "__main__":
+    main()
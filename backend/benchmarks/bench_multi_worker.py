@@ -0,0 +1,139 @@
+"""
+Measures read throughput of the backend run by uvicorn with 1 to 8 worker processes.
+
+A synthetic graph snapshot of --files files is stored in a temporary database;
+uvicorn is then started with --workers N (the database found through
+DARKTORCH_DB_PATH) and --clients client processes request the stored graph,
+its compact form, a dependency query and the project list for --duration
+seconds. Scaling stops at the number of CPU cores: the client processes
+compete with the workers for them.
+
+Run from the backend/ directory:
+    python benchmarks/bench_multi_worker.py [--workers 1,2,4,8] [--clients 16] [--duration 10]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+import database
+
+def make_graph(file_count: int, seed: int = 0):
+    rng = random.Random(seed)
+    paths = [f"pkg{i % 40}/mod{i}.py" for i in range(file_count)]
+    nodes = [{"id": path, "name": os.path.basename(path), "type": "python"} for path in paths]
+    edges = set()
+    for i in range(file_count):
+        for _ in range(rng.randint(1, 6)):
+            edges.add((paths[i], paths[rng.randrange(file_count)]))
+    return {"nodes": nodes, "edges": [{"source": s, "target": t} for s, t in sorted(edges) if s != t]}, paths
+
+def run_client(base_url: str, project_id: int, paths, deadline: float, results):
+    rng = random.Random(os.getpid())
+    latencies = []
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        while time.time() < deadline:
+            kind = rng.randrange(4)
+            start = time.perf_counter()
+            if kind == 0:
+                response = client.get(f"/api/projects/{project_id}/graph", headers={"Accept-Encoding": "deflate"})
+            elif kind == 1:
+                response = client.get(f"/api/projects/{project_id}/graph", params={"format": "compact"},
+                                      headers={"Accept-Encoding": "deflate"})
+            elif kind == 2:
+                response = client.get(f"/api/projects/{project_id}/graph/importers",
+                                      params={"path": rng.choice(paths), "depth": 2})
+            else:
+                response = client.get("/api/projects/")
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+    results.put(latencies)
+
+def start_server(workers: int, port: int, db_path: str) -> subprocess.Popen:
+    env = {**os.environ, "DARKTORCH_DB_PATH": db_path}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+         "--http", "http_protocol:NoDelayHTTPProtocol", "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health").status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("The server did not start")
+
+def measure(base_url: str, project_id: int, paths, clients: int, duration: float):
+    results = multiprocessing.Queue()
+    deadline = time.time() + duration
+    processes = [multiprocessing.Process(target=run_client, args=(base_url, project_id, paths, deadline, results))
+                 for _ in range(clients)]
+    for process in processes:
+        process.start()
+    latencies = []
+    for _ in processes:
+        latencies.extend(results.get())
+    for process in processes:
+        process.join()
+    latencies.sort()
+    return (len(latencies) / duration, statistics.median(latencies),
+            latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="darktorch_workers_")
+    database.DB_PATH = os.path.join(root, "darktorch.db")
+    database.init_db()
+    import snapshots
+    graph, paths = make_graph(args.files)
+    with database.pooled_connection() as conn:
+        project_id = conn.execute(
+            "INSERT INTO projects (name, local_path) VALUES ('bench', ?)", (root,)
+        ).lastrowid
+        conn.commit()
+    snapshots.save_snapshot(project_id, graph)
+    database.pool.close_all()
+
+    print(f"{os.cpu_count()} CPU cores, {len(graph['nodes'])} nodes, {len(graph['edges'])} edges, "
+          f"{args.clients} clients, {args.duration:.0f}s per run")
+    print(f"{'workers':>8} {'req/s':>9} {'speedup':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    base_url = f"http://127.0.0.1:{args.port}"
+    baseline = None
+    try:
+        for workers in [int(value) for value in args.workers.split(",")]:
+            server = start_server(workers, args.port, database.DB_PATH)
+            try:
+                # Warm every worker's snapshot caches before measuring
+                measure(base_url, project_id, paths, args.clients, 2.0)
+                throughput, p50, p99 = measure(base_url, project_id, paths, args.clients, args.duration)
+            finally:
+                server.terminate()
+                server.wait()
+            baseline = baseline or throughput
+            print(f"{workers:>8} {throughput:>9.0f} {throughput / baseline:>7.2f}x {p50:>8.1f} {p99:>8.1f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares serial and parallel wall time of analyze_project on a generated tree.
+
+Run from the backend/ directory:
+    python benchmarks/bench_parallel_analysis.py [--files 10000] [--workers N]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import analyzer
+
+def generate_tree(root: str, file_count: int, seed: int = 0):
+    rng = random.Random(seed)
+    packages = max(1, file_count // 100)
+
+    for i in range(file_count):
+        pkg = f"pkg{i % packages}"
+        pkg_dir = os.path.join(root, pkg)
+        os.makedirs(pkg_dir, exist_ok=True)
+
+        lines = ["import os", "import sys"]
+        for _ in range(5):
+            j = rng.randrange(file_count)
+            lines.append(f"import pkg{j % packages}.mod{j}")
+        for f in range(20):
+            lines.append(f"def func_{f}(a, b):")
+            lines.append("    if a > b:")
+            lines.append("        return [x * 2 for x in range(a) if x % 3]")
+            lines.append("    return {'a': a, 'b': b, 'sum': a + b}")
+        lines.append("class Thing:")
+        lines.append("    def method(self):")
+        lines.append("        import json")
+        lines.append("        return json.dumps(self.__dict__)")
+
+        with open(os.path.join(pkg_dir, f"mod{i}.py"), "w", encoding="utf-8") as fh:
+            fh.write("\n".join(lines) + "\n")
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="darktorch_bench_")
+    try:
+        print(f"Generating {args.files} files in {root}...")
+        generate_tree(root, args.files)
+
+        serial_time, serial = timed(lambda: analyzer.analyze_project(root, use_cache=False, workers=1))
+        parallel_time, parallel = timed(lambda: analyzer.analyze_project(root, use_cache=False, workers=args.workers))
+
+        assert serial == parallel, "parallel result differs from serial result"
+        print(f"files={len(serial['nodes'])} edges={len(serial['edges'])}")
+        print(f"serial:   {serial_time:.2f}s")
+        print(f"parallel: {parallel_time:.2f}s ({args.workers} workers, {serial_time / parallel_time:.2f}x)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Measures indexing time and query latency of the search index.
+
+A synthetic project of --files files, each with a few top-level symbols, is
+indexed together with a note for every tenth file; queries then run against
+the warm index the way the /search endpoint runs them.
+
+Run from the backend/ directory:
+    python benchmarks/bench_search_index.py [--files 50000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+QUERIES = ("graph", "load_graph", "component_42", "Store", "sqlite", "mod", "handler request", "nothingmatches")
+WORDS = ("load", "save", "graph", "store", "parse", "request", "handler", "index", "cache", "render", "sync", "node")
+
+def generate_files(file_count: int, seed: int = 0):
+    rng = random.Random(seed)
+    for i in range(file_count):
+        path = f"src/project/component_{i % 97}/subsystem_{i % 13}/module_{i}.py"
+        symbols = [f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{j}" for j in range(rng.randint(1, 8))]
+        symbols.append(f"{rng.choice(WORDS).title()}{rng.choice(WORDS).title()}")
+        yield path, symbols
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "bench.db")
+        database.init_db()
+        import search
+
+        files = list(generate_files(args.files))
+        start = time.perf_counter()
+        with database.pooled_connection() as conn:
+            search.index_files(conn, "/bench", files)
+            search.index_notes(conn, 1, [
+                (path, f"Notes about {' '.join(symbols)} backed by sqlite") for path, symbols in files[::10]
+            ])
+            conn.commit()
+        print(f"indexed {args.files} files and {len(files[::10])} notes in {time.perf_counter() - start:.2f}s")
+
+        with database.pooled_connection() as conn:
+            for query in QUERIES:
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    results = search.search(conn, "/bench", 1, query)
+                    timings.append(time.perf_counter() - start)
+                timings.sort()
+                print(f"{query!r:20} {len(results):3} results  median {timings[len(timings) // 2] * 1000:6.1f} ms  "
+                      f"max {timings[-1] * 1000:6.1f} ms")
+        database.pool.close_all()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Measures /api/projects/ latency while several GitHub imports are cloning.
+
+A local bare repository served over file:// stands in for GitHub. The backend runs in-process
+under uvicorn with a temporary database and projects directory.
+
+Run from the backend/ directory:
+    python benchmarks/load_projects_during_clones.py [--clones 5] [--files 3000]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import git
+import httpx
+import uvicorn
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+import git_service
+
+def make_bare_repo(root: str, file_count: int, commits: int = 5) -> str:
+    work = os.path.join(root, "work")
+    repo = git.Repo.init(work)
+    actor = git.Actor("bench", "bench@example.com")
+    for c in range(commits):
+        for i in range(file_count):
+            pkg = os.path.join(work, f"pkg{i % 50}")
+            os.makedirs(pkg, exist_ok=True)
+            with open(os.path.join(pkg, f"mod{i}.py"), "w") as f:
+                f.write(f"# revision {c}\n" + "import os\n" * 20 + "x = 1\n" * 200)
+        repo.git.add(A=True)
+        repo.index.commit(f"revision {c}", author=actor, committer=actor)
+    bare = os.path.join(root, "upstream.git")
+    git.Repo.clone_from(work, bare, bare=True)
+    return bare
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def sample_latency(client, stop: threading.Event, samples: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        client.get("/api/projects/").raise_for_status()
+        samples.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.01)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clones", type=int, default=5)
+    parser.add_argument("--files", type=int, default=3000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="darktorch_load_")
+    database.DB_PATH = os.path.join(root, "darktorch.db")
+    git_service.PROJECTS_DIR = os.path.join(root, "projects")
+    database.init_db()
+
+    print(f"Building upstream repository with {args.files} files...")
+    bare = make_bare_repo(root, args.files)
+
+    from main import app
+    server = uvicorn.Server(uvicorn.Config(app, port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        with httpx.Client(base_url=base_url, timeout=600) as client:
+            idle = []
+            stop = threading.Event()
+            sampler = threading.Thread(target=sample_latency, args=(client, stop, idle))
+            sampler.start()
+            time.sleep(2)
+            stop.set()
+            sampler.join()
+
+            busy = []
+            stop = threading.Event()
+            sampler = threading.Thread(target=sample_latency, args=(client, stop, busy))
+            sampler.start()
+
+            def do_import(i):
+                with httpx.Client(base_url=base_url, timeout=600) as import_client:
+                    response = import_client.post("/api/projects/import/github",
+                                                  json={"repo_url": "file://" + bare, "project_name": f"clone{i}"})
+                    response.raise_for_status()
+
+            start = time.perf_counter()
+            importers = [threading.Thread(target=do_import, args=(i,)) for i in range(args.clones)]
+            for importer in importers:
+                importer.start()
+            for importer in importers:
+                importer.join()
+            clone_time = time.perf_counter() - start
+            stop.set()
+            sampler.join()
+
+        print(f"{args.clones} concurrent clones took {clone_time:.2f}s")
+        for label, samples in (("idle", idle), ("during clones", busy)):
+            print(f"/api/projects/ {label}: n={len(samples)} "
+                  f"p50={statistics.median(samples):.1f}ms p99={percentile(samples, 99):.1f}ms "
+                  f"max={max(samples):.1f}ms")
+    finally:
+        server.should_exit = True
+        thread.join()
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import os
+from array import array
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Version of the integer-indexed JSON layout produced by to_json.
+COMPACT_FORMAT = 1
+
+# Node keys that are not stored per node: the name is the basename of the
+# path and every node of an import graph is a Python file.
+_DERIVED_KEYS = ("id", "name", "type")
+
+class CompactGraph:
+    """
+    Import graph that stores every path once.
+
+    Nodes are numbered in insertion order: paths[i] is the path of node i and
+    index maps a path back to its number. Edges are two parallel array('I')
+    columns of node numbers, 4 bytes per endpoint instead of a dict holding
+    two path strings. Node attributes other than id/name/type are kept as
+    one list per attribute, aligned with paths.
+    """
+
+    def __init__(self):
+        self.paths: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.sources = array("I")
+        self.targets = array("I")
+        self.columns: Dict[str, List[Any]] = {}
+
+    @property
+    def node_count(self) -> int:
+        return len(self.paths)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.sources)
+
+    def add_node(self, node: Dict[str, Any]) -> int:
+        path = node["id"]
+        number = self.index.get(path)
+        if number is not None:
+            return number
+
+        number = len(self.paths)
+        self.paths.append(path)
+        self.index[path] = number
+        for key, column in self.columns.items():
+            column.append(node.get(key))
+        for key, value in node.items():
+            if key not in _DERIVED_KEYS and key not in self.columns:
+                self.columns[key] = [None] * number + [value]
+        return number
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        """Merges attributes into the node whose path is attributes["id"]."""
+        number = self.index[attributes["id"]]
+        for key, value in attributes.items():
+            if key in _DERIVED_KEYS:
+                continue
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[key] = [None] * len(self.paths)
+            column[number] = value
+
+    def add_edge(self, source: str, target: str):
+        self.sources.append(self.index[source])
+        self.targets.append(self.index[target])
+
+    def iter_edges(self) -> Iterable[Tuple[str, str]]:
+        paths = self.paths
+        for source, target in zip(self.sources, self.targets):
+            yield paths[source], paths[target]
+
+    @classmethod
+    def from_events(cls, events: Iterable[Tuple[str, Dict[str, Any]]]) -> "CompactGraph":
+        """Builds the graph from analyzer.iter_analysis events without keeping the dicts."""
+        graph = cls()
+        for kind, item in events:
+            if kind == "node":
+                graph.add_node(item)
+            elif kind == "edge":
+                graph.add_edge(item["source"], item["target"])
+            else:
+                graph.set_attributes(item)
+        return graph
+
+    @classmethod
+    def from_graph(cls, graph: Dict[str, List[Dict[str, Any]]]) -> "CompactGraph":
+        compact = cls()
+        for node in graph["nodes"]:
+            compact.add_node(node)
+        for edge in graph["edges"]:
+            compact.add_edge(edge["source"], edge["target"])
+        return compact
+
+    def to_graph(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Expands back to the verbose {"nodes": [...], "edges": [...]} layout."""
+        nodes = []
+        for number, path in enumerate(self.paths):
+            node = {"id": path, "name": os.path.basename(path), "type": "python"}
+            for key, column in self.columns.items():
+                if column[number] is not None:
+                    node[key] = column[number]
+            nodes.append(node)
+        edges = [{"source": source, "target": target} for source, target in self.iter_edges()]
+        return {"nodes": nodes, "edges": edges}
+
+    def to_json(self) -> Dict[str, Any]:
+        """
+        Integer-indexed JSON layout: edge i goes from paths[sources[i]] to
+        paths[targets[i]], and node_attributes[key][n] belongs to paths[n].
+        """
+        return {
+            "format": "compact",
+            "version": COMPACT_FORMAT,
+            "paths": self.paths,
+            "sources": self.sources.tolist(),
+            "targets": self.targets.tolist(),
+            "node_attributes": self.columns,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "CompactGraph":
+        if data.get("format") != "compact" or data.get("version") != COMPACT_FORMAT:
+            raise ValueError("Unsupported compact graph layout")
+        graph = cls()
+        graph.paths = list(data["paths"])
+        graph.index = {path: number for number, path in enumerate(graph.paths)}
+        graph.sources = array("I", data["sources"])
+        graph.targets = array("I", data["targets"])
+        graph.columns = {key: list(column) for key, column in data.get("node_attributes", {}).items()}
+        return graph
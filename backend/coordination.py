@@ -0,0 +1,179 @@
+import os
+import time
+import uuid
+import fcntl
+import atexit
+import socket
+import hashlib
+import threading
+from typing import Dict, Iterable
+
+import database
+
+# Lock files shared by every worker process; None puts them next to the database.
+# flock only coordinates processes on one host, so this must be a local disk.
+LOCK_DIR = os.environ.get("DARKTORCH_LOCK_DIR")
+
+_worker = {"pid": None, "id": None, "lock": None}
+_worker_guard = threading.Lock()
+
+class LockBusy(Exception):
+    pass
+
+def lock_dir() -> str:
+    return LOCK_DIR or os.path.join(os.path.dirname(os.path.abspath(database.DB_PATH)), "locks")
+
+def lock_name(prefix: str, key: str) -> str:
+    # Names end up as file names; keys like URLs or project names are hashed
+    return f"{prefix}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]}"
+
+class FileLock:
+    """
+    Exclusive lock shared by threads and worker processes, `with FileLock(name):`.
+
+    Every acquisition opens its own descriptor, so two threads of one process
+    exclude each other just like two processes do. The kernel drops the lock
+    when its holder dies, so a crashed worker never leaves a project locked.
+    Locks of things that are gone (a deleted mirror) are released with
+    remove(), which deletes their file too.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._fd = None
+        self._path = None
+
+    def acquire(self, blocking: bool = True, timeout: float = None) -> "FileLock":
+        """Raises LockBusy when non-blocking, or after timeout seconds, the lock is held elsewhere."""
+        path = os.path.join(lock_dir(), f"{self.name}.lock")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                while True:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | (fcntl.LOCK_NB if not blocking or deadline else 0))
+                        break
+                    except BlockingIOError:
+                        if deadline is None or time.monotonic() >= deadline:
+                            raise LockBusy(f"Lock '{self.name}' is held by another worker")
+                        time.sleep(0.05)
+                # The previous holder may have removed the file while we
+                # waited: then we hold a lock nobody else can see, so retry
+                # on the file now at the path
+                current = os.fstat(fd)
+                try:
+                    latest = os.stat(path)
+                    if (latest.st_dev, latest.st_ino) == (current.st_dev, current.st_ino):
+                        break
+                except FileNotFoundError:
+                    pass
+            except BaseException:
+                os.close(fd)
+                raise
+            os.close(fd)
+        self._fd, self._path = fd, path
+        return self
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            # Closing the descriptor releases the lock
+            os.close(fd)
+
+    def remove(self):
+        """Deletes the lock file, then releases the lock; the caller holds it."""
+        if self._fd is not None:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+        self.release()
+
+    def __enter__(self) -> "FileLock":
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+def project_lock(project_id: int) -> FileLock:
+    """Serialises analyses, pulls and snapshot writes of one project across workers."""
+    return FileLock(f"project-{project_id}")
+
+def is_locked(name: str) -> bool:
+    try:
+        FileLock(name).acquire(blocking=False).release()
+    except LockBusy:
+        return True
+    return False
+
+# --- Worker identity ---
+# Rows a worker owns (jobs, batches) carry its id. The worker holds the lock
+# file of its id while it lives, so any other worker can tell whether the
+# owner of a row is gone without a heartbeat.
+
+def worker_id() -> str:
+    with _worker_guard:
+        if _worker["pid"] != os.getpid():
+            # First call in this process (or a forked child of a worker)
+            identity = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            lock = FileLock(f"worker-{identity}").acquire(blocking=False)
+            _worker.update(pid=os.getpid(), id=identity, lock=lock)
+        return _worker["id"]
+
+@atexit.register
+def _remove_worker_lock():
+    # A worker that exits cleanly takes its lock file along; those of crashed
+    # workers are removed by the first worker_alive() that finds them dead
+    with _worker_guard:
+        if _worker["pid"] == os.getpid():
+            _worker["lock"].remove()
+            _worker.update(pid=None, id=None, lock=None)
+
+def worker_alive(owner: str) -> bool:
+    if owner is None:
+        # Rows written before workers were tracked
+        return False
+    if owner == worker_id():
+        return True
+    name = f"worker-{owner}"
+    if not os.path.exists(os.path.join(lock_dir(), f"{name}.lock")):
+        return False
+    try:
+        FileLock(name).acquire(blocking=False).remove()
+    except LockBusy:
+        return True
+    return False
+
+# --- Generations ---
+# A counter per scope, bumped in the transaction of every write that makes
+# state held in worker memory stale. Readers compare it with the value they
+# last saw instead of reloading the state itself.
+
+def graph_scope(project_id: int) -> str:
+    return f"graph:{project_id}"
+
+def watch_scope(project_id: int) -> str:
+    return f"watch:{project_id}"
+
+def bump_generation(conn, scope: str) -> int:
+    """Increments the generation of scope in the caller's transaction and returns it."""
+    return conn.execute(
+        """
+        INSERT INTO generations (scope, value) VALUES (?, 1)
+        ON CONFLICT(scope) DO UPDATE SET value = value + 1
+        RETURNING value
+        """,
+        (scope,)
+    ).fetchone()[0]
+
+def read_generations(conn, scopes: Iterable[str]) -> Dict[str, int]:
+    """Current generation of every scope; never-bumped scopes are 0."""
+    scopes = list(scopes)
+    generations = dict.fromkeys(scopes, 0)
+    rows = conn.execute(
+        f"SELECT scope, value FROM generations WHERE scope IN ({', '.join('?' * len(scopes))})", scopes
+    ).fetchall()
+    generations.update((row[0], row[1]) for row in rows)
+    return generations
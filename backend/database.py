@@ -1,31 +1,67 @@
 import sqlite3
 import os
+import time
 
-DB_PATH = "/app/data/darktorch.db"
+from db_pool import ConnectionPool
+from notes import note_hash
+import search
+import coordination
 
-def get_db_connection():
+# Shared by every worker process of a deployment.
+DB_PATH = os.environ.get("DARKTORCH_DB_PATH", "/app/data/darktorch.db")
+
+pool = ConnectionPool()
+_ensured_dirs = set()
+
+def _ensure_db_dir():
     # Ensure directory exists if running locally for testing outside docker
     # In docker, /app/data is a volume.
-    # If running locally, we might need to adjust or ensure the dir exists.
+    # Checked once per directory instead of on every connection.
     db_dir = os.path.dirname(DB_PATH)
+    if db_dir in _ensured_dirs:
+        return
     if not os.path.exists(db_dir) and db_dir != "":
         try:
             os.makedirs(db_dir)
         except OSError:
             pass # Might be permission issue or already exists
-            
+    _ensured_dirs.add(db_dir)
+
+def get_db_connection():
+    """Opens a fresh connection the caller has to close; prefer pooled_connection."""
+    _ensure_db_dir()
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
+def pooled_connection():
+    """Checks a WAL-mode connection out of the shared pool: `with pooled_connection() as conn:`."""
+    _ensure_db_dir()
+    return pool.connection(DB_PATH)
+
+def get_db():
+    """FastAPI dependency yielding a pooled connection for the duration of the request."""
+    with pooled_connection() as conn:
+        yield conn
+
 def init_db():
+    # Pooled connections may still point at a database file that was replaced
+    pool.close_all()
+    _ensure_db_dir()
+    # Workers start together; one at a time runs the migrations
+    with coordination.FileLock("init-db"):
+        _init_schema()
+
+def _init_schema():
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.executescript('''
         CREATE TABLE IF NOT EXISTS notes (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            file_path TEXT NOT NULL UNIQUE,
-            content TEXT NOT NULL
+            project_id INTEGER NOT NULL DEFAULT 0,
+            file_path TEXT NOT NULL,
+            content TEXT NOT NULL,
+            content_hash TEXT
         );
 
         CREATE TABLE IF NOT EXISTS projects (
@@ -35,6 +71,210 @@ def init_db():
             github_url TEXT,
             last_analysis TEXT
         );
+
+        CREATE TABLE IF NOT EXISTS file_analysis_cache (
+            root_path TEXT NOT NULL,
+            rel_path TEXT NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            imports TEXT NOT NULL,
+            symbols TEXT NOT NULL DEFAULT '[]',
+            metrics TEXT NOT NULL DEFAULT '{}',
+            version INTEGER NOT NULL,
+            PRIMARY KEY (root_path, rel_path)
+        );
+
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            id TEXT PRIMARY KEY,
+            project_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            files_scanned INTEGER NOT NULL DEFAULT 0,
+            files_parsed INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            result TEXT,
+            error TEXT,
+            owner TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS graph_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            format INTEGER NOT NULL,
+            commit_sha TEXT,
+            etag TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            node_count INTEGER NOT NULL,
+            edge_count INTEGER NOT NULL,
+            data BLOB NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_graph_snapshots_project ON graph_snapshots (project_id, id);
+
+        CREATE TABLE IF NOT EXISTS graph_layouts (
+            snapshot_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            node_count INTEGER NOT NULL,
+            data BLOB NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS project_syncs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            before_commit TEXT,
+            after_commit TEXT,
+            synced_at TEXT NOT NULL,
+            changed_files INTEGER,
+            analysis TEXT NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_project_syncs_project ON project_syncs (project_id, id);
+
+        CREATE TABLE IF NOT EXISTS chunk_embeddings (
+            content_hash TEXT NOT NULL,
+            model TEXT NOT NULL,
+            chunks TEXT NOT NULL,
+            vectors BLOB NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (content_hash, model)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_chunk_embeddings_last_used ON chunk_embeddings (last_used);
+
+        CREATE TABLE IF NOT EXISTS batch_jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            finished_at REAL,
+            owner TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS batch_items (
+            batch_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            target TEXT NOT NULL,
+            host TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            message TEXT,
+            result TEXT,
+            started_at REAL,
+            finished_at REAL,
+            PRIMARY KEY (batch_id, position)
+        );
+
+        CREATE TABLE IF NOT EXISTS generations (
+            scope TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS analysis_profiles (
+            id TEXT PRIMARY KEY,
+            project_id INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            trace BLOB NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_analysis_profiles_project ON analysis_profiles (project_id);
     ''')
+    _migrate_notes(conn)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_project_path ON notes (project_id, file_path)")
+    _migrate_file_cache(conn)
+    _migrate_owners(conn)
+    # At most one queued or running job per project, whichever worker took it
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_analysis_jobs_active ON analysis_jobs (project_id) "
+        "WHERE status IN ('queued', 'running')"
+    )
+    _create_search_index(conn)
     conn.commit()
     conn.close()
+
+def _migrate_notes(conn: sqlite3.Connection):
+    # Older databases keyed notes by file_path alone. Rebuild the table so the
+    # same path can carry a note in several projects; existing notes keep
+    # project_id 0, the unscoped namespace used by /api/notes/.
+    columns = [row["name"] for row in conn.execute("PRAGMA table_info(notes)")]
+    if "project_id" in columns:
+        return
+
+    print("Migrating notes table to project-scoped notes...")
+    conn.executescript('''
+        BEGIN;
+        ALTER TABLE notes RENAME TO notes_old;
+        CREATE TABLE notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL DEFAULT 0,
+            file_path TEXT NOT NULL,
+            content TEXT NOT NULL,
+            content_hash TEXT
+        );
+        INSERT INTO notes (id, project_id, file_path, content) SELECT id, 0, file_path, content FROM notes_old;
+        DROP TABLE notes_old;
+        COMMIT;
+    ''')
+    rows = conn.execute("SELECT id, content FROM notes").fetchall()
+    conn.executemany("UPDATE notes SET content_hash = ? WHERE id = ?", [(note_hash(r["content"]), r["id"]) for r in rows])
+
+def _migrate_file_cache(conn: sqlite3.Connection):
+    # Rows written before symbols and metrics were extracted carry an older
+    # cache version, so they are re-parsed (and the new columns filled in) on
+    # the next analysis.
+    columns = [row["name"] for row in conn.execute("PRAGMA table_info(file_analysis_cache)")]
+    if "symbols" not in columns:
+        conn.execute("ALTER TABLE file_analysis_cache ADD COLUMN symbols TEXT NOT NULL DEFAULT '[]'")
+    if "metrics" not in columns:
+        conn.execute("ALTER TABLE file_analysis_cache ADD COLUMN metrics TEXT NOT NULL DEFAULT '{}'")
+
+def _migrate_owners(conn: sqlite3.Connection):
+    # Jobs and batches record the worker running them; rows without an owner
+    # are recovered as interrupted. Old active jobs are interrupted here
+    # already, as they would break the unique index on active jobs.
+    for table in ("analysis_jobs", "batch_jobs"):
+        columns = [row["name"] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if "owner" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN owner TEXT")
+            if table == "analysis_jobs":
+                conn.execute(
+                    "UPDATE analysis_jobs SET status = 'interrupted', finished_at = ? WHERE status IN ('queued', 'running')",
+                    (time.time(),)
+                )
+
+def _migrate_search_index(conn: sqlite3.Connection):
+    # Older indexes lack the scope column search() matches on. FTS5 tables
+    # cannot gain columns, so the index is rebuilt from its own rows.
+    columns = [row["name"] for row in conn.execute("PRAGMA table_info(search_index)")]
+    if not columns or "scope" in columns:
+        return
+
+    print("Rebuilding the search index with project scopes...")
+    rows = conn.execute(
+        """
+        SELECT i.rowid AS id, i.path, i.symbols, i.content, d.scope
+        FROM search_index AS i JOIN search_documents AS d ON d.id = i.rowid
+        """
+    ).fetchall()
+    conn.execute("DROP TABLE search_index")
+    conn.executescript(search.SCHEMA)
+    conn.executemany(
+        "INSERT INTO search_index (rowid, path, symbols, content, scope) VALUES (?, ?, ?, ?, ?)",
+        [(row["id"], row["path"], row["symbols"], row["content"], search.scope_token(row["scope"])) for row in rows]
+    )
+
+def _create_search_index(conn: sqlite3.Connection):
+    # Files are indexed as they are analysed; notes saved before the index
+    # existed are indexed once here.
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'search_documents'").fetchone()
+    if exists is not None:
+        _migrate_search_index(conn)
+    conn.executescript(search.SCHEMA)
+    if exists is None:
+        rows = conn.execute("SELECT project_id, file_path, content FROM notes").fetchall()
+        for row in rows:
+            search.index_notes(conn, row["project_id"], [(row["file_path"], row["content"])])
@@ -0,0 +1,73 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+# Pragmas applied to every pooled connection. WAL lets readers run while an
+# analysis is writing, and NORMAL sync is safe in WAL mode.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+class ConnectionPool:
+    """
+    Keeps open SQLite connections for reuse instead of connecting per request.
+
+    A connection is checked out for the duration of a `with pool.connection(path)`
+    block and returned afterwards, so its prepared statement cache survives
+    between requests. Connections are created with check_same_thread=False
+    because FastAPI may run a dependency and its endpoint on different
+    threadpool threads; the checkout guarantees one user at a time.
+    """
+
+    def __init__(self, max_idle: int = 16, cached_statements: int = 256):
+        self.max_idle = max_idle
+        self.cached_statements = cached_statements
+        self._lock = threading.Lock()
+        self._idle: Dict[str, List[Tuple[int, sqlite3.Connection]]] = {}
+        self._generation = 0
+
+    def _connect(self, path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False, cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self, path: str) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            idle = self._idle.get(path)
+            if idle:
+                generation, conn = idle.pop()
+            else:
+                generation, conn = self._generation, None
+        if conn is None:
+            conn = self._connect(path)
+
+        try:
+            yield conn
+        finally:
+            # Never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                idle = self._idle.setdefault(path, [])
+                keep = generation == self._generation and len(idle) < self.max_idle
+                if keep:
+                    idle.append((generation, conn))
+            if not keep:
+                conn.close()
+
+    def close_all(self):
+        """Closes idle connections; checked-out ones are closed when returned."""
+        with self._lock:
+            self._generation += 1
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for _, conn in connections:
+                conn.close()
@@ -0,0 +1,42 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator
+
+# Blocking work is split over dedicated pools so that a burst of slow clones
+# cannot take the threads the fast metadata endpoints run on (the default
+# threadpool of the server).
+GIT_WORKERS = int(os.environ.get("DARKTORCH_GIT_WORKERS", "4"))
+ANALYSIS_THREADS = int(os.environ.get("DARKTORCH_ANALYSIS_THREADS", "2"))
+FS_WORKERS = int(os.environ.get("DARKTORCH_FS_WORKERS", "2"))
+
+git_executor = ThreadPoolExecutor(max_workers=GIT_WORKERS, thread_name_prefix="git")
+analysis_executor = ThreadPoolExecutor(max_workers=ANALYSIS_THREADS, thread_name_prefix="analysis")
+fs_executor = ThreadPoolExecutor(max_workers=FS_WORKERS, thread_name_prefix="fs")
+
+async def run_in(executor: ThreadPoolExecutor, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Awaits fn(*args, **kwargs) running on the given executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+def _next_batch(iterator: Iterator, size: int) -> list:
+    batch = []
+    for item in iterator:
+        batch.append(item)
+        if len(batch) >= size:
+            break
+    return batch
+
+async def iterate_in(executor: ThreadPoolExecutor, iterator: Iterator, batch_size: int = 256) -> AsyncIterator:
+    """
+    Drives a blocking iterator on the given executor, batch_size items per hop,
+    and yields its items to async code (e.g. a StreamingResponse body).
+    """
+    iterator = iter(iterator)
+    while True:
+        batch = await run_in(executor, _next_batch, iterator, batch_size)
+        if not batch:
+            return
+        for item in batch:
+            yield item
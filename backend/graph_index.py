@@ -0,0 +1,168 @@
+import functools
+from array import array
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from compact_graph import CompactGraph
+from snapshots import get_snapshot_data, load_graph
+
+def _csr(node_count: int, sources: array, targets: array) -> Tuple[array, array]:
+    # Counting sort of the edges by source: neighbors of node n are
+    # targets[offsets[n]:offsets[n + 1]]
+    offsets = array("I", [0]) * (node_count + 1)
+    for source in sources:
+        offsets[source + 1] += 1
+    for number in range(node_count):
+        offsets[number + 1] += offsets[number]
+
+    fill = array("I", offsets[:-1])
+    neighbors = array("I", [0]) * len(sources)
+    for source, target in zip(sources, targets):
+        neighbors[fill[source]] = target
+        fill[source] += 1
+    return offsets, neighbors
+
+class GraphIndex:
+    """
+    Adjacency index of one graph snapshot for dependency queries.
+
+    Imports (file -> imported file) and their reverse (file -> importing
+    file) are stored in CSR form: one offsets array and one flat neighbor
+    array per direction, so the neighbors of a node are a single slice.
+    """
+
+    def __init__(self, graph: CompactGraph):
+        self.paths = graph.paths
+        self.numbers = graph.index
+        edges = sorted(set(zip(graph.sources, graph.targets)))
+        sources = array("I", (source for source, _ in edges))
+        targets = array("I", (target for _, target in edges))
+        self.offsets, self.neighbors = _csr(len(self.paths), sources, targets)
+        self.reverse_offsets, self.reverse_neighbors = _csr(len(self.paths), targets, sources)
+        self._cycles = None
+
+    def number(self, path: str) -> int:
+        """Node number of a path; raises KeyError for unknown files."""
+        return self.numbers[path]
+
+    def imports(self, number: int) -> array:
+        return self.neighbors[self.offsets[number]:self.offsets[number + 1]]
+
+    def importers(self, number: int) -> array:
+        return self.reverse_neighbors[self.reverse_offsets[number]:self.reverse_offsets[number + 1]]
+
+    def reachable(self, start: int, reverse: bool = False, max_depth: Optional[int] = None) -> Dict[int, int]:
+        """
+        Breadth-first search from start along imports, or along importers
+        when reverse is set. Returns {node: depth} without the start node.
+        """
+        offsets, neighbors = (self.reverse_offsets, self.reverse_neighbors) if reverse else (self.offsets, self.neighbors)
+        depths = {start: 0}
+        frontier = [start]
+        depth = 0
+        while frontier and (max_depth is None or depth < max_depth):
+            depth += 1
+            next_frontier = []
+            for node in frontier:
+                for neighbor in neighbors[offsets[node]:offsets[node + 1]]:
+                    if neighbor not in depths:
+                        depths[neighbor] = depth
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        del depths[start]
+        return depths
+
+    def shortest_path(self, source: int, target: int) -> Optional[List[int]]:
+        """Fewest-hops chain of imports leading from source to target, or None."""
+        if source == target:
+            return [source]
+        parents = {source: source}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            for neighbor in self.neighbors[self.offsets[node]:self.offsets[node + 1]]:
+                if neighbor in parents:
+                    continue
+                parents[neighbor] = node
+                if neighbor == target:
+                    path = [target]
+                    while path[-1] != source:
+                        path.append(parents[path[-1]])
+                    return path[::-1]
+                queue.append(neighbor)
+        return None
+
+    def cycles(self) -> List[List[int]]:
+        """
+        Strongly connected components with more than one file, i.e. import
+        cycles, largest first. Computed once per index with an iterative
+        Tarjan so deep graphs cannot hit the recursion limit.
+        """
+        if self._cycles is not None:
+            return self._cycles
+
+        offsets, neighbors = self.offsets, self.neighbors
+        count = len(self.paths)
+        index = [-1] * count
+        lowlink = [0] * count
+        on_stack = [False] * count
+        stack = []
+        components = []
+        counter = 0
+
+        for root in range(count):
+            if index[root] != -1:
+                continue
+            # Each frame is (node, position of the next neighbor to visit)
+            work = [(root, offsets[root])]
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+
+            while work:
+                node, position = work[-1]
+                if position < offsets[node + 1]:
+                    work[-1] = (node, position + 1)
+                    neighbor = neighbors[position]
+                    if index[neighbor] == -1:
+                        index[neighbor] = lowlink[neighbor] = counter
+                        counter += 1
+                        stack.append(neighbor)
+                        on_stack[neighbor] = True
+                        work.append((neighbor, offsets[neighbor]))
+                    elif on_stack[neighbor]:
+                        lowlink[node] = min(lowlink[node], index[neighbor])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1:
+                        components.append(component)
+
+        components.sort(key=len, reverse=True)
+        self._cycles = components
+        return components
+
+@functools.lru_cache(maxsize=8)
+def get_graph_index(snapshot_id: int, etag: str) -> Optional[GraphIndex]:
+    """
+    Returns the index of a stored snapshot, building it on first use.
+
+    Snapshot data never changes for a given (id, ETag), so indexes of the
+    most recently queried snapshots are kept in memory.
+    """
+    data = get_snapshot_data(snapshot_id)
+    if data is None:
+        return None
+    return GraphIndex(CompactGraph.from_graph(load_graph({"data": data})))
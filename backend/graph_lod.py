@@ -0,0 +1,158 @@
+import bisect
+import functools
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from compact_graph import CompactGraph
+from snapshots import get_snapshot_data, load_graph
+
+# Largest number of files a viewport request returns.
+VIEWPORT_LIMIT = 2000
+
+def _parent(path: str) -> str:
+    # "a/b/c.py" -> "a/b/", "a/b/" -> "a/", "c.py" -> ""
+    cut = path.rstrip("/").rfind("/")
+    return path[:cut + 1]
+
+class DirectoryIndex:
+    """
+    Level-of-detail index of one graph snapshot.
+
+    Files are kept in sorted path order, so the files below any directory
+    prefix form one contiguous range found by bisection. A view collapses
+    every directory that is not expanded into a super-node and aggregates
+    the file edges between the visible units into weighted edges, which is
+    a vectorised pass over the edge columns.
+    """
+
+    def __init__(self, graph: CompactGraph):
+        self.graph = graph
+        order = sorted(range(graph.node_count), key=graph.paths.__getitem__)
+        self.sorted_paths = [graph.paths[number] for number in order]
+        rank = np.empty(graph.node_count, dtype=np.int64)
+        rank[order] = np.arange(graph.node_count)
+        self.order = order
+        self.sources = rank[np.asarray(graph.sources, dtype=np.int64)]
+        self.targets = rank[np.asarray(graph.targets, dtype=np.int64)]
+
+        # Immediate children of every directory: (subdirectories, file ranks)
+        self.children: Dict[str, Tuple[List[str], List[int]]] = {"": ([], [])}
+        for position, path in enumerate(self.sorted_paths):
+            directory = _parent(path)
+            self._add_directory(directory)
+            self.children[directory][1].append(position)
+
+    def _add_directory(self, directory: str):
+        missing = []
+        while directory not in self.children:
+            missing.append(directory)
+            directory = _parent(directory)
+        for directory in reversed(missing):
+            self.children[directory] = ([], [])
+            self.children[_parent(directory)][0].append(directory)
+
+    def file_range(self, directory: str) -> Tuple[int, int]:
+        """Ranks [first, last) of the files below a directory prefix."""
+        first = bisect.bisect_left(self.sorted_paths, directory)
+        last = bisect.bisect_left(self.sorted_paths, directory + "\U0010ffff")
+        return first, last
+
+    def _visible(self, expanded: set, directory: str = "") -> Iterable[Tuple[str, Any]]:
+        # Yields ("dir", directory) for collapsed directories and ("file", rank)
+        subdirs, files = self.children[directory]
+        # A directory holding nothing but one subdirectory would show as a
+        # single node, so that subdirectory is opened right away
+        only_child = len(subdirs) == 1 and not files
+        for subdir in sorted(subdirs):
+            if subdir in expanded or only_child:
+                yield from self._visible(expanded, subdir)
+            else:
+                yield "dir", subdir
+        for position in files:
+            yield "file", position
+
+    def view(self, expanded: Iterable[str] = ()) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Graph with every directory collapsed except the expanded ones (and
+        their ancestors). Edges carry the number of file imports they stand for.
+        """
+        wanted = set()
+        for directory in expanded:
+            directory = directory.strip("/") + "/"
+            while directory and directory in self.children:
+                wanted.add(directory)
+                directory = _parent(directory)
+
+        unit_of = np.empty(len(self.sorted_paths), dtype=np.int64)
+        nodes = []
+        for kind, item in self._visible(wanted):
+            unit = len(nodes)
+            if kind == "dir":
+                first, last = self.file_range(item)
+                unit_of[first:last] = unit
+                nodes.append(self._directory_node(item, last - first))
+            else:
+                unit_of[item] = unit
+                nodes.append(_file_node(self.graph, self.order[item]))
+
+        edges = []
+        if len(self.sources):
+            source_units = unit_of[self.sources]
+            target_units = unit_of[self.targets]
+            between = source_units != target_units
+            pairs = source_units[between] * len(nodes) + target_units[between]
+            keys, weights = np.unique(pairs, return_counts=True)
+            for key, weight in zip(keys.tolist(), weights.tolist()):
+                source, target = divmod(key, len(nodes))
+                edges.append({"source": nodes[source]["id"], "target": nodes[target]["id"], "weight": weight})
+        return {"nodes": nodes, "edges": edges}
+
+    def _directory_node(self, directory: str, file_count: int) -> Dict[str, Any]:
+        name = directory.rstrip("/").rsplit("/", 1)[-1]
+        is_package = directory + "__init__.py" in self.graph.index
+        return {"id": directory, "name": name, "type": "package" if is_package else "directory", "files": file_count}
+
+def _file_node(graph: CompactGraph, number: int) -> Dict[str, Any]:
+    path = graph.paths[number]
+    node = {"id": path, "name": path.rsplit("/", 1)[-1], "type": "python"}
+    for key, column in graph.columns.items():
+        if column[number] is not None:
+            node[key] = column[number]
+    return node
+
+def viewport(graph: CompactGraph, coords: np.ndarray, box: Tuple[float, float, float, float],
+             limit: int = VIEWPORT_LIMIT) -> Dict[str, Any]:
+    """
+    Files whose layout position lies inside box = (x0, y0, x1, y1), at most
+    limit of them, with the edges between them.
+    """
+    x0, y0, x1, y1 = box
+    inside = (coords[:, 0] >= x0) & (coords[:, 0] <= x1) & (coords[:, 1] >= y0) & (coords[:, 1] <= y1)
+    numbers = np.nonzero(inside)[0]
+    truncated = len(numbers) > limit
+    numbers = numbers[:limit]
+
+    selected = np.zeros(graph.node_count, dtype=bool)
+    selected[numbers] = True
+    sources = np.asarray(graph.sources, dtype=np.int64)
+    targets = np.asarray(graph.targets, dtype=np.int64)
+    keep = selected[sources] & selected[targets]
+
+    paths = graph.paths
+    nodes = []
+    for number in numbers.tolist():
+        x, y = coords[number].tolist()
+        node = _file_node(graph, number)
+        node["position"] = {"x": round(x, 1), "y": round(y, 1)}
+        nodes.append(node)
+    edges = [{"source": paths[s], "target": paths[t]} for s, t in zip(sources[keep].tolist(), targets[keep].tolist())]
+    return {"nodes": nodes, "edges": edges, "truncated": bool(truncated)}
+
+@functools.lru_cache(maxsize=8)
+def get_directory_index(snapshot_id: int, etag: str) -> Optional[DirectoryIndex]:
+    """Returns the level-of-detail index of a stored snapshot, built on first use."""
+    data = get_snapshot_data(snapshot_id)
+    if data is None:
+        return None
+    return DirectoryIndex(CompactGraph.from_graph(load_graph({"data": data})))
@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional
+
+from database import pooled_connection
+from coordination import worker_id, worker_alive
+
+# Analyses running at the same time, and how many more may wait for a slot.
+JOB_WORKERS = int(os.environ.get("DARKTORCH_JOB_WORKERS", "2"))
+MAX_QUEUED_JOBS = int(os.environ.get("DARKTORCH_MAX_QUEUED_JOBS", "32"))
+# Minimum delay between two progress writes of the same job.
+PROGRESS_INTERVAL = 0.5
+# Finished jobs kept per project, results included; older ones are pruned
+# when another one finishes.
+JOBS_TO_KEEP = int(os.environ.get("DARKTORCH_JOBS_TO_KEEP", "5"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+class JobQueueFull(Exception):
+    pass
+
+class JobManager:
+    """
+    Runs analysis jobs on a bounded thread pool and records their state in the
+    analysis_jobs table, so finished jobs can still be reported after a restart.
+
+    At most one job per project is active, across all worker processes: a
+    unique index on active jobs makes a second submission return the job
+    already queued or running, wherever it runs. Jobs of a worker that died
+    are marked interrupted when they get in the way. Only the JOBS_TO_KEEP
+    latest finished jobs of a project are kept.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = MAX_QUEUED_JOBS):
+        self.workers = workers
+        self.max_queued = max_queued
+        self._executor = None
+        self._lock = threading.Lock()
+        self._active = {}  # project_id -> job_id
+
+    def submit(self, project_id: int, run: Callable[[Dict[str, int]], Any]) -> Dict[str, Any]:
+        """
+        Queues run(progress) for the project and returns the job record.
+
+        run receives a progress dict whose "files_scanned" and "files_parsed"
+        counters it should update in place; its return value is stored as the
+        job result.
+        """
+        with self._lock:
+            job_id = self._active.get(project_id)
+            if job_id is not None:
+                return self.get(job_id)
+
+            if len(self._active) >= self.workers + self.max_queued:
+                raise JobQueueFull("Too many analysis jobs are pending, try again later")
+
+            # Queued or running in another worker
+            existing = self._active_job(project_id)
+            if existing is not None:
+                return existing
+
+            job_id = uuid.uuid4().hex
+            try:
+                with pooled_connection() as conn:
+                    conn.execute(
+                        "INSERT INTO analysis_jobs (id, project_id, status, created_at, owner) VALUES (?, ?, 'queued', ?, ?)",
+                        (job_id, project_id, time.time(), worker_id())
+                    )
+                    conn.commit()
+            except sqlite3.IntegrityError:
+                # Another worker queued one in the meantime
+                existing = self._active_job(project_id)
+                if existing is not None:
+                    return existing
+                raise
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis-job")
+            self._active[project_id] = job_id
+            self._executor.submit(self._run, job_id, project_id, run)
+
+        return self.get(job_id)
+
+    def _active_job(self, project_id: int) -> Optional[Dict[str, Any]]:
+        with pooled_connection() as conn:
+            row = conn.execute(
+                f"SELECT id, owner FROM analysis_jobs WHERE project_id = ? AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))})",
+                (project_id, *ACTIVE_STATUSES)
+            ).fetchone()
+            if row is None:
+                return None
+            if not worker_alive(row["owner"]):
+                _interrupt(conn, [row["id"]])
+                conn.commit()
+                return None
+        return self.get(row["id"])
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with pooled_connection() as conn:
+            row = conn.execute("SELECT * FROM analysis_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        del job["owner"]
+        started = job.pop("started_at")
+        finished = job.pop("finished_at")
+        job["elapsed"] = None if started is None else (finished or time.time()) - started
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def _update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with pooled_connection() as conn:
+            conn.execute(f"UPDATE analysis_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            conn.commit()
+
+    def _run(self, job_id: str, project_id: int, run: Callable[[Dict[str, int]], Any]):
+        progress = _ProgressCounter(lambda counts: self._update(job_id, **counts))
+        try:
+            self._update(job_id, status="running", started_at=time.time())
+            result = run(progress)
+            final = dict(status="done", result=json.dumps(result), **progress)
+        except Exception as e:
+            print(f"Analysis job {job_id} for project {project_id} failed: {e}")
+            final = dict(status="failed", error=str(e))
+
+        # Release the project before publishing the final state, so a client
+        # that saw the job finish can immediately submit a new one
+        with self._lock:
+            self._active.pop(project_id, None)
+        try:
+            self._finish(job_id, project_id, **final)
+        except Exception as e:
+            print(f"Error recording the end of analysis job {job_id}: {e}")
+
+    def _finish(self, job_id: str, project_id: int, **fields):
+        # Every result holds a whole graph, so older ones go in the same transaction
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with pooled_connection() as conn:
+            conn.execute(f"UPDATE analysis_jobs SET finished_at = ?, {assignments} WHERE id = ?",
+                         (time.time(), *fields.values(), job_id))
+            _prune_jobs(conn, project_id)
+            conn.commit()
+
+class _ProgressCounter(dict):
+    # Counter dict that flushes itself at most every PROGRESS_INTERVAL seconds
+    def __init__(self, flush: Callable[[Dict[str, int]], None]):
+        super().__init__(files_scanned=0, files_parsed=0)
+        self._flush = flush
+        self._last_flush = 0.0
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        now = time.monotonic()
+        if now - self._last_flush >= PROGRESS_INTERVAL:
+            self._last_flush = now
+            try:
+                self._flush(dict(self))
+            except Exception as e:
+                print(f"Error recording job progress: {e}")
+
+def _interrupt(conn, job_ids):
+    conn.executemany(
+        "UPDATE analysis_jobs SET status = 'interrupted', finished_at = ? WHERE id = ?",
+        [(time.time(), job_id) for job_id in job_ids]
+    )
+
+def _prune_jobs(conn, project_id: int):
+    finished = f"project_id = ? AND status NOT IN ({', '.join('?' * len(ACTIVE_STATUSES))})"
+    conn.execute(
+        f"""
+        DELETE FROM analysis_jobs WHERE {finished} AND rowid NOT IN (
+            SELECT rowid FROM analysis_jobs WHERE {finished} ORDER BY created_at DESC LIMIT ?
+        )
+        """,
+        (project_id, *ACTIVE_STATUSES, project_id, *ACTIVE_STATUSES, JOBS_TO_KEEP)
+    )
+
+def delete_jobs(conn, project_id: int):
+    # Part of the caller's transaction, like delete_snapshots. A job still
+    # running finds no row to record its end in.
+    conn.execute("DELETE FROM analysis_jobs WHERE project_id = ?", (project_id,))
+
+def recover_jobs():
+    """Marks jobs left queued or running by worker processes that are gone as interrupted."""
+    with pooled_connection() as conn:
+        rows = conn.execute(
+            f"SELECT id, owner FROM analysis_jobs WHERE status IN ({', '.join('?' * len(ACTIVE_STATUSES))})",
+            ACTIVE_STATUSES
+        ).fetchall()
+        alive = {}
+        for row in rows:
+            if row["owner"] not in alive:
+                alive[row["owner"]] = worker_alive(row["owner"])
+        _interrupt(conn, [row["id"] for row in rows if not alive[row["owner"]]])
+        conn.commit()
+
+job_manager = JobManager()
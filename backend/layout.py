@@ -0,0 +1,184 @@
+import zlib
+import datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from database import pooled_connection
+
+# Bump when the algorithm changes so cached layouts are recomputed.
+LAYOUT_VERSION = 1
+LAYOUT_ITERATIONS = 60
+# Up to this many nodes every pair of nodes repels exactly; above it the
+# repulsion of distant nodes is approximated per grid cell.
+EXACT_REPULSION_MAX = 2000
+# Pull towards the centre that keeps disconnected parts from drifting away.
+GRAVITY = 1.0
+# Pixels per unit of ideal edge length in the returned coordinates.
+LAYOUT_SCALE = 120.0
+# Rows per block when computing node-to-node or node-to-cell forces.
+_BLOCK_ROWS = 2048
+
+def _initial_positions(paths: Sequence[str]) -> np.ndarray:
+    # Seeded by path, so a file starts at the same spot in every snapshot and
+    # layouts of successive snapshots stay similar
+    hashes = np.fromiter((zlib.crc32(path.encode("utf-8")) for path in paths), dtype=np.uint32, count=len(paths))
+    side = np.sqrt(len(paths))
+    xy = np.stack([(hashes & 0xFFFF) / 65535.0, (hashes >> 16) / 65535.0], axis=1)
+    return (xy * side).astype(np.float64)
+
+def _pairwise(x: np.ndarray, y: np.ndarray, ox: np.ndarray, oy: np.ndarray, weights: Optional[np.ndarray],
+              skip: Optional[np.ndarray] = None) -> np.ndarray:
+    # Repulsion k^2/d of (ox, oy), each weighted, on every (x, y). Computed
+    # on separate float32 columns in row blocks to bound the temporaries.
+    force = np.empty((len(x), 2), dtype=np.float32)
+    for start in range(0, len(x), _BLOCK_ROWS):
+        rows = slice(start, start + _BLOCK_ROWS)
+        dx = x[rows, None] - ox[None, :]
+        dy = y[rows, None] - oy[None, :]
+        dist2 = dx * dx + dy * dy
+        np.maximum(dist2, 1e-4, out=dist2)
+        weight = np.reciprocal(dist2, out=dist2)
+        if weights is not None:
+            weight *= weights[None, :]
+        if skip is not None:
+            weight[np.arange(len(dx)), skip[rows]] = 0.0
+        force[rows, 0] = np.einsum("ij,ij->i", weight, dx)
+        force[rows, 1] = np.einsum("ij,ij->i", weight, dy)
+    return force
+
+def _repulsion_exact(pos: np.ndarray) -> np.ndarray:
+    x = pos[:, 0].astype(np.float32)
+    y = pos[:, 1].astype(np.float32)
+    return _pairwise(x, y, x, y, None)
+
+def _grid_size(node_count: int) -> int:
+    # Cells per side. Import graphs are clustered, so the exact near field
+    # costs more than n^2 / cells; measured best around sqrt(n) / 8.
+    return int(min(24, max(4, np.sqrt(node_count) / 8)))
+
+def _repulsion_grid(pos: np.ndarray) -> np.ndarray:
+    """
+    One-level Barnes-Hut approximation on a uniform grid.
+
+    Nodes in the same cell repel each other exactly. Every other cell acts as
+    a single body of its total mass placed at its centroid, so an iteration
+    costs O(n * cells) instead of O(n^2).
+    """
+    n = len(pos)
+    grid = _grid_size(n)
+    low = pos.min(axis=0)
+    span = np.maximum(pos.max(axis=0) - low, 1e-9)
+    cell_xy = np.minimum(((pos - low) / span * grid).astype(np.int64), grid - 1)
+    cells = cell_xy[:, 0] * grid + cell_xy[:, 1]
+
+    mass = np.bincount(cells, minlength=grid * grid).astype(np.float64)
+    occupied = np.nonzero(mass)[0]
+    cx = (np.bincount(cells, weights=pos[:, 0], minlength=grid * grid)[occupied] / mass[occupied]).astype(np.float32)
+    cy = (np.bincount(cells, weights=pos[:, 1], minlength=grid * grid)[occupied] / mass[occupied]).astype(np.float32)
+    # Position of each node's own cell among the occupied ones, which is
+    # left out of the far field
+    own = np.searchsorted(occupied, cells)
+
+    x = pos[:, 0].astype(np.float32)
+    y = pos[:, 1].astype(np.float32)
+    force = _pairwise(x, y, cx, cy, mass[occupied].astype(np.float32), skip=own)
+
+    order = np.argsort(cells, kind="stable")
+    bounds = np.append(np.searchsorted(cells[order], occupied), n)
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        if last - first > 1:
+            members = order[first:last]
+            force[members] += _repulsion_exact(pos[members])
+    return force
+
+def compute_layout(paths: Sequence[str], sources: Sequence[int], targets: Sequence[int],
+                   iterations: int = LAYOUT_ITERATIONS) -> np.ndarray:
+    """
+    Force-directed (Fruchterman-Reingold) layout of a graph given as node
+    paths and parallel edge columns of node numbers, e.g. a CompactGraph.
+
+    Returns an (n, 2) float32 array of coordinates. The result only depends
+    on the input, so the same snapshot always gets the same picture.
+    """
+    n = len(paths)
+    if n == 0:
+        return np.zeros((0, 2), dtype=np.float32)
+
+    pos = _initial_positions(paths)
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    keep = sources != targets
+    sources, targets = sources[keep], targets[keep]
+
+    k = 1.0
+    temperature = np.sqrt(n) / 10.0 + 1.0
+    cooling = temperature / (iterations + 1)
+    repulsion = _repulsion_exact if n <= EXACT_REPULSION_MAX else _repulsion_grid
+
+    for _ in range(iterations):
+        # Repulsion k^2/d with k = 1
+        force = repulsion(pos).astype(np.float64)
+
+        if len(sources):
+            delta = pos[sources] - pos[targets]
+            dist = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+            pull = delta * (dist / k)[:, None]
+            for axis in range(2):
+                force[:, axis] -= np.bincount(sources, weights=pull[:, axis], minlength=n)
+                force[:, axis] += np.bincount(targets, weights=pull[:, axis], minlength=n)
+
+        force -= GRAVITY * (pos - pos.mean(axis=0))
+
+        length = np.sqrt(np.einsum("ij,ij->i", force, force))
+        step = np.minimum(length, temperature) / np.maximum(length, 1e-9)
+        pos += force * step[:, None]
+        temperature -= cooling
+
+    pos -= pos.min(axis=0)
+    return (pos * LAYOUT_SCALE).astype(np.float32)
+
+def get_snapshot_layout(snapshot_id: int, paths: Sequence[str], sources: Sequence[int],
+                        targets: Sequence[int]) -> np.ndarray:
+    """
+    Returns the layout of a graph snapshot, computing and storing it on first use.
+
+    Coordinates are stored next to the snapshot as zlib-compressed float32
+    pairs in the order of the snapshot's nodes.
+    """
+    with pooled_connection() as conn:
+        row = conn.execute(
+            "SELECT version, node_count, data FROM graph_layouts WHERE snapshot_id = ?", (snapshot_id,)
+        ).fetchone()
+    if row is not None and row["version"] == LAYOUT_VERSION and row["node_count"] == len(paths):
+        return np.frombuffer(zlib.decompress(row["data"]), dtype=np.float32).reshape(-1, 2)
+
+    coords = compute_layout(paths, sources, targets)
+    try:
+        with pooled_connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO graph_layouts (snapshot_id, version, created_at, node_count, data) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(snapshot_id) DO UPDATE SET
+                    version = excluded.version,
+                    created_at = excluded.created_at,
+                    node_count = excluded.node_count,
+                    data = excluded.data
+                """,
+                (snapshot_id, LAYOUT_VERSION, datetime.datetime.now().isoformat(), len(paths),
+                 zlib.compress(coords.tobytes(), 6))
+            )
+            conn.commit()
+    except Exception as e:
+        print(f"Error saving layout of snapshot {snapshot_id}: {e}")
+    return coords
+
+def positions_by_id(paths: Sequence[str], coords: np.ndarray) -> Dict[str, Dict[str, float]]:
+    """Coordinates keyed by node id, as expected by Cytoscape's preset layout."""
+    rounded = np.round(coords.astype(np.float64), 1).tolist()
+    return {path: {"x": x, "y": y} for path, (x, y) in zip(paths, rounded)}
+
+def position_columns(coords: np.ndarray) -> Dict[str, List[float]]:
+    """Coordinates as x and y columns aligned with the compact layout's paths."""
+    rounded = np.round(coords.astype(np.float64), 1)
+    return {"x": rounded[:, 0].tolist(), "y": rounded[:, 1].tolist()}
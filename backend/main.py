@@ -1,12 +1,34 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from analyzer import analyze_project
+from analyzer import analyze_project, analyze_project_compact, iter_analysis, update_analysis
 import os
+import json
+import datetime
+import zlib
+import shutil
 import sqlite3
-from database import init_db, get_db_connection
+import git
+import asyncio
+from database import init_db, get_db, pooled_connection
 from typing import List, Optional
-from git_service import clone_repo
+from git_service import clone_repo, get_head_commit, pull_repo, diff_commits, evict_mirrors
+from notes import upsert_note, upsert_notes, get_notes
+from search import search, delete_scope, notes_scope
+from snapshots import save_snapshot, get_latest_snapshot, get_snapshot_data, get_compact_snapshot_data, compact_etag, delete_snapshots, load_graph
+from jobs import job_manager, recover_jobs, delete_jobs, JobQueueFull
+from coordination import project_lock
+from batches import batch_runner, recover_batches, RetryableError, MAX_BATCH_ITEMS
+from executors import run_in, iterate_in, git_executor, analysis_executor, fs_executor
+from watcher import watch_manager, WatchedElsewhere, SnapshotFollower, WATCH_INTERVAL
+from compact_graph import CompactGraph
+from graph_index import get_graph_index
+from graph_lod import get_directory_index, viewport, VIEWPORT_LIMIT
+import metrics
+from profiling import AnalysisProfile, save_profile, get_profile, get_profile_trace, delete_profiles
+from layout import compute_layout, get_snapshot_layout, positions_by_id, position_columns
 
 app = FastAPI()
 
@@ -17,6 +39,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so the recorded latency includes every other middleware
+app.add_middleware(metrics.MetricsMiddleware)
 
 # --- Models ---
 class AnalyzeRequest(BaseModel):
@@ -37,28 +61,52 @@ class ProjectOut(BaseModel):
 class NoteIn(BaseModel):
     file_path: str
     content: str
+    project_id: int = 0
 
 class NoteOut(BaseModel):
     id: int
     file_path: str
     content: str
+    project_id: int = 0
+    content_hash: Optional[str] = None
+
+class NotesQuery(BaseModel):
+    file_paths: List[str]
+
+class NoteItem(BaseModel):
+    file_path: str
+    content: str
+
+class NotesBatchIn(BaseModel):
+    notes: List[NoteItem]
 
 # --- Startup ---
 @app.on_event("startup")
 def on_startup():
     try:
         init_db()
+        recover_jobs()
+        recover_batches()
     except Exception as e:
         print(f"Error initializing database: {e}")
+    metrics.start_sharing()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    watch_manager.stop_all()
+    metrics.stop_sharing()
 
 # --- Endpoints ---
 @app.get("/api/health")
 def health_check():
     return {"status": "ok", "service": "backend"}
 
+@app.get("/metrics")
+def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.post("/api/projects/add", response_model=ProjectOut)
-def add_project(project: ProjectIn):
-    conn = get_db_connection()
+def add_project(project: ProjectIn, conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
     try:
         cursor.execute(
@@ -78,65 +126,112 @@ def add_project(project: ProjectIn):
         raise HTTPException(status_code=400, detail="Project with this path already exists")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 @app.get("/api/projects/", response_model=List[ProjectOut])
-def list_projects():
-    conn = get_db_connection()
+def list_projects(conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM projects")
     projects = cursor.fetchall()
-    conn.close()
     return [dict(p) for p in projects]
 
 @app.get("/api/projects/{project_id}", response_model=ProjectOut)
-def get_project(project_id: int):
-    conn = get_db_connection()
+def get_project(project_id: int, conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM projects WHERE id = ?", (project_id,))
     project = cursor.fetchone()
-    conn.close()
     if project is None:
         raise HTTPException(status_code=404, detail="Project not found")
     return dict(project)
 
-@app.delete("/api/projects/{project_id}")
-def delete_project(project_id: int):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get local_path before deleting
-    cursor.execute("SELECT local_path FROM projects WHERE id = ?", (project_id,))
-    project = cursor.fetchone()
-    
-    if not project:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Project not found")
-        
-    local_path = project['local_path']
-    
-    cursor.execute("DELETE FROM projects WHERE id = ?", (project_id,))
-    conn.commit()
-    conn.close()
-    
-    # Delete from filesystem
+# The I/O-heavy endpoints below are async and hand their blocking parts to
+# the dedicated executors; short database work uses the default threadpool.
+def _delete_project_row(project_id: int) -> str:
+    # Under the project lock, so the rows do not go while an analysis or a
+    # watcher update of the project is storing its graph
+    with project_lock(project_id), pooled_connection() as conn:
+        cursor = conn.cursor()
+
+        # Get local_path before deleting
+        cursor.execute("SELECT local_path FROM projects WHERE id = ?", (project_id,))
+        project = cursor.fetchone()
+
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+
+        cursor.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+        delete_snapshots(conn, project_id)
+        delete_profiles(conn, project_id)
+        delete_jobs(conn, project_id)
+        cursor.execute("DELETE FROM notes WHERE project_id = ?", (project_id,))
+        cursor.execute("DELETE FROM project_syncs WHERE project_id = ?", (project_id,))
+        delete_scope(conn, notes_scope(project_id))
+        delete_scope(conn, os.path.abspath(project['local_path']))
+        conn.commit()
+        return project['local_path']
+
+def _remove_tree(local_path: str):
     if os.path.exists(local_path):
         try:
-            import shutil
             shutil.rmtree(local_path)
         except Exception as e:
             print(f"Error deleting directory {local_path}: {e}")
+
+@app.delete("/api/projects/{project_id}")
+async def delete_project(project_id: int):
+    # Stopped first: a watcher stops only after its running update is done
+    await run_in_threadpool(watch_manager.stop, project_id)
+    local_path = await run_in_threadpool(_delete_project_row, project_id)
+
+    # Delete from filesystem
+    await run_in(fs_executor, _remove_tree, local_path)
+    # Its mirror may have lost its last user
+    await run_in(fs_executor, evict_mirrors)
             
     return {"status": "deleted", "id": project_id}
 
-@app.post("/api/analyze")
-def analyze_endpoint(request: AnalyzeRequest):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT local_path FROM projects WHERE id = ?", (request.project_id,))
-    project = cursor.fetchone()
-    conn.close()
+def _mark_analyzed(conn: sqlite3.Connection, project_id: int):
+    # Update last_analysis timestamp
+    timestamp = datetime.datetime.now().isoformat()
+    conn.execute("UPDATE projects SET last_analysis = ? WHERE id = ?", (timestamp, project_id))
+    conn.commit()
+
+def _store_snapshot(project_id: int, path: str, graph: dict) -> Optional[dict]:
+    # A failed snapshot write must not fail the analysis that produced the graph
+    try:
+        return save_snapshot(project_id, graph, get_head_commit(path))
+    except Exception as e:
+        print(f"Error saving graph snapshot for project {project_id}: {e}")
+        return None
+
+def _layout(snapshot: Optional[dict], graph: CompactGraph):
+    # Cached per snapshot; a graph that could not be stored is laid out anyway
+    if snapshot is None:
+        return compute_layout(graph.paths, graph.sources, graph.targets)
+    return get_snapshot_layout(snapshot["id"], graph.paths, graph.sources, graph.targets)
+
+def _stream_analysis(path: str, project_id: int):
+    # One JSON object per line: {"node": ...} / {"edge": ...}, then {"metrics": ...}
+    # for every node once all edges are known, then a final {"done": ...}
+    counts = {"node": 0, "edge": 0, "metrics": 0}
+    try:
+        with project_lock(project_id):
+            for kind, item in iter_analysis(path):
+                counts[kind] += 1
+                yield json.dumps({kind: item}) + "\n"
+            # The request connection is gone once the response body is streaming
+            with pooled_connection() as conn:
+                _mark_analyzed(conn, project_id)
+        yield json.dumps({"done": True, "nodes": counts["node"], "edges": counts["edge"]}) + "\n"
+    except Exception as e:
+        # Headers are already sent, so report the failure in-band
+        print(f"Streaming analysis failed for project {project_id}: {e}")
+        yield json.dumps({"error": str(e)}) + "\n"
+
+def _get_project_path(project_id: int) -> str:
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT local_path FROM projects WHERE id = ?", (project_id,))
+        project = cursor.fetchone()
 
     if project is None:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -145,58 +240,384 @@ def analyze_endpoint(request: AnalyzeRequest):
 
     if not os.path.exists(path):
         raise HTTPException(status_code=404, detail="Project path not found on server")
+    return path
+
+def _analyze(analyze, path: str, profile: Optional[AnalysisProfile]):
+    # Profiled runs hand the analyzer the timer that records every file, and
+    # skip the analysis cache: files served from it would show no cost.
+    # cProfile only sees this thread, so it gets the parsing in-process.
+    if profile is None:
+        return analyze(path)
+    workers = 1 if profile.functions else None
+    with profile.running():
+        return analyze(path, use_cache=False, workers=workers, timer=profile.timer)
+
+def _store_profile(project_id: int, profile: AnalysisProfile) -> dict:
+    # Like snapshots, a profile that cannot be stored does not fail the analysis
+    try:
+        stored = save_profile(project_id, profile)
+    except Exception as e:
+        print(f"Error saving analysis profile for project {project_id}: {e}")
+        return {"id": None, "summary": profile.summary()}
+    stored["trace_url"] = f"/api/analyze/profiles/{stored['id']}/trace"
+    return stored
+
+def _analyze_and_store(project_id: int, path: str, profile: Optional[AnalysisProfile] = None):
+    # Callers hold the project lock; it is not re-entrant, so code already
+    # holding it (e.g. a sync falling back to a full analysis) calls this
+    # rather than _run_analysis. Returns (graph, snapshot).
+    result = _analyze(analyze_project, path, profile)
+    with pooled_connection() as conn:
+        _mark_analyzed(conn, project_id)
+    return result, _store_snapshot(project_id, path, result)
+
+def _run_analysis(project_id: int, path: str, layout: bool = False,
+                  profile: Optional[AnalysisProfile] = None) -> dict:
+    # Analyses of one project run one at a time, across all workers
+    with project_lock(project_id):
+        result, snapshot = _analyze_and_store(project_id, path, profile)
+    if layout:
+        compact = CompactGraph.from_graph(result)
+        result["positions"] = positions_by_id(compact.paths, _layout(snapshot, compact))
+    if profile is not None:
+        result["profile"] = _store_profile(project_id, profile)
+    return result
+
+def _run_compact_analysis(project_id: int, path: str, layout: bool = False,
+                          profile: Optional[AnalysisProfile] = None) -> dict:
+    with project_lock(project_id):
+        graph = _analyze(analyze_project_compact, path, profile)
+        with pooled_connection() as conn:
+            _mark_analyzed(conn, project_id)
+        snapshot = _store_snapshot(project_id, path, graph.to_graph())
+    result = graph.to_json()
+    if layout:
+        result["positions"] = position_columns(_layout(snapshot, graph))
+    if profile is not None:
+        result["profile"] = _store_profile(project_id, profile)
+    return result
+
+@app.post("/api/analyze")
+async def analyze_endpoint(request: AnalyzeRequest, stream: bool = False,
+                           graph_format: str = Query("verbose", alias="format"), layout: bool = False,
+                           profile: bool = False, profile_functions: bool = False):
+    """
+    Analyses a project and returns its graph.
+
+    With layout=true the response also carries precomputed node positions:
+    {"positions": {id: {"x", "y"}}} for Cytoscape's preset layout, or x/y
+    columns aligned with "paths" in the compact format.
+
+    With profile=true every file is read and parsed again, bypassing the
+    analysis cache, and its time is recorded; the response
+    carries {"profile": {"id", "summary", "trace_url"}}: the summary lists the
+    slowest files, and trace_url downloads the whole run as a Chrome trace
+    (also opened by speedscope). profile_functions=true adds a cProfile of
+    the run, summarised as the slowest functions; files are then parsed in
+    the worker itself rather than in the parser processes.
+    """
+    _check_graph_format(graph_format)
+    path = await run_in_threadpool(_get_project_path, request.project_id)
+    analysis_profile = AnalysisProfile(path, functions=profile_functions) if profile or profile_functions else None
+
+    if stream:
+        if graph_format != "verbose":
+            raise HTTPException(status_code=400, detail="Streamed analyses are always verbose")
+        if analysis_profile is not None:
+            raise HTTPException(status_code=400, detail="Streamed analyses cannot be profiled")
+        lines = iterate_in(analysis_executor, _stream_analysis(path, request.project_id))
+        return StreamingResponse(lines, media_type="application/x-ndjson")
     
     try:
-        result = analyze_project(path)
-        # Update last_analysis timestamp
-        import datetime
-        timestamp = datetime.datetime.now().isoformat()
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE projects SET last_analysis = ? WHERE id = ?", (timestamp, request.project_id))
-        conn.commit()
-        conn.close()
-        
+        if graph_format == "compact":
+            return await run_in(analysis_executor, _run_compact_analysis, request.project_id, path, layout,
+                                analysis_profile)
+        return await run_in(analysis_executor, _run_analysis, request.project_id, path, layout, analysis_profile)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/analyze/profiles/{profile_id}")
+def get_analysis_profile(profile_id: str):
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    profile["trace_url"] = f"/api/analyze/profiles/{profile_id}/trace"
+    return profile
+
+@app.get("/api/analyze/profiles/{profile_id}/trace")
+def download_analysis_trace(profile_id: str):
+    trace = get_profile_trace(profile_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(trace, media_type="application/json",
+                    headers={"Content-Disposition": f'attachment; filename="analysis-{profile_id}.trace.json"'})
+
+@app.post("/api/analyze/jobs", status_code=202)
+def submit_analysis_job(request: AnalyzeRequest):
+    path = _get_project_path(request.project_id)
+
+    def run(progress):
+        with project_lock(request.project_id):
+            result = analyze_project(path, progress=progress)
+            with pooled_connection() as job_conn:
+                _mark_analyzed(job_conn, request.project_id)
+            _store_snapshot(request.project_id, path, result)
         return result
+
+    try:
+        return job_manager.submit(request.project_id, run)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.get("/api/analyze/jobs/{job_id}")
+def get_analysis_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+GRAPH_FORMATS = ("verbose", "compact")
+
+def _check_graph_format(graph_format: str):
+    if graph_format not in GRAPH_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown graph format '{graph_format}'")
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+@app.get("/api/projects/{project_id}/graph")
+def get_project_graph(project_id: int, request: Request, graph_format: str = Query("verbose", alias="format")):
+    """
+    Serves the latest stored graph of a project without re-analysing it.
+
+    Answers 304 when the client already holds the current ETag, and sends the
+    stored zlib stream as-is to clients that accept deflate. format=compact
+    returns the integer-indexed layout of CompactGraph.to_json instead.
+    """
+    _check_graph_format(graph_format)
+    snapshot = get_latest_snapshot(project_id, with_data=False)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No graph snapshot for this project")
+
+    etag = snapshot["etag"] if graph_format == "verbose" else compact_etag(snapshot["etag"])
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+        "X-Snapshot-Id": str(snapshot["id"]),
+        "X-Snapshot-Commit": snapshot["commit_sha"] or "",
+        "X-Snapshot-Created": snapshot["created_at"],
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if graph_format == "compact":
+        data = get_compact_snapshot_data(snapshot["id"], snapshot["etag"])
+    else:
+        data = get_snapshot_data(snapshot["id"])
+    if data is None:
+        raise HTTPException(status_code=404, detail="No graph snapshot for this project")
+    if "deflate" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "deflate"
+        return Response(content=data, media_type="application/json", headers=headers)
+    return Response(content=zlib.decompress(data), media_type="application/json", headers=headers)
+
+# --- Watch mode ---
+# Seconds between keep-alive comments on an idle event stream.
+SSE_HEARTBEAT = 15.0
+
+@app.post("/api/projects/{project_id}/watch")
+async def start_watch(project_id: int):
+    path = await run_in_threadpool(_get_project_path, project_id)
+    try:
+        watcher = await run_in(analysis_executor, watch_manager.start, project_id, path)
+    except WatchedElsewhere:
+        # Another worker runs the watcher; report the graph it stored
+        snapshot = await run_in_threadpool(get_latest_snapshot, project_id, False)
+        if snapshot is None:
+            raise HTTPException(status_code=409, detail="The watch is still starting, try again shortly")
+        return {"project_id": project_id, "watching": True, "etag": snapshot["etag"],
+                "nodes": snapshot["node_count"], "edges": snapshot["edge_count"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return {"project_id": project_id, "watching": True, "etag": watcher.etag,
+            "nodes": len(watcher.graph["nodes"]), "edges": len(watcher.graph["edges"])}
+
+@app.delete("/api/projects/{project_id}/watch")
+async def stop_watch(project_id: int):
+    if not await run_in_threadpool(watch_manager.stop, project_id):
+        raise HTTPException(status_code=404, detail="Project is not being watched")
+    return {"project_id": project_id, "watching": False}
+
+@app.get("/api/projects/{project_id}/events")
+async def project_events(project_id: int):
+    """
+    Server-Sent Events stream of graph deltas for a watched project.
+
+    Each "delta" event lists added/removed nodes and edges and the ETag of the
+    snapshot it leads to; a "resync" event asks the client to reload the
+    whole graph because it fell behind. When another worker process runs the
+    watcher, the stream follows the snapshots it stores instead.
+    """
+    watcher = await run_in_threadpool(watch_manager.get, project_id)
+    if watcher is None:
+        if not await run_in_threadpool(watch_manager.watched_elsewhere, project_id):
+            raise HTTPException(status_code=404, detail="Project is not being watched")
+        follower = await run_in_threadpool(SnapshotFollower, project_id)
+        return StreamingResponse(_follow_events(follower), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache"})
+    queue = watcher.subscribe(asyncio.get_running_loop())
+
+    async def events():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    # The watch was stopped
+                    return
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            watcher.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+async def _follow_events(follower: SnapshotFollower):
+    idle = 0.0
+    while True:
+        await asyncio.sleep(WATCH_INTERVAL)
+        events = await run_in_threadpool(follower.poll)
+        if events is None:
+            # The watch was stopped
+            return
+        for event in events:
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        idle = 0.0 if events else idle + WATCH_INTERVAL
+        if idle >= SSE_HEARTBEAT:
+            idle = 0.0
+            yield ": keep-alive\n\n"
+
+# --- Graph queries ---
+# Answered from the CSR index of the latest snapshot, never by re-analysing.
+def _graph_index(project_id: int):
+    snapshot = get_latest_snapshot(project_id, with_data=False)
+    index = get_graph_index(snapshot["id"], snapshot["etag"]) if snapshot is not None else None
+    if index is None:
+        raise HTTPException(status_code=404, detail="No graph snapshot for this project")
+    return snapshot, index
+
+def _node_number(index, path: str) -> int:
+    try:
+        return index.number(path)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"File '{path}' is not in the graph")
+
+def _dependency_query(project_id: int, path: str, depth: int, reverse: bool) -> dict:
+    snapshot, index = _graph_index(project_id)
+    found = index.reachable(_node_number(index, path), reverse=reverse, max_depth=depth if depth > 0 else None)
+    results = sorted(({"id": index.paths[number], "depth": hops} for number, hops in found.items()),
+                     key=lambda item: (item["depth"], item["id"]))
+    return {"path": path, "depth": depth, "etag": snapshot["etag"], "count": len(results), "results": results}
+
+@app.get("/api/projects/{project_id}/graph/importers")
+def get_importers(project_id: int, path: str, depth: int = 1):
+    """Files that import path, directly (depth=1) or up to depth hops away; depth=0 means no limit."""
+    return _dependency_query(project_id, path, depth, reverse=True)
+
+@app.get("/api/projects/{project_id}/graph/importees")
+def get_importees(project_id: int, path: str, depth: int = 1):
+    """Files imported by path, directly (depth=1) or up to depth hops away; depth=0 means no limit."""
+    return _dependency_query(project_id, path, depth, reverse=False)
+
+@app.get("/api/projects/{project_id}/graph/cycles")
+def get_import_cycles(project_id: int):
+    """Import cycles (strongly connected components of more than one file), largest first."""
+    snapshot, index = _graph_index(project_id)
+    cycles = [sorted(index.paths[number] for number in component) for component in index.cycles()]
+    return {"etag": snapshot["etag"], "count": len(cycles), "cycles": cycles}
+
+@app.get("/api/projects/{project_id}/graph/path")
+def get_import_path(project_id: int, source: str, target: str):
+    """Shortest chain of imports leading from source to target; path is null if there is none."""
+    snapshot, index = _graph_index(project_id)
+    numbers = index.shortest_path(_node_number(index, source), _node_number(index, target))
+    path = [index.paths[number] for number in numbers] if numbers is not None else None
+    return {"source": source, "target": target, "etag": snapshot["etag"], "path": path,
+            "length": len(path) - 1 if path is not None else None}
+
+def _directory_index(project_id: int):
+    snapshot = get_latest_snapshot(project_id, with_data=False)
+    index = get_directory_index(snapshot["id"], snapshot["etag"]) if snapshot is not None else None
+    if index is None:
+        raise HTTPException(status_code=404, detail="No graph snapshot for this project")
+    return snapshot, index
+
+@app.get("/api/projects/{project_id}/graph/lod")
+def get_graph_overview(project_id: int, expand: List[str] = Query([])):
+    """
+    Level-of-detail view of the latest snapshot.
+
+    Directories are collapsed into super-nodes (ids end with "/") with
+    weighted edges counting the file imports between them. Each expand
+    parameter opens one directory, e.g. ?expand=pkg/&expand=pkg/sub/.
+    """
+    snapshot, index = _directory_index(project_id)
+    result = index.view(expand)
+    result["etag"] = snapshot["etag"]
+    return result
+
+def _viewport(project_id: int, box, limit: int) -> dict:
+    snapshot, index = _directory_index(project_id)
+    result = viewport(index.graph, _layout(snapshot, index.graph), box, limit)
+    result["etag"] = snapshot["etag"]
+    return result
+
+@app.get("/api/projects/{project_id}/graph/viewport")
+async def get_graph_viewport(project_id: int, x0: float, y0: float, x1: float, y1: float,
+                             limit: int = Query(VIEWPORT_LIMIT, ge=1, le=VIEWPORT_LIMIT)):
+    """Files of the latest snapshot whose layout position lies in the given box, with their edges."""
+    return await run_in(analysis_executor, _viewport, project_id, (x0, y0, x1, y1), limit)
+
+def _snapshot_layout(project_id: int, graph_format: str):
+    snapshot = get_latest_snapshot(project_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No graph snapshot for this project")
+    graph = CompactGraph.from_graph(load_graph(snapshot))
+    coords = _layout(snapshot, graph)
+    positions = positions_by_id(graph.paths, coords) if graph_format == "verbose" else position_columns(coords)
+    return {"snapshot_id": snapshot["id"], "etag": snapshot["etag"], "positions": positions}
+
+@app.get("/api/projects/{project_id}/layout")
+async def get_project_layout(project_id: int, graph_format: str = Query("verbose", alias="format")):
+    """Node positions of the latest snapshot, computed on first request and cached."""
+    _check_graph_format(graph_format)
+    return await run_in(analysis_executor, _snapshot_layout, project_id, graph_format)
 
 @app.post("/api/notes/", response_model=NoteOut)
-def create_or_update_note(note: NoteIn):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+def create_or_update_note(note: NoteIn, conn: sqlite3.Connection = Depends(get_db)):
     try:
-        # Check if note exists
-        cursor.execute("SELECT id FROM notes WHERE file_path = ?", (note.file_path,))
-        existing = cursor.fetchone()
-        
-        if existing:
-            cursor.execute("UPDATE notes SET content = ? WHERE file_path = ?", (note.content, note.file_path))
-            note_id = existing['id']
-        else:
-            cursor.execute("INSERT INTO notes (file_path, content) VALUES (?, ?)", (note.file_path, note.content))
-            note_id = cursor.lastrowid
-            
+        saved = upsert_note(conn, note.project_id, note.file_path, note.content)
         conn.commit()
-        return {"id": note_id, "file_path": note.file_path, "content": note.content}
+        return saved
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 @app.get("/api/notes/{file_path:path}", response_model=NoteOut)
-def get_note(file_path: str):
-    conn = get_db_connection()
+def get_note(file_path: str, conn: sqlite3.Connection = Depends(get_db), project_id: int = 0):
     cursor = conn.cursor()
     # Decode path if needed, but FastAPI handles path params well.
     # Note: file_path in URL might need to be double encoded if it contains slashes, 
     # but here we use :path converter which captures everything.
     
-    cursor.execute("SELECT * FROM notes WHERE file_path = ?", (file_path,))
+    cursor.execute("SELECT * FROM notes WHERE project_id = ? AND file_path = ?", (project_id, file_path))
     note = cursor.fetchone()
-    conn.close()
     
     if note is None:
         raise HTTPException(status_code=404, detail="Note not found")
@@ -204,36 +625,106 @@ def get_note(file_path: str):
     return dict(note)
 
 @app.get("/api/notes/", response_model=List[NoteOut])
-def get_all_notes():
-    conn = get_db_connection()
+def get_all_notes(conn: sqlite3.Connection = Depends(get_db)):
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM notes")
     notes = cursor.fetchall()
-    conn.close()
     
     return [dict(note) for note in notes]
 
+# Project-scoped notes: a graph view loads the notes of all visible files in
+# one request instead of one request per node.
+def _require_project(conn: sqlite3.Connection, project_id: int):
+    if conn.execute("SELECT 1 FROM projects WHERE id = ?", (project_id,)).fetchone() is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+@app.get("/api/projects/{project_id}/notes", response_model=List[NoteOut])
+def get_project_notes(project_id: int, conn: sqlite3.Connection = Depends(get_db)):
+    _require_project(conn, project_id)
+    return get_notes(conn, project_id)
+
+@app.post("/api/projects/{project_id}/notes/query", response_model=List[NoteOut])
+def query_project_notes(project_id: int, query: NotesQuery, conn: sqlite3.Connection = Depends(get_db)):
+    _require_project(conn, project_id)
+    return get_notes(conn, project_id, query.file_paths)
+
+@app.put("/api/projects/{project_id}/notes")
+def save_project_notes(project_id: int, batch: NotesBatchIn, conn: sqlite3.Connection = Depends(get_db)):
+    _require_project(conn, project_id)
+    try:
+        return upsert_notes(conn, project_id, [{"file_path": n.file_path, "content": n.content} for n in batch.notes])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/projects/{project_id}/search")
+def search_project(project_id: int, q: str, limit: int = Query(20, ge=1, le=100),
+                   conn: sqlite3.Connection = Depends(get_db)):
+    """Ranked matches of q in the project's file paths, top-level symbols and notes."""
+    project = conn.execute("SELECT local_path FROM projects WHERE id = ?", (project_id,)).fetchone()
+    if project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    results = search(conn, os.path.abspath(project["local_path"]), project_id, q, limit)
+    return {"query": q, "results": results}
+
 # --- AI Endpoints ---
 from ai_service import query_code
 
 class AIQueryIn(BaseModel):
     file_path: str
     query: str
+    # file_path is relative to this project; without it, to the demo project
+    project_id: Optional[int] = None
 
 @app.post("/api/ai/query")
 def ai_query_endpoint(query_in: AIQueryIn):
-    response = query_code(query_in.file_path, query_in.query)
+    root_path = _get_project_path(query_in.project_id) if query_in.project_id is not None else None
+    response = query_code(query_in.file_path, query_in.query, root_path)
     return {"file": query_in.file_path, "response": response}
 
 class GitHubImportIn(BaseModel):
     repo_url: str
     project_name: str
     token: Optional[str] = None
+    # Clone modes, see git_service.clone_repo
+    depth: Optional[int] = None
+    blobless: bool = False
+    sparse_python: bool = False
+    single_branch: bool = False
+    branch: Optional[str] = None
+    # Repository this one is a fork of; its local mirror supplies shared objects
+    upstream_url: Optional[str] = None
+
+def _insert_imported_project(import_data: GitHubImportIn, local_path: str) -> dict:
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO projects (name, local_path, github_url, last_analysis) VALUES (?, ?, ?, ?)",
+                (import_data.project_name, local_path, import_data.repo_url, None)
+            )
+            conn.commit()
+            project_id = cursor.lastrowid
+            return {
+                "id": project_id,
+                "name": import_data.project_name,
+                "local_path": local_path,
+                "github_url": import_data.repo_url,
+                "last_analysis": None
+            }
+        except sqlite3.IntegrityError:
+            raise HTTPException(status_code=400, detail="Project with this path already exists.")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/projects/import/github")
-def import_github_project(import_data: GitHubImportIn):
+async def import_github_project(import_data: GitHubImportIn):
     # 1. Clone the repo
-    clone_result = clone_repo(import_data.repo_url, import_data.project_name, import_data.token)
+    clone_result = await run_in(
+        git_executor, clone_repo, import_data.repo_url, import_data.project_name, import_data.token,
+        depth=import_data.depth, blobless=import_data.blobless, sparse_python=import_data.sparse_python,
+        single_branch=import_data.single_branch, branch=import_data.branch,
+        upstream_url=import_data.upstream_url
+    )
     
     if not clone_result["success"]:
         raise HTTPException(status_code=400, detail=clone_result["message"])
@@ -241,39 +732,86 @@ def import_github_project(import_data: GitHubImportIn):
     local_path = clone_result["path"]
     
     # 2. Add to database
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute(
-            "INSERT INTO projects (name, local_path, github_url, last_analysis) VALUES (?, ?, ?, ?)",
-            (import_data.project_name, local_path, import_data.repo_url, None)
+    return await run_in_threadpool(_insert_imported_project, import_data, local_path)
+
+def _get_project_row(project_id: int) -> Optional[sqlite3.Row]:
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM projects WHERE id = ?", (project_id,))
+        return cursor.fetchone()
+
+def _pull_with_commits(project_id: int, path: str):
+    with project_lock(project_id):
+        before = get_head_commit(path)
+        updated = pull_repo(path)
+        return updated, before, get_head_commit(path)
+
+def _refresh_graph(project_id: int, path: str, after: str):
+    """
+    Brings the stored graph up to date with the pulled commit.
+
+    The latest snapshot is patched from the git diff between its commit and
+    the new HEAD, so only the changed files are parsed again. Projects that
+    were never analyzed are left alone; anything else that prevents a patch
+    falls back to a full analysis. Returns (analysis mode, changed files).
+    Callers hold the project lock.
+    """
+    snapshot = get_latest_snapshot(project_id)
+    if snapshot is None:
+        return "skipped", None
+
+    graph = None
+    changes = None
+    if snapshot["commit_sha"]:
+        try:
+            changes = diff_commits(path, snapshot["commit_sha"], after)
+            graph = update_analysis(path, load_graph(snapshot), changes)
+        except git.GitCommandError as e:
+            print(f"Cannot diff project {project_id} against its snapshot, running a full analysis: {e}")
+
+    if graph is None:
+        # The caller already holds the project lock
+        _analyze_and_store(project_id, path)
+        return "full", len(changes) if changes is not None else None
+
+    with pooled_connection() as conn:
+        _mark_analyzed(conn, project_id)
+    _store_snapshot(project_id, path, graph)
+    return "incremental", len(changes)
+
+def _record_sync(project_id: int, before: str, after: str, analysis: str, changed_files: Optional[int]):
+    with pooled_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO project_syncs (project_id, before_commit, after_commit, synced_at, changed_files, analysis)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (project_id, before, after, datetime.datetime.now().isoformat(), changed_files, analysis)
         )
         conn.commit()
-        project_id = cursor.lastrowid
-        return {
-            "id": project_id,
-            "name": import_data.project_name,
-            "local_path": local_path,
-            "github_url": import_data.repo_url,
-            "last_analysis": None
-        }
-    except sqlite3.IntegrityError:
-        conn.close()
-        raise HTTPException(status_code=400, detail="Project with this path already exists.")
+
+def _finish_sync(project: sqlite3.Row, before: str, after: str) -> dict:
+    # Everything after a pull that fetched new commits
+    try:
+        with project_lock(project['id']):
+            analysis, changed_files = _refresh_graph(project['id'], project['local_path'], after)
     except Exception as e:
-        conn.close()
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
+        # The pull itself went through; report the stale graph instead of failing the sync
+        print(f"Updating the graph of project {project['name']} after sync failed: {e}")
+        analysis, changed_files = "failed", None
+    _record_sync(project['id'], before, after, analysis, changed_files)
+
+    return {"status": "success", "message": f"Project '{project['name']}' updated successfully.",
+            "before": before, "after": after, "analysis": analysis, "changed_files": changed_files}
+
+def _up_to_date(project: sqlite3.Row, before: str, after: str) -> dict:
+    _record_sync(project['id'], before, after, "skipped", 0)
+    return {"status": "success", "message": f"Project '{project['name']}' is already up to date.",
+            "before": before, "after": after}
 
 @app.post("/api/projects/{project_id}/sync")
-def sync_project(project_id: int):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM projects WHERE id = ?", (project_id,))
-    project = cursor.fetchone()
-    conn.close()
+async def sync_project(project_id: int):
+    project = await run_in_threadpool(_get_project_row, project_id)
     
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -283,18 +821,12 @@ def sync_project(project_id: int):
         
     # Perform git pull
     try:
-        repo = git.Repo(project['local_path'])
-        origin = repo.remotes.origin
-        pull_info = origin.pull()
-        
-        if len(pull_info) == 0:
-             return {"status": "success", "message": "Already up to date."}
-             
-        commit_info = pull_info[0]
-        if commit_info.flags & commit_info.HEAD_UPTODATE:
-             return {"status": "success", "message": f"Project '{project['name']}' is already up to date."}
+        updated, before, after = await run_in(git_executor, _pull_with_commits, project['id'], project['local_path'])
         
-        return {"status": "success", "message": f"Project '{project['name']}' updated successfully."}
+        if not updated or before == after:
+             return await run_in_threadpool(_up_to_date, project, before, after)
+
+        return await run_in(analysis_executor, _finish_sync, project, before, after)
         
     except git.GitCommandError as e:
         print(f"Git pull failed for project {project['name']}: {e}")
@@ -302,3 +834,96 @@ def sync_project(project_id: int):
     except Exception as e:
         print(f"Unexpected error during sync for project {project['name']}: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred during sync: {str(e)}")
+
+# --- Batch import and sync ---
+# Onboarding or refreshing many repositories in one call: the clones and pulls
+# run on the shared batch runner (bounded workers, per-host limits, retries)
+# and GET /api/batches/{id} reports the progress of every repository.
+
+class BatchImportIn(BaseModel):
+    repos: List[GitHubImportIn]
+
+class BatchSyncIn(BaseModel):
+    # None syncs every project linked to a repository
+    project_ids: Optional[List[int]] = None
+
+def _check_batch_size(count: int):
+    if count == 0:
+        raise HTTPException(status_code=400, detail="The batch is empty")
+    if count > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch holds at most {MAX_BATCH_ITEMS} items")
+
+def _clone_for_batch(import_data: GitHubImportIn) -> str:
+    result = clone_repo(
+        import_data.repo_url, import_data.project_name, import_data.token,
+        depth=import_data.depth, blobless=import_data.blobless, sparse_python=import_data.sparse_python,
+        single_branch=import_data.single_branch, branch=import_data.branch,
+        upstream_url=import_data.upstream_url
+    )
+    if result["success"]:
+        return result["path"]
+    message = result["message"]
+    if import_data.token:
+        # Batch messages are stored; never keep the token a git error may echo
+        message = message.replace(import_data.token, "***")
+    raise (RetryableError if result.get("retryable") else ValueError)(message)
+
+def _register_clone(import_data: GitHubImportIn, local_path: str) -> dict:
+    try:
+        return _insert_imported_project(import_data, local_path)
+    except HTTPException as e:
+        _remove_tree(local_path)
+        raise ValueError(e.detail)
+
+@app.post("/api/projects/import/github/batch", status_code=202)
+def import_github_projects(batch: BatchImportIn):
+    _check_batch_size(len(batch.repos))
+    names = [repo.project_name for repo in batch.repos]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise HTTPException(status_code=400, detail=f"Duplicate project names: {', '.join(duplicates)}")
+
+    repos = batch.repos
+    return batch_runner.submit(
+        "import", [(repo.repo_url, repo.repo_url) for repo in repos],
+        lambda position: _clone_for_batch(repos[position]),
+        lambda position, local_path: _register_clone(repos[position], local_path)
+    )
+
+def _sync_for_batch(project: sqlite3.Row, updated: bool, before: str, after: str) -> dict:
+    if not updated or before == after:
+        return _up_to_date(project, before, after)
+    # Analyses share the bounded analysis pool with the other endpoints
+    return analysis_executor.submit(_finish_sync, project, before, after).result()
+
+@app.post("/api/projects/sync/batch", status_code=202)
+def sync_projects(batch: BatchSyncIn):
+    with pooled_connection() as conn:
+        if batch.project_ids is None:
+            projects = conn.execute("SELECT * FROM projects WHERE github_url IS NOT NULL ORDER BY id").fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT * FROM projects WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(batch.project_ids),)
+            ).fetchall()
+            by_id = {row['id']: row for row in rows}
+            missing = [project_id for project_id in batch.project_ids if project_id not in by_id]
+            if missing:
+                raise HTTPException(status_code=404, detail=f"Projects not found: {missing}")
+            unlinked = [project_id for project_id in batch.project_ids if not by_id[project_id]['github_url']]
+            if unlinked:
+                raise HTTPException(status_code=400, detail=f"Projects not linked to a repository: {unlinked}")
+            projects = [by_id[project_id] for project_id in dict.fromkeys(batch.project_ids)]
+    _check_batch_size(len(projects))
+
+    return batch_runner.submit(
+        "sync", [(project['name'], project['github_url']) for project in projects],
+        lambda position: _pull_with_commits(projects[position]['id'], projects[position]['local_path']),
+        lambda position, pulled: _sync_for_batch(projects[position], *pulled)
+    )
+
+@app.get("/api/batches/{batch_id}")
+def get_batch(batch_id: str):
+    batch = batch_runner.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
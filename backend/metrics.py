@@ -0,0 +1,370 @@
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import database
+import coordination
+
+# Upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Every worker process writes its samples here so /metrics can report the
+# sum over all workers; None puts them next to the database.
+METRICS_DIR = os.environ.get("DARKTORCH_METRICS_DIR")
+# Seconds between two writes of a worker's samples
+METRICS_FLUSH_INTERVAL = float(os.environ.get("DARKTORCH_METRICS_FLUSH_INTERVAL", "5"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry = []
+_sharing = {"thread": None, "stop": None}
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """A monotonically increasing value per combination of label values."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def dump(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total: Dict, values: Dict):
+        for key, value in values.items():
+            total[key] = total.get(key, 0.0) + value
+
+    def render(self, values: Dict) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {float(value)!r}"
+                for key, value in sorted(values.items())]
+
+class Histogram:
+    """
+    Counts observations (e.g. durations) in cumulative buckets per
+    combination of label values, along with their sum and count.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # key -> [count per bucket (the last one being +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observes the duration of the with block, even when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return sum(state[0]) if state else 0
+
+    def dump(self) -> Dict[Tuple[str, ...], list]:
+        with self._lock:
+            return {key: [list(state[0]), state[1]] for key, state in self._values.items()}
+
+    @staticmethod
+    def merge(total: Dict, values: Dict):
+        for key, (counts, value_sum) in values.items():
+            state = total.get(key)
+            if state is None or len(state[0]) != len(counts):
+                total[key] = [list(counts), value_sum]
+            else:
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += value_sum
+
+    def render(self, values: Dict) -> List[str]:
+        lines = []
+        names = self.labelnames + ("le",)
+        for key, (counts, value_sum) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (le,))} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {float(value_sum)!r}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+# --- Metrics of the backend ---
+
+http_requests = Counter(
+    "darktorch_http_requests_total", "HTTP requests handled, by route template and status code.",
+    ("method", "route", "status")
+)
+http_request_duration = Histogram(
+    "darktorch_http_request_duration_seconds",
+    "Time from receiving an HTTP request to sending the end of its response.",
+    ("method", "route")
+)
+phase_duration = Histogram(
+    "darktorch_phase_duration_seconds",
+    "Time spent in one phase of an analysis (summed over its files), a git operation or a database write.",
+    ("phase",)
+)
+analysis_files = Counter(
+    "darktorch_analysis_files_total",
+    "Files handled by analyses: parsed, cached (unchanged stat), unchanged (same content hash) or failed.",
+    ("result",)
+)
+git_operations = Counter(
+    "darktorch_git_operations_total", "Git clones, pulls and mirror fetches, by outcome.",
+    ("operation", "result")
+)
+
+class PhaseTimer:
+    """
+    Sums the time one operation spends in each of its phases.
+
+    Cheap enough to run for every file: each measurement is two perf_counter
+    calls and a dict update. record() publishes the totals to phase_duration
+    once the operation is over. A timer is picklable, so a process pool
+    worker can send its own back to be merged.
+
+    With spans=True (profiling) every measurement is also kept as a
+    (phase, key, start, end, pid) span, key naming the file it measured or
+    being None. perf_counter is system-wide on Linux, so the spans of pool
+    workers line up with those of the calling process.
+    """
+
+    def __init__(self, spans: bool = False):
+        self.seconds: Dict[str, float] = {}
+        self.spans: Optional[List[Tuple]] = [] if spans else None
+
+    def add(self, phase: str, seconds: float):
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+
+    def span(self, phase: str, start: float, end: float, key: Optional[str] = None):
+        self.add(phase, end - start)
+        if self.spans is not None:
+            self.spans.append((phase, key, start, end, os.getpid()))
+
+    def merge(self, other: "PhaseTimer"):
+        for phase, value in other.seconds.items():
+            self.add(phase, value)
+        if self.spans is not None and other.spans:
+            self.spans.extend(other.spans)
+
+    @contextmanager
+    def phase(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.span(phase, start, time.perf_counter())
+
+    def iterate(self, phase: str, iterator: Iterable, key: Optional[Callable[[Any], str]] = None) -> Iterator:
+        """
+        Yields the items of iterator, counting only the time spent producing
+        them. With key, producing each item is a span named key(item).
+        """
+        iterator = iter(iterator)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(phase, time.perf_counter() - start)
+                return
+            if key is None or self.spans is None:
+                self.add(phase, time.perf_counter() - start)
+            else:
+                self.span(phase, start, time.perf_counter(), key(item))
+            yield item
+
+    def record(self):
+        for phase, seconds in self.seconds.items():
+            phase_duration.observe(seconds, phase=phase)
+
+# --- Sharing between worker processes ---
+# Each worker writes its samples to <metrics dir>/<worker id>.json every
+# METRICS_FLUSH_INTERVAL seconds. A scrape adds the files of the other live
+# workers to its own live samples; files of dead workers are removed, which
+# Prometheus sees as a counter reset.
+
+def metrics_dir() -> str:
+    return METRICS_DIR or os.path.join(os.path.dirname(os.path.abspath(database.DB_PATH)), "metrics")
+
+def _dump() -> Dict[str, list]:
+    return {metric.name: [[list(key), value] for key, value in metric.dump().items()] for metric in _registry}
+
+def _write_samples():
+    directory = metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{coordination.worker_id()}.json")
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(_dump(), f)
+    os.replace(temporary, path)
+
+def _read_other_workers() -> List[Dict[str, list]]:
+    directory = metrics_dir()
+    if _sharing["thread"] is None or not os.path.isdir(directory):
+        return []
+    own = coordination.worker_id()
+    samples = []
+    for name in os.listdir(directory):
+        if not name.endswith(".json") or name[:-len(".json")] == own:
+            continue
+        path = os.path.join(directory, name)
+        if not coordination.worker_alive(name[:-len(".json")]):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path, encoding="utf-8") as f:
+                samples.append(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Error reading metrics of worker {name}: {e}")
+    return samples
+
+def start_sharing(interval: float = None):
+    """Starts writing this worker's samples for the other workers to report."""
+    if _sharing["thread"] is not None:
+        return
+    interval = METRICS_FLUSH_INTERVAL if interval is None else interval
+    stop = threading.Event()
+
+    def write():
+        try:
+            _write_samples()
+        except Exception as e:
+            print(f"Error writing metrics: {e}")
+
+    def run():
+        while not stop.wait(interval):
+            write()
+
+    # Written once right away, so a scrape right after start-up sees this worker
+    write()
+
+    thread = threading.Thread(target=run, name="metrics", daemon=True)
+    _sharing.update(thread=thread, stop=stop)
+    thread.start()
+
+def stop_sharing():
+    thread, stop = _sharing["thread"], _sharing["stop"]
+    if thread is None:
+        return
+    stop.set()
+    thread.join()
+    _sharing.update(thread=None, stop=None)
+    try:
+        os.remove(os.path.join(metrics_dir(), f"{coordination.worker_id()}.json"))
+    except OSError:
+        pass
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format, summed over the live workers."""
+    others = _read_other_workers()
+    lines = []
+    for metric in _registry:
+        values = metric.dump()
+        for samples in others:
+            metric.merge(values, {tuple(key): value for key, value in samples.get(metric.name, [])})
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.render(values))
+    return "\n".join(lines) + "\n"
+
+# --- HTTP middleware ---
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording http_requests and http_request_duration.
+
+    Requests are labelled with the template of the route they matched (e.g.
+    /api/projects/{project_id}/graph) so the number of series stays bounded;
+    requests no route matched share the "unmatched" label. Written as plain
+    ASGI rather than BaseHTTPMiddleware so streamed responses pass through
+    untouched and the duration covers the whole body.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_request_duration.observe(time.perf_counter() - start, method=method, route=path)
+            http_requests.inc(method=method, route=path, status=status["code"])
+
+def reset():
+    """Clears every sample of this process, for tests."""
+    for metric in _registry:
+        with metric._lock:
+            metric._values.clear()
@@ -0,0 +1,99 @@
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Directories searched for top-level modules besides the project root, unless
+# they are packages themselves ("src layout").
+SOURCE_ROOTS = ("src",)
+
+def _module_name(rel_path: str) -> str:
+    # "pkg/sub/mod.py" -> "pkg.sub.mod", "pkg/__init__.py" -> "pkg"
+    parts = rel_path[:-3].split("/")
+    if parts[-1] == "__init__":
+        parts.pop()
+    return ".".join(parts)
+
+class ModuleIndex:
+    """
+    Maps dotted module names to the project files that define them.
+
+    Built once per analysis from the scanned paths, so resolving an import is
+    a few dictionary lookups however large the tree is. Every file is indexed
+    under its path from the project root and, for src layouts, from the source
+    root. Directories without an __init__.py work as namespace packages: they
+    have no file of their own, but their modules are indexed like any other.
+
+    When the project root is itself a package, pass its name as root_package
+    so that absolute imports through that name resolve as well.
+    """
+
+    def __init__(self, rel_paths: Iterable[str], root_package: Optional[str] = None):
+        # Packages first, so that pkg/__init__.py wins over a pkg.py next to
+        # it, as it does for the import system
+        ordered = sorted(rel_paths, key=lambda rel_path: not rel_path.endswith("__init__.py"))
+        present = set(ordered)
+        self.modules: Dict[str, str] = {}
+        # Directories that are regular packages rather than script folders
+        self._packages = {os.path.dirname(rel_path) for rel_path in present
+                          if os.path.basename(rel_path) == "__init__.py"}
+
+        for root in SOURCE_ROOTS:
+            prefix = root + "/"
+            if prefix + "__init__.py" in present:
+                continue
+            for rel_path in ordered:
+                if rel_path.startswith(prefix):
+                    self._add(_module_name(rel_path[len(prefix):]), rel_path)
+
+        for rel_path in ordered:
+            self._add(_module_name(rel_path), rel_path)
+
+        if root_package:
+            for rel_path in ordered:
+                name = _module_name(rel_path)
+                self._add(f"{root_package}.{name}" if name else root_package, rel_path)
+
+    def _add(self, name: str, rel_path: str):
+        if name:
+            self.modules.setdefault(name, rel_path)
+
+    def resolve(self, rel_path: str, module: str, level: int = 0,
+                names: Optional[Sequence[str]] = None) -> List[str]:
+        """
+        Returns the project files an import statement in rel_path refers to.
+
+        names is None for `import module` and the imported names for
+        `from module import names`; level counts the leading dots of a
+        relative import. A name that is itself a submodule resolves to that
+        submodule, any other name to the module it is imported from.
+        """
+        directory = os.path.dirname(rel_path)
+        if level:
+            parts = directory.split("/") if directory else []
+            if level - 1 > len(parts):
+                # Goes above the top-level package
+                return []
+            parts = parts[:len(parts) - (level - 1)]
+            if module:
+                parts.append(module)
+            return self._resolve_from(".".join(parts), names)
+
+        targets = self._resolve_from(module, names)
+        if not targets and directory and directory not in self._packages:
+            # Scripts can import the modules next to them, whose directory is
+            # on sys.path when they run. Modules of a package cannot: there
+            # `import types` is the standard library, not pkg/types.py.
+            targets = self._resolve_from(directory.replace("/", ".") + "." + module, names)
+        return targets
+
+    def _resolve_from(self, base: str, names: Optional[Sequence[str]]) -> List[str]:
+        base_file = self.modules.get(base)
+        if names is None:
+            return [base_file] if base_file else []
+
+        targets = []
+        for name in names:
+            submodule = self.modules.get(f"{base}.{name}" if base else name)
+            target = submodule or base_file
+            if target and target not in targets:
+                targets.append(target)
+        return targets
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import sqlite3
+from typing import Dict, Iterable, List, Optional
+
+import search
+
+# Upsert that leaves a note untouched when its content is unchanged, so saving
+# a batch where most notes are identical rewrites only the ones that differ.
+_UPSERT_SQL = """
+    INSERT INTO notes (project_id, file_path, content, content_hash) VALUES (?, ?, ?, ?)
+    ON CONFLICT (project_id, file_path) DO UPDATE
+        SET content = excluded.content, content_hash = excluded.content_hash
+        WHERE notes.content_hash IS NOT excluded.content_hash
+"""
+
+def note_hash(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+def upsert_note(conn: sqlite3.Connection, project_id: int, file_path: str, content: str) -> Dict:
+    """Creates or replaces one note and returns it, without committing."""
+    digest = note_hash(content)
+    conn.execute(_UPSERT_SQL, (project_id, file_path, content, digest))
+    search.index_notes(conn, project_id, [(file_path, content)])
+    row = conn.execute(
+        "SELECT * FROM notes WHERE project_id = ? AND file_path = ?", (project_id, file_path)
+    ).fetchone()
+    return dict(row)
+
+def upsert_notes(conn: sqlite3.Connection, project_id: int, notes: Iterable[Dict[str, str]]) -> Dict:
+    """
+    Creates or replaces many notes in a single transaction.
+
+    Returns the number of notes actually written and the content hash of every
+    submitted note, so the client can tell which ones it already has.
+    """
+    params = [(project_id, n["file_path"], n["content"], note_hash(n["content"])) for n in notes]
+    stored = {
+        row["file_path"]: row["content_hash"]
+        for row in conn.execute(
+            "SELECT file_path, content_hash FROM notes WHERE project_id = ? AND file_path IN (SELECT value FROM json_each(?))",
+            (project_id, json.dumps([p[1] for p in params]))
+        )
+    }
+    changed = [p for p in params if stored.get(p[1]) != p[3]]
+    before = conn.total_changes
+    try:
+        conn.executemany(_UPSERT_SQL, changed)
+        written = conn.total_changes - before
+        # Only notes whose content changed need to be indexed again
+        search.index_notes(conn, project_id, [(p[1], p[2]) for p in changed])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {
+        "written": written,
+        "notes": [{"file_path": p[1], "content_hash": p[3]} for p in params],
+    }
+
+def get_notes(conn: sqlite3.Connection, project_id: int, file_paths: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Returns the project's notes, limited to file_paths when given.
+
+    The paths are passed as one JSON array and expanded with json_each, so any
+    number of them costs a single statement with two bound parameters.
+    """
+    if file_paths is None:
+        rows = conn.execute("SELECT * FROM notes WHERE project_id = ? ORDER BY file_path", (project_id,))
+    else:
+        rows = conn.execute(
+            "SELECT * FROM notes WHERE project_id = ? AND file_path IN (SELECT value FROM json_each(?)) ORDER BY file_path",
+            (project_id, json.dumps(file_paths))
+        )
+    return [dict(row) for row in rows]
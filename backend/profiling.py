@@ -0,0 +1,183 @@
+import os
+import json
+import zlib
+import uuid
+import pstats
+import cProfile
+import datetime
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from database import pooled_connection
+from metrics import PhaseTimer
+
+# Profiles kept per project; older ones are pruned when a new one is saved.
+PROFILES_TO_KEEP = 10
+# Rows in the slowest files and functions of a summary
+TOP_ENTRIES = 20
+
+# Per-file stages of a profile, by the analyzer phase that measures them
+FILE_STAGES = {"scan": "walk", "read": "read", "parse": "parse", "resolve": "resolve"}
+
+class AnalysisProfile:
+    """
+    Records where the time of one analysis goes, file by file.
+
+        profile = AnalysisProfile(path)
+        with profile.running():
+            analyze_project(path, timer=profile.timer)
+
+    Every file gets its four stages: walk (the directory scan that found
+    it), read (reading and hashing it), parse (extracting its imports, with
+    either import engine) and resolve (turning its imports into edges).
+    Files served from the analysis cache are neither read nor parsed, so
+    profiled analyses run with use_cache=False. With
+    functions=True the run is also wrapped in cProfile, which only sees the
+    calling thread, so such runs also pass workers=1 to parse in-process.
+    """
+
+    def __init__(self, root_path: str, functions: bool = False):
+        self.root_path = os.path.abspath(root_path)
+        self.functions = functions
+        self.timer = PhaseTimer(spans=True)
+        self._profiler = cProfile.Profile() if functions else None
+        self._sizes: Dict[str, Optional[int]] = {}
+        self.start = None
+        self.end = None
+
+    @contextmanager
+    def running(self) -> Iterator["AnalysisProfile"]:
+        self.start = time.perf_counter()
+        if self._profiler is not None:
+            self._profiler.enable()
+        try:
+            yield self
+        finally:
+            if self._profiler is not None:
+                self._profiler.disable()
+            self.end = time.perf_counter()
+
+    def _size(self, rel_path: str) -> Optional[int]:
+        if rel_path not in self._sizes:
+            try:
+                self._sizes[rel_path] = os.path.getsize(os.path.join(self.root_path, rel_path))
+            except OSError:
+                self._sizes[rel_path] = None
+        return self._sizes[rel_path]
+
+    def files(self) -> Dict[str, Dict[str, float]]:
+        """{rel_path: {stage: seconds}} of every file the analysis saw."""
+        files = {}
+        for phase, key, start, end, _ in self.timer.spans:
+            stage = FILE_STAGES.get(phase)
+            if stage is None or key is None:
+                continue
+            stages = files.get(key)
+            if stages is None:
+                stages = files[key] = dict.fromkeys(FILE_STAGES.values(), 0.0)
+            stages[stage] += end - start
+        return files
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Totals per phase and the TOP_ENTRIES slowest files, with their size
+        and stages; with cProfile, the functions with the most cumulative time too.
+        """
+        files = self.files()
+        slowest = sorted(files.items(), key=lambda item: sum(item[1].values()), reverse=True)[:TOP_ENTRIES]
+        summary = {
+            "seconds": round(self.end - self.start, 6),
+            "files": len(files),
+            "phases": {phase: round(seconds, 6) for phase, seconds in sorted(self.timer.seconds.items())},
+            "slowest_files": [
+                dict({"path": rel_path, "size": self._size(rel_path), "seconds": round(sum(stages.values()), 6)},
+                     **{stage: round(seconds, 6) for stage, seconds in stages.items()})
+                for rel_path, stages in slowest
+            ],
+        }
+        if self._profiler is not None:
+            summary["functions"] = self._functions()
+        return summary
+
+    def _functions(self) -> List[Dict[str, Any]]:
+        # pstats rows: (file, line, name) -> (primitive calls, calls, own time, cumulative time, callers)
+        rows = pstats.Stats(self._profiler).stats.items()
+        slowest = sorted(rows, key=lambda row: row[1][3], reverse=True)[:TOP_ENTRIES]
+        return [
+            {"function": pstats.func_std_string(function), "calls": calls,
+             "own_seconds": round(own, 6), "cumulative_seconds": round(cumulative, 6)}
+            for function, (_, calls, own, cumulative, _) in slowest
+        ]
+
+    def trace(self) -> Dict[str, Any]:
+        """
+        The run in the Chrome trace-event format, which speedscope and
+        Perfetto open as well: one complete ("X") event per file and stage,
+        on one track per process (the analysis thread, then every parser
+        process of the pool), plus the analysis-wide phases.
+        """
+        pid = os.getpid()
+        events = [{"name": "analysis", "cat": "analysis", "ph": "X", "ts": 0.0,
+                   "dur": (self.end - self.start) * 1e6, "pid": pid, "tid": pid,
+                   "args": {"root_path": self.root_path}}]
+        tracks = {pid}
+        for phase, key, start, end, worker in self.timer.spans:
+            tracks.add(worker)
+            event = {"name": key if key is not None else phase, "cat": FILE_STAGES.get(phase, phase), "ph": "X",
+                     "ts": (start - self.start) * 1e6, "dur": (end - start) * 1e6, "pid": pid, "tid": worker}
+            if key is not None:
+                event["args"] = {"size": self._size(key)}
+            events.append(event)
+        for track in sorted(tracks):
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": track,
+                           "args": {"name": "analysis" if track == pid else f"parser {track}"}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+# --- Storage ---
+# Profiles are stored rather than kept in memory, so the worker serving the
+# download need not be the one that ran the analysis.
+
+def save_profile(project_id: int, profile: AnalysisProfile) -> Dict[str, Any]:
+    """Stores the profile and returns its id, creation time and summary."""
+    profile_id = uuid.uuid4().hex
+    created_at = datetime.datetime.now().isoformat()
+    summary = profile.summary()
+    trace = zlib.compress(json.dumps(profile.trace(), separators=(",", ":")).encode("utf-8"), 6)
+
+    with pooled_connection() as conn:
+        conn.execute(
+            "INSERT INTO analysis_profiles (id, project_id, created_at, summary, trace) VALUES (?, ?, ?, ?, ?)",
+            (profile_id, project_id, created_at, json.dumps(summary), trace)
+        )
+        conn.execute(
+            """
+            DELETE FROM analysis_profiles WHERE project_id = ? AND rowid NOT IN (
+                SELECT rowid FROM analysis_profiles WHERE project_id = ? ORDER BY rowid DESC LIMIT ?
+            )
+            """,
+            (project_id, project_id, PROFILES_TO_KEEP)
+        )
+        conn.commit()
+    return {"id": profile_id, "created_at": created_at, "summary": summary}
+
+def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    with pooled_connection() as conn:
+        row = conn.execute(
+            "SELECT id, project_id, created_at, summary FROM analysis_profiles WHERE id = ?", (profile_id,)
+        ).fetchone()
+    if row is None:
+        return None
+    profile = dict(row)
+    profile["summary"] = json.loads(profile["summary"])
+    return profile
+
+def get_profile_trace(profile_id: str) -> Optional[bytes]:
+    """The trace of the profile as JSON bytes."""
+    with pooled_connection() as conn:
+        row = conn.execute("SELECT trace FROM analysis_profiles WHERE id = ?", (profile_id,)).fetchone()
+    return zlib.decompress(row["trace"]) if row is not None else None
+
+def delete_profiles(conn, project_id: int):
+    # Part of the caller's transaction, like delete_snapshots
+    conn.execute("DELETE FROM analysis_profiles WHERE project_id = ?", (project_id,))
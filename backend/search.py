@@ -0,0 +1,133 @@
+import re
+import hashlib
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Full-text index over project files and notes, kept in darktorch.db.
+#
+# search_documents maps every indexed (scope, kind, path) to a stable id that
+# doubles as the rowid of its search_index entry, so a changed file or note is
+# replaced with two primary-key lookups instead of a scan of the FTS table.
+# Files are scoped by the absolute root path they were analysed under (the
+# same key as file_analysis_cache), notes by "project:<id>". The scope column
+# of search_index holds one token naming the scope, so search() narrows the
+# MATCH itself to the project instead of ranking every project's matches and
+# filtering them afterwards.
+#
+# The default unicode61 tokenizer splits on "/", "." and "_", so "pkg/db.py"
+# and "load_graph" are found by any of their parts; the prefix indexes keep
+# the "term*" queries built by search() fast on large projects.
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS search_documents (
+        id INTEGER PRIMARY KEY,
+        scope TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        path TEXT NOT NULL,
+        UNIQUE (scope, kind, path)
+    );
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        path, symbols, content, scope, prefix = '2 3'
+    );
+"""
+
+# bm25 weights of the path, symbols and content columns: a query naming a
+# class or function should rank its defining file above files that merely
+# have the word in their path. The scope filter does not count.
+_RANK = "bm25(search_index, 5.0, 10.0, 1.0, 0.0)"
+SNIPPET_TOKENS = 12
+MAX_RESULTS = 100
+
+def notes_scope(project_id: int) -> str:
+    return f"project:{project_id}"
+
+def scope_token(scope: str) -> str:
+    # Paths would be split into many tokens; a hash is one, and never a word
+    return "s" + hashlib.sha1(scope.encode("utf-8")).hexdigest()[:20]
+
+def _replace(cursor: sqlite3.Cursor, scope: str, kind: str, path: str, symbols: str, content: str):
+    row = cursor.execute(
+        "SELECT id FROM search_documents WHERE scope = ? AND kind = ? AND path = ?", (scope, kind, path)
+    ).fetchone()
+    if row is None:
+        cursor.execute("INSERT INTO search_documents (scope, kind, path) VALUES (?, ?, ?)", (scope, kind, path))
+        doc_id = cursor.lastrowid
+    else:
+        doc_id = row[0]
+        cursor.execute("DELETE FROM search_index WHERE rowid = ?", (doc_id,))
+    cursor.execute(
+        "INSERT INTO search_index (rowid, path, symbols, content, scope) VALUES (?, ?, ?, ?, ?)",
+        (doc_id, path, symbols, content, scope_token(scope))
+    )
+
+def _remove(cursor: sqlite3.Cursor, scope: str, kind: str, path: str):
+    row = cursor.execute(
+        "SELECT id FROM search_documents WHERE scope = ? AND kind = ? AND path = ?", (scope, kind, path)
+    ).fetchone()
+    if row is not None:
+        cursor.execute("DELETE FROM search_index WHERE rowid = ?", (row[0],))
+        cursor.execute("DELETE FROM search_documents WHERE id = ?", (row[0],))
+
+def index_files(conn: sqlite3.Connection, root_path: str, files: Iterable[Tuple[str, List[str]]],
+                removed: Iterable[str] = ()):
+    """
+    Indexes (rel_path, symbols) entries of an analysed tree and drops removed
+    paths, without committing. symbols are the file's top-level classes and
+    functions.
+    """
+    cursor = conn.cursor()
+    for rel_path, symbols in files:
+        _replace(cursor, root_path, "file", rel_path, " ".join(symbols), "")
+    for rel_path in removed:
+        _remove(cursor, root_path, "file", rel_path)
+
+def index_notes(conn: sqlite3.Connection, project_id: int, notes: Iterable[Tuple[str, str]]):
+    """Indexes (file_path, content) notes of a project, without committing."""
+    cursor = conn.cursor()
+    scope = notes_scope(project_id)
+    for file_path, content in notes:
+        _replace(cursor, scope, "note", file_path, "", content)
+
+def delete_scope(conn: sqlite3.Connection, scope: str):
+    """Drops every document of a scope, without committing."""
+    conn.execute("DELETE FROM search_index WHERE rowid IN (SELECT id FROM search_documents WHERE scope = ?)", (scope,))
+    conn.execute("DELETE FROM search_documents WHERE scope = ?", (scope,))
+
+def _match_expression(query: str, scopes: Iterable[str]) -> Optional[str]:
+    # Every word of the query must match the start of a token of the path,
+    # symbols or content of a document in one of the scopes. Quoting each
+    # word keeps FTS5 operators and punctuation typed by the user literal.
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return None
+    words = " ".join(f'"{term}"*' for term in terms)
+    scope = " OR ".join(f'"{scope_token(s)}"' for s in scopes)
+    return f"scope : ({scope}) AND {{path symbols content}} : ({words})"
+
+def search(conn: sqlite3.Connection, root_path: str, project_id: int, query: str,
+           limit: int = 20) -> List[Dict]:
+    """
+    Returns the files and notes of a project matching query, best first.
+
+    Each result carries its kind ("file" or "note"), path, bm25 score (lower
+    is better) and a snippet of the best matching column with the matched
+    terms wrapped in <mark> tags.
+    """
+    expression = _match_expression(query, (root_path, notes_scope(project_id)))
+    if expression is None:
+        return []
+
+    rows = conn.execute(
+        f"""
+        SELECT d.kind, d.path,
+               snippet(search_index, -1, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) AS snippet,
+               {_RANK} AS score
+        FROM search_index
+        JOIN search_documents AS d ON d.id = search_index.rowid
+        WHERE search_index MATCH ?
+        ORDER BY score
+        LIMIT ?
+        """,
+        (expression, min(limit, MAX_RESULTS))
+    )
+    return [dict(row) for row in rows]
@@ -0,0 +1,121 @@
+import json
+import zlib
+import hashlib
+import datetime
+import functools
+from typing import Dict, Any, Optional
+
+from database import pooled_connection
+from compact_graph import CompactGraph
+from coordination import bump_generation, read_generations, graph_scope
+from metrics import phase_duration
+
+# Bump whenever the layout of the stored graph changes; older rows are ignored.
+SNAPSHOT_FORMAT = 1
+# Older snapshots of a project are pruned once it has more than this many.
+SNAPSHOTS_TO_KEEP = 3
+
+def save_snapshot(project_id: int, graph: Dict[str, Any], commit_sha: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Stores the graph as a zlib-compressed snapshot and returns its metadata.
+
+    The ETag is derived from the graph content, so re-analysing an unchanged
+    project keeps the latest snapshot (and its ETag) instead of adding a copy.
+    A new snapshot bumps the graph generation of the project, which tells
+    other workers holding the graph in memory to reload it; the metadata
+    carries the generation the snapshot corresponds to.
+    """
+    with phase_duration.time(phase="snapshot_write"):
+        return _save_snapshot(project_id, graph, commit_sha)
+
+def _save_snapshot(project_id: int, graph: Dict[str, Any], commit_sha: Optional[str]) -> Dict[str, Any]:
+    raw = json.dumps(graph, separators=(",", ":")).encode("utf-8")
+    etag = f'"{SNAPSHOT_FORMAT}-{hashlib.sha1(raw).hexdigest()}"'
+    created_at = datetime.datetime.now().isoformat()
+
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        latest = _latest_row(cursor, project_id, with_data=False)
+        if latest is not None and latest["etag"] == etag:
+            cursor.execute(
+                "UPDATE graph_snapshots SET commit_sha = ?, created_at = ? WHERE id = ?",
+                (commit_sha, created_at, latest["id"])
+            )
+            snapshot_id = latest["id"]
+            generation = read_generations(cursor, [graph_scope(project_id)])[graph_scope(project_id)]
+        else:
+            cursor.execute(
+                """
+                INSERT INTO graph_snapshots (project_id, format, commit_sha, etag, created_at, node_count, edge_count, data)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (project_id, SNAPSHOT_FORMAT, commit_sha, etag, created_at,
+                 len(graph.get("nodes", [])), len(graph.get("edges", [])), zlib.compress(raw, 6))
+            )
+            snapshot_id = cursor.lastrowid
+            cursor.execute(
+                """
+                DELETE FROM graph_snapshots WHERE project_id = ? AND id NOT IN (
+                    SELECT id FROM graph_snapshots WHERE project_id = ? ORDER BY id DESC LIMIT ?
+                )
+                """,
+                (project_id, project_id, SNAPSHOTS_TO_KEEP)
+            )
+            _delete_orphan_layouts(cursor)
+            generation = bump_generation(cursor, graph_scope(project_id))
+        conn.commit()
+
+    return {"id": snapshot_id, "etag": etag, "commit_sha": commit_sha, "created_at": created_at,
+            "generation": generation}
+
+def get_latest_snapshot(project_id: int, with_data: bool = True) -> Optional[Dict[str, Any]]:
+    """Returns the newest snapshot row of the project; "data" is still compressed."""
+    with pooled_connection() as conn:
+        row = _latest_row(conn.cursor(), project_id, with_data=with_data)
+    return dict(row) if row is not None else None
+
+def get_snapshot_data(snapshot_id: int) -> Optional[bytes]:
+    """Returns the compressed graph of a snapshot."""
+    with pooled_connection() as conn:
+        row = conn.execute("SELECT data FROM graph_snapshots WHERE id = ?", (snapshot_id,)).fetchone()
+    return row["data"] if row is not None else None
+
+def load_graph(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(snapshot["data"]))
+
+def compact_etag(etag: str) -> str:
+    # The compact layout is a different representation of the same snapshot
+    return etag[:-1] + '-compact"'
+
+@functools.lru_cache(maxsize=8)
+def get_compact_snapshot_data(snapshot_id: int, etag: str) -> Optional[bytes]:
+    """
+    Returns the snapshot converted to the compact JSON layout, zlib-compressed.
+
+    Snapshot data never changes for a given (id, ETag), so the conversion of
+    the latest snapshots is cached.
+    """
+    data = get_snapshot_data(snapshot_id)
+    if data is None:
+        return None
+    compact = CompactGraph.from_graph(json.loads(zlib.decompress(data)))
+    return zlib.compress(json.dumps(compact.to_json(), separators=(",", ":")).encode("utf-8"), 6)
+
+def delete_snapshots(conn, project_id: int):
+    conn.execute("DELETE FROM graph_snapshots WHERE project_id = ?", (project_id,))
+    _delete_orphan_layouts(conn)
+    bump_generation(conn, graph_scope(project_id))
+
+def _delete_orphan_layouts(cursor):
+    # Layouts are cached per snapshot and go away with it
+    cursor.execute("DELETE FROM graph_layouts WHERE snapshot_id NOT IN (SELECT id FROM graph_snapshots)")
+
+def _latest_row(cursor, project_id: int, with_data: bool):
+    columns = "id, project_id, format, commit_sha, etag, created_at, node_count, edge_count"
+    if with_data:
+        columns += ", data"
+    cursor.execute(
+        f"SELECT {columns} FROM graph_snapshots WHERE project_id = ? AND format = ? ORDER BY id DESC LIMIT 1",
+        (project_id, SNAPSHOT_FORMAT)
+    )
+    return cursor.fetchone()
@@ -1,33 +1,176 @@
 import sys
 import os
-import json
+import shutil
+import tempfile
+from fastapi.testclient import TestClient
 
 # Add current directory to path
 sys.path.append(os.getcwd())
+import database
+import coordination
 
-from ai_service import query_code
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_ai_service.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+import ai_service
+import analyzer
+from ai_service import query_code, chunk_source
+
+client = TestClient(app)
+
+MAIN_SOURCE = '''"""Entry point of the demo project."""
+import os
+import utils
+
+DEBUG = os.environ.get("DEBUG")
+
+def load_graph(path):
+    """Reads the import graph stored at path."""
+    with open(path) as f:
+        return f.read()
+
+@utils.timed
+def render_nodes(graph):
+    for node in graph:
+        print(node)
+
+class Server:
+    def start(self):
+        return "started"
+
+if __name__ == "__main__":
+    render_nodes(load_graph("graph.json"))
+'''
+
+def _write(root, rel_path, content):
+    full_path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+class CountingBackend(ai_service.StubBackend):
+    def __init__(self):
+        super().__init__()
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return super().embed(texts)
+
+def test_chunk_source():
+    chunks = chunk_source(MAIN_SOURCE)
+    assert [(c["name"], c["start"], c["end"]) for c in chunks] == [
+        ("module", 1, 5),
+        ("def load_graph", 7, 10),
+        ("def render_nodes", 12, 15),
+        ("class Server", 17, 19),
+        ("module", 21, 22),
+    ]
+    assert chunks[2]["text"].startswith("@utils.timed\n")
+
+    # Long classes are split per method, long functions into windows
+    long_class = "class Big:\n    x = 1\n" + "".join(f"    def m{i}(self):\n        return {i}\n" for i in range(3))
+    assert [(c["name"], c["start"], c["end"]) for c in chunk_source(long_class, max_lines=4)] == [
+        ("class Big", 1, 2), ("def Big.m0", 3, 4), ("def Big.m1", 5, 6), ("def Big.m2", 7, 8),
+    ]
+    long_function = "def f():\n" + "    x = 1\n" * 9
+    assert [(c["start"], c["end"]) for c in chunk_source(long_function, max_lines=4)] == [(1, 4), (5, 8), (9, 10)]
+    assert [c["name"] for c in chunk_source("def broken(:\n    pass\n")] == ["module"]
 
 def test_ai_service():
-    print("Testing AI Service...")
-    
-    file_path = "main.py"
-    query = "What does this file do?"
-    
-    # We need to ensure the test file exists relative to where we run this script
-    # The ai_service tries to find it in /app/projects/test_project or ../projects/test_project
-    # Let's verify that logic works.
-    
-    response = query_code(file_path, query)
-    
-    print("Response received:")
-    print(response)
-    
-    if "AI Analysis for main.py" in response and "What does this file do?" in response:
-        print("SUCCESS: AI Service returned expected response.")
-    else:
-        print("FAIL: Unexpected response format.")
-        if "Error" in response:
-            print("Make sure the test project files exist in ../projects/test_project relative to backend/")
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    _write(project_dir, "main.py", MAIN_SOURCE)
+    _write(project_dir, "utils.py", "def timed(function):\n    return function\n")
+    backend = CountingBackend()
+    ai_service.set_backend(backend)
+    ai_service._file_cache.clear()
+    ai_service._query_cache.clear()
+    original_open = ai_service.open if hasattr(ai_service, "open") else None
+    reads = []
+    def counting_open(path, *args, **kwargs):
+        reads.append(path)
+        return open(path, *args, **kwargs)
+    ai_service.open = counting_open
+
+    try:
+        print("Testing AI Service...")
+        query = "How is the graph loaded?"
+        response = query_code("main.py", query, project_dir)
+        print(response)
+        assert "AI Analysis for main.py" in response
+        assert query in response
+        # The most similar chunk comes first
+        assert response.split("\n")[2].startswith("- def load_graph (lines 7-10")
+        assert len(reads) == 1
+        assert len(backend.embedded) == len(chunk_source(MAIN_SOURCE)) + 1
+
+        print("Testing a repeated question skips file I/O and embedding...")
+        reads.clear()
+        backend.embedded.clear()
+        assert query_code("main.py", query, project_dir) == response
+        assert reads == [] and backend.embedded == []
+
+        print("Testing the SQLite embedding cache...")
+        ai_service._file_cache.clear()
+        assert query_code("main.py", "Which server starts?", project_dir).split("\n")[2].startswith("- class Server")
+        assert len(reads) == 1
+        assert backend.embedded == ["Which server starts?"]
+        # Once analysed, the content hash comes from the analysis cache without reading
+        analyzer.analyze_project(project_dir)
+        ai_service._file_cache.clear()
+        reads.clear()
+        query_code("main.py", query, project_dir)
+        assert reads == []
+
+        print("Testing a changed file is embedded again...")
+        _write(project_dir, "main.py", MAIN_SOURCE + "\ndef extra():\n    pass\n")
+        backend.embedded.clear()
+        query_code("main.py", query, project_dir)
+        assert any(text.startswith("def extra") for text in backend.embedded)
+
+        print("Testing LRU eviction...")
+        original_limit = ai_service.EMBEDDING_CACHE_FILES
+        ai_service.EMBEDDING_CACHE_FILES = 2
+        try:
+            query_code("utils.py", query, project_dir)
+            conn = database.get_db_connection()
+            assert conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0] == 2
+            conn.close()
+        finally:
+            ai_service.EMBEDDING_CACHE_FILES = original_limit
+
+        print("Testing paths outside the project...")
+        assert query_code("../secret.py", query, project_dir) == "Error: File ../secret.py not found."
+        assert query_code("missing.py", query, project_dir) == "Error: File missing.py not found."
+
+        print("Testing the endpoint resolves the project path...")
+        project_id = client.post("/api/projects/add", json={"name": "AI", "local_path": project_dir}).json()["id"]
+        response = client.post("/api/ai/query", json={"project_id": project_id, "file_path": "utils.py", "query": "timed?"})
+        assert response.status_code == 200
+        assert response.json()["response"].startswith("AI Analysis for utils.py")
+        response = client.post("/api/ai/query", json={"project_id": 999, "file_path": "utils.py", "query": "x"})
+        assert response.status_code == 404
+
+        print("SUCCESS: AI Service returned expected responses.")
+    finally:
+        if original_open is None:
+            del ai_service.open
+        ai_service.set_backend(None)
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
 
 if __name__ == "__main__":
+    test_chunk_source()
     test_ai_service()
@@ -0,0 +1,93 @@
+import sys
+import os
+import shutil
+import tempfile
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_analysis_cache.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from database import init_db
+import analyzer
+
+def _write(root, rel_path, content):
+    full_path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+def test_analysis_cache():
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    _write(project_dir, "main.py", "import utils\nimport pkg.helpers\n")
+    _write(project_dir, "utils.py", "import os\n")
+    _write(project_dir, "pkg/__init__.py", "")
+    _write(project_dir, "pkg/helpers.py", "from utils import thing\n")
+
+    # Count real parses to verify unchanged files are served from the cache
+    parsed = []
+    original_extract = analyzer._extract_imports
+    def counting_extract(source, filename, *args):
+        parsed.append(filename)
+        return original_extract(source, filename, *args)
+    analyzer._extract_imports = counting_extract
+
+    try:
+        print("Testing cold analysis...")
+        first = analyzer.analyze_project(project_dir)
+        assert len(parsed) == 4
+        assert {"source": "main.py", "target": "utils.py"} in first["edges"]
+        assert {"source": "main.py", "target": "pkg/helpers.py"} in first["edges"]
+        assert {"source": "pkg/helpers.py", "target": "utils.py"} in first["edges"]
+
+        print("Testing warm analysis...")
+        parsed.clear()
+        second = analyzer.analyze_project(project_dir)
+        assert parsed == []
+        assert second == first
+
+        print("Testing touched but unchanged file...")
+        st = os.stat(os.path.join(project_dir, "utils.py"))
+        os.utime(os.path.join(project_dir, "utils.py"), ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        third = analyzer.analyze_project(project_dir)
+        assert parsed == []
+        assert third == first
+
+        print("Testing modified file...")
+        _write(project_dir, "utils.py", "import pkg\n# grown\n")
+        fourth = analyzer.analyze_project(project_dir)
+        assert [os.path.basename(p) for p in parsed] == ["utils.py"]
+        assert {"source": "utils.py", "target": "pkg/__init__.py"} in fourth["edges"]
+
+        print("Testing deleted file...")
+        parsed.clear()
+        os.remove(os.path.join(project_dir, "pkg/helpers.py"))
+        fifth = analyzer.analyze_project(project_dir)
+        assert parsed == []
+        assert all(e["source"] != "pkg/helpers.py" and e["target"] != "pkg/helpers.py" for e in fifth["edges"])
+
+        conn = database.get_db_connection()
+        rows = conn.execute("SELECT rel_path FROM file_analysis_cache").fetchall()
+        conn.close()
+        assert sorted(r["rel_path"] for r in rows) == ["main.py", "pkg/__init__.py", "utils.py"]
+
+        print("SUCCESS: Analysis cache verified.")
+    finally:
+        analyzer._extract_imports = original_extract
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_analysis_cache()
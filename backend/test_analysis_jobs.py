@@ -0,0 +1,129 @@
+import sys
+import os
+import time
+import shutil
+import tempfile
+import threading
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_analysis_jobs.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+import main
+import jobs
+
+client = TestClient(app)
+
+def _wait_for(job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/api/analyze/jobs/{job_id}").json()
+        if job["status"] not in jobs.ACTIVE_STATUSES:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_analysis_jobs():
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    original_analyze = main.analyze_project
+    original_keep = jobs.JOBS_TO_KEEP
+    try:
+        with open(os.path.join(project_dir, "main.py"), "w", encoding="utf-8") as f:
+            f.write("import utils\n")
+        with open(os.path.join(project_dir, "utils.py"), "w", encoding="utf-8") as f:
+            f.write("")
+        project_id = client.post("/api/projects/add", json={"name": "Jobs", "local_path": project_dir}).json()["id"]
+
+        print("Testing job submission...")
+        response = client.post("/api/analyze/jobs", json={"project_id": project_id})
+        assert response.status_code == 202
+        job = _wait_for(response.json()["id"])
+        assert job["status"] == "done"
+        assert job["files_scanned"] == 2
+        assert job["files_parsed"] == 2
+        assert job["elapsed"] >= 0
+        assert {"source": "main.py", "target": "utils.py"} in job["result"]["edges"]
+        assert client.get(f"/api/projects/{project_id}").json()["last_analysis"] is not None
+
+        print("Testing de-duplication of concurrent submissions...")
+        release = threading.Event()
+        def slow_analyze(path, progress=None):
+            release.wait(5)
+            return {"nodes": [], "edges": []}
+        main.analyze_project = slow_analyze
+
+        first = client.post("/api/analyze/jobs", json={"project_id": project_id}).json()
+        second = client.post("/api/analyze/jobs", json={"project_id": project_id}).json()
+        assert first["id"] == second["id"]
+        release.set()
+        assert _wait_for(first["id"])["status"] == "done"
+
+        print("Testing failed job...")
+        def failing_analyze(path, progress=None):
+            raise RuntimeError("boom")
+        main.analyze_project = failing_analyze
+        job_id = client.post("/api/analyze/jobs", json={"project_id": project_id}).json()["id"]
+        job = _wait_for(job_id)
+        assert job["status"] == "failed"
+        assert job["error"] == "boom"
+
+        print("Testing recovery after a restart...")
+        conn = database.get_db_connection()
+        conn.execute("INSERT INTO analysis_jobs (id, project_id, status, created_at) VALUES ('stale', ?, 'running', 0)",
+                     (project_id,))
+        conn.commit()
+        conn.close()
+        jobs.recover_jobs()
+        assert client.get("/api/analyze/jobs/stale").json()["status"] == "interrupted"
+
+        assert client.get("/api/analyze/jobs/missing").status_code == 404
+
+        print("Testing old finished jobs are pruned...")
+        jobs.JOBS_TO_KEEP = 2
+        main.analyze_project = original_analyze
+        latest = [_wait_for(client.post("/api/analyze/jobs", json={"project_id": project_id}).json()["id"])["id"]
+                  for _ in range(3)]
+        with database.pooled_connection() as conn:
+            ids = [row["id"] for row in conn.execute("SELECT id FROM analysis_jobs WHERE project_id = ?", (project_id,))]
+        assert sorted(ids) == sorted(latest[1:])
+        assert client.get(f"/api/analyze/jobs/{latest[0]}").status_code == 404
+
+        print("Testing jobs are deleted with their project...")
+        assert client.delete(f"/api/projects/{project_id}").status_code == 200
+        assert client.get(f"/api/analyze/jobs/{latest[-1]}").status_code == 404
+        print("SUCCESS: Analysis jobs verified.")
+    finally:
+        main.analyze_project = original_analyze
+        jobs.JOBS_TO_KEEP = original_keep
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+def test_queue_limit():
+    manager = jobs.JobManager(workers=1, max_queued=0)
+    manager._active[1] = "busy"
+    try:
+        manager.submit(2, lambda progress: None)
+    except jobs.JobQueueFull:
+        pass
+    else:
+        raise AssertionError("expected the queue to be full")
+
+if __name__ == "__main__":
+    test_analysis_jobs()
+    test_queue_limit()
@@ -0,0 +1,50 @@
+import sys
+import os
+import shutil
+import tempfile
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import analyzer
+
+def test_parallel_matches_serial():
+    project_dir = tempfile.mkdtemp()
+    try:
+        for i in range(40):
+            pkg_dir = os.path.join(project_dir, f"pkg{i % 4}")
+            os.makedirs(pkg_dir, exist_ok=True)
+            with open(os.path.join(pkg_dir, f"mod{i}.py"), "w", encoding="utf-8") as f:
+                f.write(f"import pkg{(i + 1) % 4}.mod{(i + 1) % 40}\nimport os\n")
+        with open(os.path.join(project_dir, "broken.py"), "w", encoding="utf-8") as f:
+            f.write("def broken(:\n")
+
+        serial = analyzer.analyze_project(project_dir, use_cache=False, workers=1)
+
+        print("Testing parallel analysis...")
+        original_min_files = analyzer.PARALLEL_MIN_FILES
+        analyzer.PARALLEL_MIN_FILES = 1
+        try:
+            parallel = analyzer.analyze_project(project_dir, use_cache=False, workers=3)
+        finally:
+            analyzer.PARALLEL_MIN_FILES = original_min_files
+
+        assert parallel == serial
+        assert len(serial["nodes"]) == 41
+        assert len(serial["edges"]) == 40
+        print("SUCCESS: Parallel analysis matches serial analysis.")
+    finally:
+        shutil.rmtree(project_dir, ignore_errors=True)
+
+def test_chunk_by_bytes():
+    tasks = [(f"f{i}.py", f"/x/f{i}.py", None) for i in range(100)]
+    sizes = {task[0]: 10 * 1024 for task in tasks}
+    chunks = analyzer._chunk_by_bytes(tasks, sizes, workers=2)
+
+    assert [task for chunk in chunks for task in chunk] == tasks
+    # 1000 KB split into chunks of at least MIN_CHUNK_BYTES
+    assert all(len(chunk) <= 13 for chunk in chunks)
+    assert len(chunks) >= 8
+
+if __name__ == "__main__":
+    test_parallel_matches_serial()
+    test_chunk_by_bytes()
@@ -0,0 +1,138 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_analysis_profile.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+import analyzer
+import profiling
+
+client = TestClient(app)
+
+STAGES = {"walk", "read", "parse", "resolve"}
+
+def _write(root, rel_path, content):
+    full_path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+def test_analysis_profile():
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    original_workers = analyzer.ANALYSIS_WORKERS
+    original_min_files = analyzer.PARALLEL_MIN_FILES
+    original_keep = profiling.PROFILES_TO_KEEP
+    try:
+        for i in range(30):
+            _write(project_dir, f"pkg/mod{i}.py", f"from pkg import mod{(i + 1) % 30}\n")
+        # A generated file that dwarfs the others
+        _write(project_dir, "generated.py", "import os\n" + "VALUE = {'key': [1, 2, 3]}\n" * 20000)
+        project_id = client.post("/api/projects/add", json={"name": "Profiled", "local_path": project_dir}).json()["id"]
+
+        print("Testing a profiled analysis...")
+        response = client.post("/api/analyze", params={"profile": "true"}, json={"project_id": project_id})
+        assert response.status_code == 200
+        result = response.json()
+        assert len(result["nodes"]) == 31 and len(result["edges"]) == 30
+        profile = result["profile"]
+        summary = profile["summary"]
+        assert summary["files"] == 31
+        assert {"scan", "read", "parse", "resolve"} <= set(summary["phases"])
+        assert not {"cache_read", "cache_write"} & set(summary["phases"])
+        slowest = summary["slowest_files"]
+        assert len(slowest) == profiling.TOP_ENTRIES
+        assert slowest[0]["path"] == "generated.py"
+        assert slowest[0]["size"] == os.path.getsize(os.path.join(project_dir, "generated.py"))
+        assert STAGES <= set(slowest[0]) and slowest[0]["parse"] > 0
+        assert [entry["seconds"] for entry in slowest] == sorted((entry["seconds"] for entry in slowest), reverse=True)
+        assert "functions" not in summary
+
+        print("Testing the trace download...")
+        assert profile["trace_url"] == f"/api/analyze/profiles/{profile['id']}/trace"
+        response = client.get(profile["trace_url"])
+        assert response.status_code == 200
+        assert response.headers["content-disposition"] == f'attachment; filename="analysis-{profile["id"]}.trace.json"'
+        events = response.json()["traceEvents"]
+        spans = [event for event in events if event["ph"] == "X"]
+        assert {event["cat"] for event in spans if event["name"] == "generated.py"} == STAGES
+        assert all(event["ts"] >= 0 and event["dur"] >= 0 for event in spans)
+        assert [event["args"]["name"] for event in events if event["ph"] == "M"] == ["analysis"]
+
+        stored = client.get(f"/api/analyze/profiles/{profile['id']}").json()
+        assert stored["project_id"] == project_id and stored["summary"] == summary
+        assert client.get("/api/analyze/profiles/missing").status_code == 404
+        assert client.get("/api/analyze/profiles/missing/trace").status_code == 404
+
+        print("Testing a profile bypasses the analysis cache...")
+        analyzer.analyze_project(project_dir)
+        summary = client.post("/api/analyze", params={"profile": "true", "format": "compact"},
+                              json={"project_id": project_id}).json()["profile"]["summary"]
+        assert summary["files"] == 31
+        assert summary["slowest_files"][0]["path"] == "generated.py"
+        assert all(entry["read"] > 0 and entry["parse"] > 0 for entry in summary["slowest_files"])
+
+        print("Testing spans of the parser processes...")
+        analyzer.ANALYSIS_WORKERS = 2
+        analyzer.PARALLEL_MIN_FILES = 1
+        profile = client.post("/api/analyze", params={"profile": "true"}, json={"project_id": project_id}).json()["profile"]
+        events = client.get(profile["trace_url"]).json()["traceEvents"]
+        tracks = [event["args"]["name"] for event in events if event["ph"] == "M"]
+        assert tracks[0] == "analysis" and len(tracks) > 1
+        assert all(track.startswith("parser ") for track in tracks[1:])
+        parse_tracks = {event["tid"] for event in events if event["ph"] == "X" and event["cat"] == "parse"}
+        assert os.getpid() not in parse_tracks
+
+        print("Testing cProfile sees the parsing...")
+        profile = client.post("/api/analyze", params={"profile_functions": "true"},
+                              json={"project_id": project_id}).json()["profile"]
+        functions = profile["summary"]["functions"]
+        assert 0 < len(functions) <= profiling.TOP_ENTRIES
+        assert any("iter_analysis" in entry["function"] for entry in functions)
+        assert functions[0]["cumulative_seconds"] >= functions[-1]["cumulative_seconds"]
+        events = client.get(profile["trace_url"]).json()["traceEvents"]
+        assert [event["args"]["name"] for event in events if event["ph"] == "M"] == ["analysis"]
+
+        print("Testing old profiles are pruned...")
+        profiling.PROFILES_TO_KEEP = 2
+        latest = client.post("/api/analyze", params={"profile": "true"}, json={"project_id": project_id}).json()["profile"]
+        with database.pooled_connection() as conn:
+            ids = [row["id"] for row in conn.execute("SELECT id FROM analysis_profiles WHERE project_id = ?", (project_id,))]
+        assert sorted(ids) == sorted([profile["id"], latest["id"]])
+
+        print("Testing streamed analyses cannot be profiled...")
+        response = client.post("/api/analyze", params={"profile": "true", "stream": "true"}, json={"project_id": project_id})
+        assert response.status_code == 400
+
+        print("Testing profiles are deleted with their project...")
+        assert client.delete(f"/api/projects/{project_id}").status_code == 200
+        assert client.get(f"/api/analyze/profiles/{latest['id']}").status_code == 404
+        print("SUCCESS: Analysis profiling verified.")
+    finally:
+        analyzer.ANALYSIS_WORKERS = original_workers
+        analyzer.PARALLEL_MIN_FILES = original_min_files
+        profiling.PROFILES_TO_KEEP = original_keep
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_analysis_profile()
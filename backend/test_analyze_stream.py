@@ -0,0 +1,77 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_analyze_stream.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+
+client = TestClient(app)
+
+def test_analyze_stream():
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(project_dir, "main.py"), "w", encoding="utf-8") as f:
+            f.write("import utils\n")
+        with open(os.path.join(project_dir, "utils.py"), "w", encoding="utf-8") as f:
+            f.write("import os\n")
+
+        response = client.post("/api/projects/add", json={"name": "Stream", "local_path": project_dir})
+        project_id = response.json()["id"]
+
+        print("Testing streamed analysis...")
+        response = client.post("/api/analyze?stream=1", json={"project_id": project_id})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        nodes = [line["node"] for line in lines if "node" in line]
+        edges = [line["edge"] for line in lines if "edge" in line]
+
+        # Every node arrives before the first edge, the summary comes last
+        first_edge = next(i for i, line in enumerate(lines) if "edge" in line)
+        assert all("node" in line for line in lines[:first_edge])
+        assert lines[-1] == {"done": True, "nodes": 2, "edges": 1}
+        assert sorted(n["id"] for n in nodes) == ["main.py", "utils.py"]
+        assert edges == [{"source": "main.py", "target": "utils.py"}]
+
+        # Node metrics follow the last edge and merge into the streamed nodes
+        last_edge = max(i for i, line in enumerate(lines) if "edge" in line)
+        metrics = {line["metrics"]["id"]: line["metrics"] for line in lines[last_edge:] if "metrics" in line}
+        assert sorted(metrics) == ["main.py", "utils.py"]
+        assert metrics["utils.py"]["fan_in"] == 1
+        for node in nodes:
+            node.update(metrics[node["id"]])
+
+        # The buffered response carries the same graph
+        response = client.post("/api/analyze", json={"project_id": project_id})
+        assert response.json() == {"nodes": nodes, "edges": edges}
+
+        response = client.get(f"/api/projects/{project_id}")
+        assert response.json()["last_analysis"] is not None
+        print("SUCCESS: Streamed analysis verified.")
+    finally:
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_analyze_stream()
@@ -0,0 +1,198 @@
+import sys
+import os
+import time
+import shutil
+import tempfile
+import threading
+import git
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_batch_operations.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+import git_service
+import batches
+from batches import BatchRunner, RetryableError, url_host
+
+client = TestClient(app)
+AUTHOR = git.Actor("t", "t@example.com")
+
+def _reset_db():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+def _make_bare(root, name):
+    work = os.path.join(root, "work", name)
+    repo = git.Repo.init(work)
+    with open(os.path.join(work, "main.py"), "w") as f:
+        f.write("import os\n")
+    repo.git.add(A=True)
+    repo.index.commit("initial", author=AUTHOR, committer=AUTHOR)
+    bare = os.path.join(root, "remotes", f"{name}.git")
+    git.Repo.clone_from(work, bare, bare=True)
+    repo.create_remote("origin", bare)
+    return repo, "file://" + bare
+
+def _wait(batch_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        batch = client.get(f"/api/batches/{batch_id}").json()
+        if batch["status"] != "running":
+            return batch
+        time.sleep(0.05)
+    raise AssertionError(f"Batch {batch_id} did not finish")
+
+def test_url_host():
+    assert url_host("https://github.com/o/r.git") == "github.com"
+    assert url_host("https://oauth2:x@GitHub.com:443/o/r") == "github.com"
+    assert url_host("git@gitlab.com:o/r.git") == "gitlab.com"
+    assert url_host("file:///srv/git/r.git") == "local"
+    assert url_host("/srv/git/r.git") == "local"
+
+def test_batch_runner():
+    _reset_db()
+    runner = BatchRunner(workers=4, per_host=2, backoff=0.01)
+
+    print("Testing the per-host limit...")
+    lock = threading.Lock()
+    active = {}
+    peak = {}
+    def fetch(position):
+        host = url_host(targets[position][1])
+        with lock:
+            active[host] = active.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), active[host])
+        time.sleep(0.05)
+        with lock:
+            active[host] -= 1
+        return position
+    targets = [(f"repo{i}", f"https://{'a' if i % 4 else 'b'}.example/r{i}") for i in range(12)]
+    batch = runner.submit("test", targets, fetch, lambda position, fetched: {"position": fetched})
+    assert batch["total"] == 12
+    batch_id = batch["id"]
+    while runner.get(batch_id)["status"] == "running":
+        time.sleep(0.02)
+    batch = runner.get(batch_id)
+    assert batch["counts"] == {"done": 12}
+    assert [item["result"] for item in batch["items"]] == [{"position": i} for i in range(12)]
+    assert peak == {"a.example": 2, "b.example": 2}
+
+    print("Testing retries with backoff...")
+    attempts = {}
+    def flaky(position):
+        attempts[position] = attempts.get(position, 0) + 1
+        if position == 0 and attempts[position] < 3:
+            raise RetryableError("connection reset")
+        if position == 1:
+            raise RetryableError("host unreachable")
+        if position == 2:
+            raise ValueError("already exists")
+        return "ok"
+    batch_id = runner.submit("test", [(f"r{i}", "https://c.example/r") for i in range(3)], flaky)["id"]
+    while runner.get(batch_id)["status"] == "running":
+        time.sleep(0.02)
+    items = runner.get(batch_id)["items"]
+    assert (items[0]["status"], items[0]["attempts"], items[0]["result"]) == ("done", 3, "ok")
+    assert (items[1]["status"], items[1]["attempts"], items[1]["message"]) == ("failed", 3, "host unreachable")
+    # Permanent errors are not retried
+    assert (items[2]["status"], items[2]["attempts"]) == ("failed", 1)
+
+    print("Testing recovery after a restart...")
+    database.pool.close_all()
+    with database.pooled_connection() as conn:
+        conn.execute("INSERT INTO batch_jobs (id, kind, status, total, created_at) VALUES ('old', 'sync', 'running', 1, 0)")
+        conn.execute("INSERT INTO batch_items (batch_id, position, target, host, status) VALUES ('old', 0, 'x', 'local', 'running')")
+        conn.commit()
+    batches.recover_batches()
+    batch = runner.get("old")
+    assert batch["status"] == "interrupted" and batch["counts"] == {"interrupted": 1}
+
+def test_batch_endpoints():
+    _reset_db()
+    root = tempfile.mkdtemp()
+    original_projects_dir = git_service.PROJECTS_DIR
+    original_backoff = batches.batch_runner.backoff
+    git_service.PROJECTS_DIR = os.path.join(root, "projects")
+    batches.batch_runner.backoff = 0.01
+    try:
+        upstreams = [_make_bare(root, f"repo{i}") for i in range(5)]
+
+        print("Testing batch import...")
+        repos = [{"repo_url": url, "project_name": f"repo{i}"} for i, (_, url) in enumerate(upstreams)]
+        repos.append({"repo_url": "file://" + os.path.join(root, "remotes", "missing.git"), "project_name": "missing"})
+        response = client.post("/api/projects/import/github/batch", json={"repos": repos})
+        assert response.status_code == 202
+        batch = _wait(response.json()["id"])
+        assert batch["kind"] == "import"
+        assert batch["counts"] == {"done": 5, "failed": 1}
+        assert all(item["host"] == "local" for item in batch["items"])
+        missing = batch["items"][5]
+        assert missing["attempts"] == 3 and "Git clone failed" in missing["message"]
+        projects = [item["result"] for item in batch["items"][:5]]
+        assert [p["name"] for p in projects] == [f"repo{i}" for i in range(5)]
+        assert all(os.path.exists(os.path.join(p["local_path"], "main.py")) for p in projects)
+        assert not os.path.exists(os.path.join(git_service.PROJECTS_DIR, "missing"))
+
+        print("Testing a name that is already taken...")
+        batch = _wait(client.post("/api/projects/import/github/batch", json={"repos": repos[:1]}).json()["id"])
+        assert batch["counts"] == {"failed": 1}
+        assert "already exists" in batch["items"][0]["message"]
+        assert client.post("/api/projects/import/github/batch", json={"repos": repos[:1] * 2}).status_code == 400
+        assert client.post("/api/projects/import/github/batch", json={"repos": []}).status_code == 400
+
+        print("Testing batch sync...")
+        for i in (0, 2):
+            repo = upstreams[i][0]
+            with open(os.path.join(repo.working_tree_dir, "extra.py"), "w") as f:
+                f.write("import main\n")
+            repo.git.add(A=True)
+            repo.index.commit("extra", author=AUTHOR, committer=AUTHOR)
+            repo.git.push("origin", "HEAD")
+        client.post("/api/analyze", json={"project_id": projects[0]["id"]})
+
+        response = client.post("/api/projects/sync/batch", json={})
+        assert response.status_code == 202
+        batch = _wait(response.json()["id"])
+        assert batch["counts"] == {"done": 5}
+        # Projects are synced in id order, which follows the order the clones finished in
+        results = {item["target"]: item["result"] for item in batch["items"]}
+        assert results["repo0"]["analysis"] == "incremental" and results["repo0"]["changed_files"] == 1
+        assert results["repo2"]["analysis"] == "skipped"
+        assert "already up to date" in results["repo1"]["message"]
+        graph = client.get(f"/api/projects/{projects[0]['id']}/graph").json()
+        assert {"source": "extra.py", "target": "main.py"} in graph["edges"]
+
+        print("Testing batch sync of selected projects...")
+        shutil.rmtree(os.path.join(root, "remotes", "repo1.git"))
+        batch = _wait(client.post("/api/projects/sync/batch", json={"project_ids": [projects[1]["id"], projects[3]["id"]]}).json()["id"])
+        assert [item["target"] for item in batch["items"]] == ["repo1", "repo3"]
+        assert [item["status"] for item in batch["items"]] == ["failed", "done"]
+        assert batch["items"][0]["attempts"] == 3
+        assert client.post("/api/projects/sync/batch", json={"project_ids": [999]}).status_code == 404
+        assert client.get("/api/batches/unknown").status_code == 404
+
+        print("SUCCESS: Batch import and sync verified.")
+    finally:
+        git_service.PROJECTS_DIR = original_projects_dir
+        batches.batch_runner.backoff = original_backoff
+        shutil.rmtree(root, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_url_host()
+    test_batch_runner()
+    test_batch_endpoints()
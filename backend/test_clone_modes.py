@@ -0,0 +1,82 @@
+import sys
+import os
+import shutil
+import tempfile
+import git
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import git_service
+import coordination
+from git_service import clone_repo
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+def _make_upstream(root):
+    work = os.path.join(root, "work")
+    repo = git.Repo.init(work)
+    actor = git.Actor("t", "t@example.com")
+    os.makedirs(os.path.join(work, "pkg"))
+    for revision in range(3):
+        with open(os.path.join(work, "pkg", "mod.py"), "w") as f:
+            f.write(f"VALUE = {revision}\n")
+        with open(os.path.join(work, "data.bin"), "wb") as f:
+            f.write(os.urandom(1024))
+        repo.git.add(A=True)
+        repo.index.commit(f"revision {revision}", author=actor, committer=actor)
+    repo.git.branch("other")
+
+    bare = os.path.join(root, "upstream.git")
+    git.Repo.clone_from(work, bare, bare=True)
+    # Needed for --filter clones from a local server
+    git.Repo(bare).git.config("uploadpack.allowFilter", "true")
+    return "file://" + bare
+
+def test_clone_modes():
+    root = tempfile.mkdtemp()
+    original_projects_dir = git_service.PROJECTS_DIR
+    git_service.PROJECTS_DIR = os.path.join(root, "projects")
+    try:
+        url = _make_upstream(root)
+
+        print("Testing shallow clone...")
+        result = clone_repo(url, "shallow", depth=1)
+        assert result["success"], result["message"]
+        assert git.Repo(result["path"]).git.rev_list("--count", "HEAD") == "1"
+
+        print("Testing blob-less clone...")
+        result = clone_repo(url, "blobless", blobless=True)
+        assert result["success"], result["message"]
+        repo = git.Repo(result["path"])
+        assert repo.git.config("remote.origin.partialclonefilter") == "blob:none"
+        assert repo.git.rev_list("--count", "HEAD") == "3"
+
+        print("Testing sparse Python checkout...")
+        result = clone_repo(url, "sparse", sparse_python=True, blobless=True)
+        assert result["success"], result["message"]
+        assert os.path.exists(os.path.join(result["path"], "pkg", "mod.py"))
+        assert not os.path.exists(os.path.join(result["path"], "data.bin"))
+
+        print("Testing single-branch clone...")
+        result = clone_repo(url, "single", single_branch=True, branch="other")
+        assert result["success"], result["message"]
+        repo = git.Repo(result["path"])
+        assert [ref.name for ref in repo.remotes.origin.refs] == ["origin/other"]
+        assert repo.active_branch.name == "other"
+
+        print("Testing invalid depth...")
+        assert not clone_repo(url, "invalid", depth=0)["success"]
+
+        print("Testing failed clone leaves no directory behind...")
+        result = clone_repo(url, "missing_branch", branch="does-not-exist")
+        assert not result["success"]
+        assert not os.path.exists(os.path.join(git_service.PROJECTS_DIR, "missing_branch"))
+
+        print("SUCCESS: Clone modes verified.")
+    finally:
+        git_service.PROJECTS_DIR = original_projects_dir
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_clone_modes()
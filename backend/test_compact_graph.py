@@ -0,0 +1,96 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_compact_graph.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+from compact_graph import CompactGraph
+
+client = TestClient(app)
+
+GRAPH = {
+    "nodes": [
+        {"id": "main.py", "name": "main.py", "type": "python"},
+        {"id": "pkg/util.py", "name": "util.py", "type": "python", "loc": 12},
+        {"id": "pkg/__init__.py", "name": "__init__.py", "type": "python"},
+    ],
+    "edges": [
+        {"source": "main.py", "target": "pkg/util.py"},
+        {"source": "main.py", "target": "pkg/__init__.py"},
+        {"source": "pkg/util.py", "target": "pkg/__init__.py"},
+    ],
+}
+
+def test_compact_round_trip():
+    compact = CompactGraph.from_graph(GRAPH)
+    assert compact.node_count == 3
+    assert compact.edge_count == 3
+    assert compact.sources.typecode == "I"
+    assert compact.sources.tolist() == [0, 0, 1]
+    assert compact.targets.tolist() == [1, 2, 2]
+    assert compact.columns == {"loc": [None, 12, None]}
+    assert compact.to_graph() == GRAPH
+
+    data = json.loads(json.dumps(compact.to_json()))
+    assert data["paths"] == ["main.py", "pkg/util.py", "pkg/__init__.py"]
+    assert CompactGraph.from_json(data).to_graph() == GRAPH
+
+def test_compact_endpoints():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(project_dir, "main.py"), "w", encoding="utf-8") as f:
+            f.write("import utils\n")
+        with open(os.path.join(project_dir, "utils.py"), "w", encoding="utf-8") as f:
+            f.write("")
+        project_id = client.post("/api/projects/add", json={"name": "Compact", "local_path": project_dir}).json()["id"]
+
+        print("Testing compact analysis...")
+        compact = client.post("/api/analyze?format=compact", json={"project_id": project_id}).json()
+        assert compact["format"] == "compact"
+        graph = CompactGraph.from_json(compact).to_graph()
+        assert {"source": "main.py", "target": "utils.py"} in graph["edges"]
+
+        print("Testing compact snapshot...")
+        verbose = client.get(f"/api/projects/{project_id}/graph")
+        response = client.get(f"/api/projects/{project_id}/graph?format=compact")
+        assert response.status_code == 200
+        assert response.json() == compact
+        assert CompactGraph.from_json(response.json()).to_graph() == verbose.json()
+        assert response.headers["etag"] != verbose.headers["etag"]
+
+        etag = response.headers["etag"]
+        response = client.get(f"/api/projects/{project_id}/graph?format=compact", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        response = client.get(f"/api/projects/{project_id}/graph?format=compact", headers={"If-None-Match": verbose.headers["etag"]})
+        assert response.status_code == 200
+
+        assert client.get(f"/api/projects/{project_id}/graph?format=xml").status_code == 400
+        print("SUCCESS: Compact graph verified.")
+    finally:
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_compact_round_trip()
+    test_compact_endpoints()
@@ -1,14 +1,19 @@
 import sys
 import os
+import tempfile
 import sqlite3
 
 # Add current directory to path
 sys.path.append(os.getcwd())
 import database
+import coordination
 
 # Monkeypatch DB_PATH for testing
 database.DB_PATH = "test_darktorch_isolated.db"
 
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
 from database import init_db, get_db_connection
 
 def test_db_logic():
@@ -0,0 +1,79 @@
+import sys
+import os
+import tempfile
+import threading
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_db_pool.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from database import init_db, pooled_connection
+from db_pool import ConnectionPool
+
+def test_pooled_connections():
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    try:
+        print("Testing pragmas and reuse...")
+        with pooled_connection() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+            first = conn
+        with pooled_connection() as conn:
+            assert conn is first
+
+        print("Testing rollback of unfinished transactions...")
+        with pooled_connection() as conn:
+            conn.execute("INSERT INTO notes (file_path, content) VALUES ('left/open.py', 'x')")
+        with pooled_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0] == 0
+
+        print("Testing readers alongside a writer...")
+        writer_ready = threading.Event()
+        reader_done = threading.Event()
+
+        def writer():
+            with pooled_connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("INSERT INTO notes (file_path, content) VALUES ('w.py', 'w')")
+                writer_ready.set()
+                reader_done.wait(5)
+                conn.commit()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        writer_ready.wait(5)
+        # WAL lets this read proceed while the write transaction is open
+        with pooled_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0] == 0
+        reader_done.set()
+        thread.join()
+
+        with pooled_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0] == 1
+        print("SUCCESS: Connection pool verified.")
+    finally:
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+def test_close_all_discards_checked_out_connections():
+    pool = ConnectionPool()
+    with pool.connection(":memory:") as conn:
+        pool.close_all()
+    with pool.connection(":memory:") as other:
+        assert other is not conn
+    pool.close_all()
+
+if __name__ == "__main__":
+    test_pooled_connections()
+    test_close_all_discards_checked_out_connections()
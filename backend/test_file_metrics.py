@@ -0,0 +1,133 @@
+import sys
+import os
+import shutil
+import tempfile
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_file_metrics.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from database import init_db
+import analyzer
+
+METRICS_SOURCE = b'''"""Docstring with if and or for, not counted."""
+import os
+
+# A comment line, not code
+
+class Shape:
+    def area(self):
+        if self.kind == "square" and self.size:
+            return self.size ** 2
+        elif self.kind == "circle" or self.kind == "disc":
+            return 3.14 * self.radius ** 2
+        return 0
+
+async def gather(items):
+    total = 0
+    for item in items:  # for in a comment is skipped
+        while item.pending:
+            item.step()
+        try:
+            total += item.value
+        except ValueError:
+            pass
+        except (KeyError, TypeError):
+            pass
+    values = [x for x in items if x if x.ok]
+    return total if total else None
+
+def outer():
+    class Inner:
+        pass
+    def inner():
+        return "for if while"
+    return inner
+'''
+
+def _write(root, rel_path, content):
+    full_path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+def test_metric_extraction():
+    expected = {
+        "loc": 28,
+        "functions": 4,
+        "classes": 2,
+        # if/and/elif/or + for/while/except/except + comprehension for/if/if + conditional expression
+        "complexity": 1 + 4 + 4 + 3 + 1,
+    }
+    for engine in (analyzer._scan_imports, analyzer._walk_imports):
+        symbols = []
+        metrics = {}
+        assert engine(METRICS_SOURCE, "shapes.py", symbols, metrics) == [("os", 0, None)]
+        assert metrics == expected, (engine.__name__, metrics)
+        assert symbols == ["Shape", "gather", "outer"]
+
+    # Files without imports or definitions still get metrics
+    metrics = {}
+    analyzer._scan_imports(b"VALUE = 1 if True else 2\n\n", "constants.py", None, metrics)
+    assert metrics == {"loc": 1, "functions": 0, "classes": 0, "complexity": 2}
+
+def test_node_metrics():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    _write(project_dir, "main.py", "import utils\nimport shapes\n\nif __name__ == '__main__':\n    utils.run()\n")
+    _write(project_dir, "utils.py", "import shapes\n\ndef run():\n    pass\n")
+    _write(project_dir, "shapes.py", METRICS_SOURCE.decode())
+    _write(project_dir, "broken.py", 'import utils\nx = """never closed\n')
+
+    try:
+        print("Testing metrics as node attributes...")
+        graph = analyzer.analyze_project(project_dir)
+        nodes = {node["id"]: node for node in graph["nodes"]}
+        assert nodes["main.py"] == {
+            "id": "main.py", "name": "main.py", "type": "python",
+            "loc": 4, "functions": 0, "classes": 0, "complexity": 2, "fan_in": 0, "fan_out": 2,
+        }
+        assert nodes["shapes.py"]["fan_in"] == 2
+        assert nodes["shapes.py"]["complexity"] == 13
+        # A file that does not parse keeps its size but no edges
+        assert nodes["broken.py"]["loc"] == 2
+        assert nodes["broken.py"]["fan_out"] == 0
+        assert "complexity" not in nodes["broken.py"]
+
+        print("Testing metrics served from the cache...")
+        assert analyzer.analyze_project(project_dir) == graph
+        compact = analyzer.analyze_project_compact(project_dir)
+        assert compact.to_graph() == graph
+
+        print("Testing incremental update...")
+        _write(project_dir, "utils.py", "def run():\n    return 1 if True else 2\n")
+        updated = analyzer.update_analysis(project_dir, graph, [("M", "utils.py", "utils.py")])
+        nodes = {node["id"]: node for node in updated["nodes"]}
+        assert nodes["utils.py"]["complexity"] == 2
+        assert nodes["utils.py"]["fan_out"] == 0
+        assert nodes["shapes.py"]["fan_in"] == 1
+        # The input graph is left untouched
+        assert {node["id"]: node for node in graph["nodes"]}["shapes.py"]["fan_in"] == 2
+        assert updated == analyzer.analyze_project(project_dir)
+
+        print("SUCCESS: File metrics verified.")
+    finally:
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_metric_extraction()
+    test_node_metrics()
@@ -0,0 +1,100 @@
+import sys
+import os
+import shutil
+import tempfile
+import numpy as np
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_graph_layout.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+import layout
+
+client = TestClient(app)
+
+def _ring(n):
+    paths = [f"pkg{i % 7}/mod{i}.py" for i in range(n)]
+    sources = list(range(n))
+    targets = [(i + 1) % n for i in range(n)]
+    return paths, sources, targets
+
+def test_compute_layout():
+    paths, sources, targets = _ring(60)
+    coords = layout.compute_layout(paths, sources, targets)
+    assert coords.shape == (60, 2)
+    assert coords.dtype == np.float32
+    assert np.isfinite(coords).all()
+    # Deterministic, so a snapshot always gets the same picture
+    assert np.array_equal(coords, layout.compute_layout(paths, sources, targets))
+    # Connected nodes end up closer than average
+    edge_length = np.linalg.norm(coords[sources] - coords[targets], axis=1).mean()
+    spread = np.linalg.norm(coords[:, None] - coords[None, :], axis=2).mean()
+    assert edge_length < spread / 2
+    assert layout.compute_layout([], [], []).shape == (0, 2)
+
+def test_grid_approximation():
+    paths, sources, targets = _ring(3000)
+    pos = layout._initial_positions(paths)
+    exact = layout._repulsion_exact(pos)
+    approx = layout._repulsion_grid(pos)
+    # Far cells as point masses stay close to the exact forces
+    error = np.linalg.norm(exact - approx, axis=1).mean() / np.linalg.norm(exact, axis=1).mean()
+    assert error < 0.1
+    coords = layout.compute_layout(paths, sources, targets, iterations=10)
+    assert np.isfinite(coords).all()
+
+def test_layout_endpoints():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    try:
+        for name, source in (("main.py", "import utils\nimport extra\n"), ("utils.py", ""), ("extra.py", "import utils\n")):
+            with open(os.path.join(project_dir, name), "w", encoding="utf-8") as f:
+                f.write(source)
+        project_id = client.post("/api/projects/add", json={"name": "Layout", "local_path": project_dir}).json()["id"]
+        assert client.get(f"/api/projects/{project_id}/layout").status_code == 404
+
+        print("Testing layout with the analysis...")
+        analyzed = client.post("/api/analyze?layout=true", json={"project_id": project_id}).json()
+        positions = analyzed["positions"]
+        assert sorted(positions) == ["extra.py", "main.py", "utils.py"]
+        assert set(positions["main.py"]) == {"x", "y"}
+
+        print("Testing cached layout...")
+        original_compute = layout.compute_layout
+        layout.compute_layout = None
+        try:
+            cached = client.get(f"/api/projects/{project_id}/layout").json()
+        finally:
+            layout.compute_layout = original_compute
+        assert cached["positions"] == positions
+
+        compact = client.post("/api/analyze?layout=true&format=compact", json={"project_id": project_id}).json()
+        columns = compact["positions"]
+        for number, path in enumerate(compact["paths"]):
+            assert positions[path] == {"x": columns["x"][number], "y": columns["y"][number]}
+
+        print("SUCCESS: Graph layout verified.")
+    finally:
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_compute_layout()
+    test_grid_approximation()
+    test_layout_endpoints()
@@ -0,0 +1,123 @@
+import sys
+import os
+import tempfile
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_graph_lod.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+from compact_graph import CompactGraph
+from graph_lod import DirectoryIndex
+import numpy as np
+import graph_lod
+import snapshots
+
+client = TestClient(app)
+
+FILES = [
+    "main.py",
+    "src/app/__init__.py",
+    "src/app/api/routes.py",
+    "src/app/api/schemas.py",
+    "src/app/core/db.py",
+    "src/app/core/config.py",
+    "tools/build.py",
+]
+EDGES = [
+    ("main.py", "src/app/api/routes.py"),
+    ("src/app/api/routes.py", "src/app/api/schemas.py"),
+    ("src/app/api/routes.py", "src/app/core/db.py"),
+    ("src/app/api/schemas.py", "src/app/core/db.py"),
+    ("src/app/core/db.py", "src/app/core/config.py"),
+    ("tools/build.py", "src/app/core/config.py"),
+]
+
+def _graph():
+    return {
+        "nodes": [{"id": path} for path in FILES],
+        "edges": [{"source": s, "target": t} for s, t in EDGES],
+    }
+
+def _edges(view):
+    return {(e["source"], e["target"]): e["weight"] for e in view["edges"]}
+
+def test_directory_index():
+    index = DirectoryIndex(CompactGraph.from_graph(_graph()))
+    assert index.file_range("src/app/core/") == (4, 6)
+
+    print("Testing collapsed overview...")
+    overview = index.view()
+    assert [n["id"] for n in overview["nodes"]] == ["src/", "tools/", "main.py"]
+    src_node = overview["nodes"][0]
+    assert src_node["type"] == "directory"
+    assert src_node["files"] == 5
+    assert _edges(overview) == {("main.py", "src/"): 1, ("tools/", "src/"): 1}
+
+    print("Testing single-child directories are opened...")
+    # src/ only contains app/, so opening src/ shows the content of app/
+    opened = index.view(["src/"])
+    assert [n["id"] for n in opened["nodes"]][:3] == ["src/app/api/", "src/app/core/", "src/app/__init__.py"]
+
+    print("Testing expanding one package...")
+    expanded = index.view(["src/app"])
+    assert [n["id"] for n in expanded["nodes"]] == ["src/app/api/", "src/app/core/", "src/app/__init__.py", "tools/", "main.py"]
+    assert _edges(expanded) == {
+        ("main.py", "src/app/api/"): 1,
+        ("src/app/api/", "src/app/core/"): 2,
+        ("tools/", "src/app/core/"): 1,
+    }
+    # Expanding a nested directory opens its ancestors too
+    nested = index.view(["src/app/core/"])
+    assert "src/app/core/db.py" in [n["id"] for n in nested["nodes"]]
+    assert _edges(nested)[("src/app/api/", "src/app/core/db.py")] == 2
+
+def test_viewport():
+    graph = CompactGraph.from_graph(_graph())
+    coords = np.array([[i * 10.0, 0.0] for i in range(len(FILES))], dtype=np.float32)
+    result = graph_lod.viewport(graph, coords, (5, -1, 35, 1))
+    assert [n["id"] for n in result["nodes"]] == FILES[1:4]
+    assert result["nodes"][0]["position"] == {"x": 10.0, "y": 0.0}
+    assert result["edges"] == [{"source": "src/app/api/routes.py", "target": "src/app/api/schemas.py"}]
+    assert result["truncated"] is False
+    assert graph_lod.viewport(graph, coords, (5, -1, 35, 1), limit=2)["truncated"] is True
+
+def test_lod_endpoints():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    try:
+        project_id = client.post("/api/projects/add", json={"name": "Lod", "local_path": "lod_project"}).json()["id"]
+        base = f"/api/projects/{project_id}/graph"
+        assert client.get(f"{base}/lod").status_code == 404
+        snapshots.save_snapshot(project_id, _graph())
+
+        overview = client.get(f"{base}/lod").json()
+        assert len(overview["nodes"]) == 3
+        expanded = client.get(f"{base}/lod", params=[("expand", "src/app/"), ("expand", "tools/")]).json()
+        assert "tools/build.py" in [n["id"] for n in expanded["nodes"]]
+
+        everything = client.get(f"{base}/viewport", params={"x0": -1e9, "y0": -1e9, "x1": 1e9, "y1": 1e9}).json()
+        assert len(everything["nodes"]) == len(FILES)
+        assert len(everything["edges"]) == len(EDGES)
+        print("SUCCESS: Level of detail verified.")
+    finally:
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_directory_index()
+    test_viewport()
+    test_lod_endpoints()
@@ -0,0 +1,116 @@
+import sys
+import os
+import tempfile
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_graph_queries.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+from compact_graph import CompactGraph
+from graph_index import GraphIndex
+import snapshots
+
+client = TestClient(app)
+
+# app -> api -> service -> utils, service <-> models cycle, plus a 3-file cycle
+EDGES = [
+    ("app.py", "api.py"),
+    ("api.py", "service.py"),
+    ("service.py", "utils.py"),
+    ("service.py", "models.py"),
+    ("models.py", "service.py"),
+    ("a.py", "b.py"),
+    ("b.py", "c.py"),
+    ("c.py", "a.py"),
+    ("c.py", "utils.py"),
+]
+
+def _graph():
+    paths = sorted({path for edge in EDGES for path in edge} | {"lonely.py"})
+    return {
+        "nodes": [{"id": path, "name": path, "type": "python"} for path in paths],
+        "edges": [{"source": source, "target": target} for source, target in EDGES],
+    }
+
+def test_graph_index():
+    index = GraphIndex(CompactGraph.from_graph(_graph()))
+    n = index.number
+    assert sorted(index.paths[i] for i in index.imports(n("service.py"))) == ["models.py", "utils.py"]
+    assert sorted(index.paths[i] for i in index.importers(n("utils.py"))) == ["c.py", "service.py"]
+
+    reachable = index.reachable(n("utils.py"), reverse=True)
+    assert {index.paths[i]: d for i, d in reachable.items()} == {
+        "service.py": 1, "c.py": 1, "api.py": 2, "models.py": 2, "b.py": 2, "app.py": 3, "a.py": 3
+    }
+    assert len(index.reachable(n("utils.py"), reverse=True, max_depth=1)) == 2
+    assert index.reachable(n("lonely.py")) == {}
+
+    assert [index.paths[i] for i in index.shortest_path(n("app.py"), n("utils.py"))] == [
+        "app.py", "api.py", "service.py", "utils.py"
+    ]
+    assert index.shortest_path(n("utils.py"), n("app.py")) is None
+
+    cycles = [sorted(index.paths[i] for i in c) for c in index.cycles()]
+    assert cycles == [["a.py", "b.py", "c.py"], ["models.py", "service.py"]]
+
+def test_deep_chain_does_not_recurse():
+    count = 20000
+    graph = {
+        "nodes": [{"id": f"m{i}.py"} for i in range(count)],
+        "edges": [{"source": f"m{i}.py", "target": f"m{(i + 1) % count}.py"} for i in range(count)],
+    }
+    index = GraphIndex(CompactGraph.from_graph(graph))
+    assert [len(c) for c in index.cycles()] == [count]
+
+def test_graph_query_endpoints():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    try:
+        project_id = client.post("/api/projects/add", json={"name": "Query", "local_path": "query_project"}).json()["id"]
+        base = f"/api/projects/{project_id}/graph"
+        assert client.get(f"{base}/cycles").status_code == 404
+        snapshots.save_snapshot(project_id, _graph())
+
+        print("Testing importers...")
+        direct = client.get(f"{base}/importers", params={"path": "utils.py"}).json()
+        assert [r["id"] for r in direct["results"]] == ["c.py", "service.py"]
+        transitive = client.get(f"{base}/importers", params={"path": "utils.py", "depth": 0}).json()
+        assert transitive["count"] == 7
+        assert transitive["results"][-1] == {"id": "app.py", "depth": 3}
+
+        print("Testing importees...")
+        importees = client.get(f"{base}/importees", params={"path": "app.py", "depth": 2}).json()
+        assert [r["id"] for r in importees["results"]] == ["api.py", "service.py"]
+        assert client.get(f"{base}/importees", params={"path": "missing.py"}).status_code == 404
+
+        print("Testing cycles and paths...")
+        cycles = client.get(f"{base}/cycles").json()
+        assert cycles["cycles"] == [["a.py", "b.py", "c.py"], ["models.py", "service.py"]]
+        path = client.get(f"{base}/path", params={"source": "a.py", "target": "utils.py"}).json()
+        assert path["path"] == ["a.py", "b.py", "c.py", "utils.py"]
+        assert path["length"] == 3
+        assert client.get(f"{base}/path", params={"source": "utils.py", "target": "a.py"}).json()["path"] is None
+
+        print("SUCCESS: Graph queries verified.")
+    finally:
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_graph_index()
+    test_deep_chain_does_not_recurse()
+    test_graph_query_endpoints()
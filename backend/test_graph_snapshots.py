@@ -0,0 +1,86 @@
+import sys
+import os
+import shutil
+import tempfile
+import git
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_graph_snapshots.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+import snapshots
+
+client = TestClient(app)
+
+def test_graph_snapshots():
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(project_dir, "main.py"), "w", encoding="utf-8") as f:
+            f.write("import utils\n")
+        with open(os.path.join(project_dir, "utils.py"), "w", encoding="utf-8") as f:
+            f.write("")
+        repo = git.Repo.init(project_dir)
+        repo.index.add(["main.py", "utils.py"])
+        head = repo.index.commit("initial", author=git.Actor("t", "t@example.com"),
+                                 committer=git.Actor("t", "t@example.com")).hexsha
+
+        project_id = client.post("/api/projects/add", json={"name": "Snap", "local_path": project_dir}).json()["id"]
+        assert client.get(f"/api/projects/{project_id}/graph").status_code == 404
+
+        print("Testing snapshot after analysis...")
+        analyzed = client.post("/api/analyze", json={"project_id": project_id}).json()
+        response = client.get(f"/api/projects/{project_id}/graph")
+        assert response.status_code == 200
+        assert response.json() == analyzed
+        assert response.headers["x-snapshot-commit"] == head
+        etag = response.headers["etag"]
+
+        print("Testing conditional request...")
+        response = client.get(f"/api/projects/{project_id}/graph", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+        print("Testing unchanged re-analysis keeps the snapshot...")
+        client.post("/api/analyze", json={"project_id": project_id})
+        assert client.get(f"/api/projects/{project_id}/graph").headers["etag"] == etag
+
+        print("Testing changed graph replaces the snapshot...")
+        with open(os.path.join(project_dir, "extra.py"), "w", encoding="utf-8") as f:
+            f.write("import main\n")
+        client.post("/api/analyze", json={"project_id": project_id})
+        response = client.get(f"/api/projects/{project_id}/graph", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert {"source": "extra.py", "target": "main.py"} in response.json()["edges"]
+
+        print("Testing pruning of old snapshots...")
+        for i in range(snapshots.SNAPSHOTS_TO_KEEP + 2):
+            snapshots.save_snapshot(project_id, {"nodes": [{"id": str(i)}], "edges": []})
+        conn = database.get_db_connection()
+        count = conn.execute("SELECT COUNT(*) FROM graph_snapshots WHERE project_id = ?", (project_id,)).fetchone()[0]
+        conn.close()
+        assert count == snapshots.SNAPSHOTS_TO_KEEP
+
+        print("SUCCESS: Graph snapshots verified.")
+    finally:
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_graph_snapshots()
@@ -0,0 +1,77 @@
+import sys
+import os
+from collections import Counter
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+from analyzer import _scan_imports, _walk_imports
+
+TRICKY_SOURCE = b'''"""Module docstring.
+import not_a_module
+from nowhere import nothing
+"""
+import os, sys as system
+from pkg.sub import (
+    a,  # inline comment
+    b,
+)
+from . import sibling
+from .relative import thing
+import first; import second
+x = "import fake"  # import also_fake
+y = f"{x}" ; from semi import colon
+if True: import one_liner
+long_name = \\
+    1
+from continued \\
+    import value
+
+def function():
+    import inside_function
+    s = \'\'\'
+from not_real import x
+\'\'\'
+    return s
+
+class Klass:
+    def method(self):
+        try:
+            from nested.deep import helper
+        except ImportError:
+            import fallback
+        raise ValueError("x") from None
+
+data = {"key": 1, "from_value": 2}
+'''
+
+def test_scanner_matches_walk():
+    expected = _walk_imports(TRICKY_SOURCE, "tricky.py")
+    found = _scan_imports(TRICKY_SOURCE, "tricky.py")
+
+    assert Counter(found) == Counter(expected)
+    modules = [module for module, _, _ in found]
+    assert "not_a_module" not in modules
+    assert "not_real" not in modules
+    assert "inside_function" in modules
+    assert "nested.deep" in modules
+    assert ("", 1, ("sibling",)) in found
+    assert ("relative", 1, ("thing",)) in found
+    assert ("sys", 0, None) in found
+
+def test_scanner_without_imports():
+    assert _scan_imports(b"x = 1\n", "plain.py") == []
+
+def test_scanner_falls_back_on_syntax_error():
+    source = b"import good\nfrom broken import (\n"
+    try:
+        _scan_imports(source, "broken.py")
+    except SyntaxError:
+        pass
+    else:
+        raise AssertionError("expected the full parse to report the syntax error")
+
+if __name__ == "__main__":
+    test_scanner_matches_walk()
+    test_scanner_without_imports()
+    test_scanner_falls_back_on_syntax_error()
+    print("SUCCESS: Import scanner verified.")
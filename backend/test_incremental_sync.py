@@ -0,0 +1,178 @@
+import sys
+import os
+import shutil
+import tempfile
+import threading
+import git
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_incremental_sync.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+from git_service import diff_commits
+import analyzer
+
+client = TestClient(app)
+AUTHOR = git.Actor("t", "t@example.com")
+
+def _write(root, rel_path, content):
+    full_path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+def _commit(repo, message):
+    repo.git.add(A=True)
+    return repo.index.commit(message, author=AUTHOR, committer=AUTHOR).hexsha
+
+def _edge_set(graph):
+    return {(e["source"], e["target"]) for e in graph["edges"]}
+
+def test_incremental_sync():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    upstream_dir = tempfile.mkdtemp()
+    project_dir = os.path.join(tempfile.mkdtemp(), "project")
+    original_extract = analyzer._extract_imports
+    try:
+        upstream = git.Repo.init(upstream_dir)
+        _write(upstream_dir, "main.py", "import utils\nimport pkg.a\n")
+        _write(upstream_dir, "utils.py", "")
+        _write(upstream_dir, "pkg/__init__.py", "")
+        _write(upstream_dir, "pkg/a.py", "from . import b\n")
+        _write(upstream_dir, "pkg/b.py", "import utils\n# helper module\n")
+        _write(upstream_dir, "README.md", "docs\n")
+        before = _commit(upstream, "initial")
+        git.Repo.clone_from(upstream_dir, project_dir)
+
+        project_id = client.post("/api/projects/add", json={
+            "name": "Sync", "local_path": project_dir, "github_url": "https://example.com/sync.git"
+        }).json()["id"]
+        client.post("/api/analyze", json={"project_id": project_id})
+
+        print("Testing sync without upstream changes...")
+        response = client.post(f"/api/projects/{project_id}/sync").json()
+        assert response["before"] == response["after"] == before
+
+        _write(upstream_dir, "main.py", "import pkg.a\nimport new\n")
+        os.remove(os.path.join(upstream_dir, "utils.py"))
+        upstream.git.mv("pkg/b.py", "pkg/c.py")
+        _write(upstream_dir, "pkg/a.py", "from . import c\n")
+        _write(upstream_dir, "new.py", "from pkg import c\n")
+        _write(upstream_dir, "README.md", "more docs\n")
+        after = _commit(upstream, "change")
+
+        print("Testing diff between commits...")
+        changes = diff_commits(upstream_dir, before, after)
+        assert ("R100", "pkg/b.py", "pkg/c.py") in changes
+        assert ("D", "utils.py", "utils.py") in changes
+        assert ("A", "new.py", "new.py") in changes
+
+        print("Testing incremental analysis after sync...")
+        parsed = []
+        def counting_extract(source, filename, *args):
+            parsed.append(os.path.relpath(filename, project_dir).replace("\\", "/"))
+            return original_extract(source, filename, *args)
+        analyzer._extract_imports = counting_extract
+
+        response = client.post(f"/api/projects/{project_id}/sync").json()
+        assert response["before"] == before
+        assert response["after"] == after
+        assert response["analysis"] == "incremental"
+        assert response["changed_files"] == 6
+        # The pure rename reuses its cached imports
+        assert sorted(parsed) == ["main.py", "new.py", "pkg/a.py"]
+
+        graph_response = client.get(f"/api/projects/{project_id}/graph")
+        assert graph_response.headers["x-snapshot-commit"] == after
+        patched = graph_response.json()
+        analyzer._extract_imports = original_extract
+        full = analyzer.analyze_project(project_dir, use_cache=False)
+        assert sorted(n["id"] for n in patched["nodes"]) == sorted(n["id"] for n in full["nodes"])
+        assert _edge_set(patched) == _edge_set(full)
+        assert ("pkg/a.py", "pkg/c.py") in _edge_set(patched)
+        assert ("new.py", "pkg/c.py") in _edge_set(patched)
+
+        conn = database.get_db_connection()
+        rows = conn.execute(
+            "SELECT before_commit, after_commit, analysis FROM project_syncs WHERE project_id = ? ORDER BY id",
+            (project_id,)
+        ).fetchall()
+        conn.close()
+        assert [tuple(r) for r in rows] == [(before, before, "skipped"), (before, after, "incremental")]
+
+        print("SUCCESS: Incremental sync verified.")
+    finally:
+        analyzer._extract_imports = original_extract
+        shutil.rmtree(upstream_dir, ignore_errors=True)
+        shutil.rmtree(os.path.dirname(project_dir), ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+def test_sync_without_snapshot_commit():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    upstream_dir = tempfile.mkdtemp()
+    project_dir = os.path.join(tempfile.mkdtemp(), "project")
+    try:
+        upstream = git.Repo.init(upstream_dir)
+        _write(upstream_dir, "main.py", "import utils\n")
+        _write(upstream_dir, "utils.py", "")
+        _commit(upstream, "initial")
+        git.Repo.clone_from(upstream_dir, project_dir)
+
+        project_id = client.post("/api/projects/add", json={
+            "name": "NoCommit", "local_path": project_dir, "github_url": "https://example.com/nocommit.git"
+        }).json()["id"]
+        client.post("/api/analyze", json={"project_id": project_id})
+        # e.g. a snapshot stored by the watcher, which records no commit
+        with database.pooled_connection() as conn:
+            conn.execute("UPDATE graph_snapshots SET commit_sha = NULL WHERE project_id = ?", (project_id,))
+            conn.commit()
+
+        _write(upstream_dir, "extra.py", "import main\n")
+        after = _commit(upstream, "change")
+
+        print("Testing a sync that falls back to a full analysis...")
+        responses = []
+        sync = threading.Thread(target=lambda: responses.append(client.post(f"/api/projects/{project_id}/sync")),
+                                daemon=True)
+        sync.start()
+        sync.join(timeout=30)
+        assert not sync.is_alive(), "the sync deadlocked on the project lock"
+        response = responses[0].json()
+        assert response["after"] == after
+        assert response["analysis"] == "full"
+
+        graph_response = client.get(f"/api/projects/{project_id}/graph")
+        assert graph_response.headers["x-snapshot-commit"] == after
+        assert ("extra.py", "main.py") in _edge_set(graph_response.json())
+        # The lock was released: another analysis goes through
+        assert client.post("/api/analyze", json={"project_id": project_id}).status_code == 200
+    finally:
+        shutil.rmtree(upstream_dir, ignore_errors=True)
+        shutil.rmtree(os.path.dirname(project_dir), ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_incremental_sync()
+    test_sync_without_snapshot_commit()
@@ -0,0 +1,205 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_metrics.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+import analyzer
+import coordination
+import metrics
+from metrics import Counter, Histogram, PhaseTimer
+
+client = TestClient(app)
+
+def _samples(text):
+    # {"name{labels}": value} of every sample line
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+def test_exposition_format():
+    requests = Counter("test_requests_total", "Requests.", ("route",))
+    latency = Histogram("test_latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    try:
+        requests.inc(route='/a"b')
+        requests.inc(2, route='/a"b')
+        latency.observe(0.05, route="/a")
+        latency.observe(0.5, route="/a")
+        latency.observe(5, route="/a")
+
+        text = metrics.render()
+        assert "# HELP test_requests_total Requests.\n# TYPE test_requests_total counter\n" in text
+        assert "# TYPE test_latency_seconds histogram\n" in text
+        samples = _samples(text)
+        assert samples['test_requests_total{route="/a\\"b"}'] == 3
+        assert samples['test_latency_seconds_bucket{route="/a",le="0.1"}'] == 1
+        assert samples['test_latency_seconds_bucket{route="/a",le="1.0"}'] == 2
+        assert samples['test_latency_seconds_bucket{route="/a",le="+Inf"}'] == 3
+        assert samples['test_latency_seconds_count{route="/a"}'] == 3
+        assert samples['test_latency_seconds_sum{route="/a"}'] == 5.55
+    finally:
+        metrics._registry.remove(requests)
+        metrics._registry.remove(latency)
+
+def test_phase_timer():
+    timer = PhaseTimer()
+    with timer.phase("a"):
+        pass
+    assert list(timer.iterate("b", [1, 2, 3])) == [1, 2, 3]
+    other = PhaseTimer()
+    other.add("a", 1.0)
+    other.add("c", 2.0)
+    timer.merge(other)
+    assert set(timer.seconds) == {"a", "b", "c"}
+    assert timer.seconds["a"] >= 1.0 and timer.seconds["c"] == 2.0
+    assert timer.spans is None
+
+    print("Testing spans of a profiling timer...")
+    timer = PhaseTimer(spans=True)
+    with timer.phase("a"):
+        pass
+    assert list(timer.iterate("b", ["x.py", "y.py"], key=lambda item: item)) == ["x.py", "y.py"]
+    timer.span("c", 1.0, 1.5, "z.py")
+    assert [(span[0], span[1]) for span in timer.spans] == [("a", None), ("b", "x.py"), ("b", "y.py"), ("c", "z.py")]
+    assert all(span[4] == os.getpid() for span in timer.spans)
+    assert timer.seconds["c"] == 0.5
+
+def test_analysis_phases():
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+    metrics.reset()
+
+    project_dir = tempfile.mkdtemp()
+    try:
+        for i in range(10):
+            with open(os.path.join(project_dir, f"mod{i}.py"), "w", encoding="utf-8") as f:
+                f.write(f"import mod{(i + 1) % 10}\n")
+        with open(os.path.join(project_dir, "broken.py"), "w", encoding="utf-8") as f:
+            f.write("def broken(:\n")
+
+        print("Testing the phases of a first analysis...")
+        analyzer.analyze_project(project_dir)
+        for phase in ("cache_read", "scan", "read", "parse", "resolve", "cache_write"):
+            assert metrics.phase_duration.count(phase=phase) == 1, phase
+        assert metrics.analysis_files.value(result="parsed") == 11
+        assert metrics.analysis_files.value(result="cached") == 0
+
+        print("Testing a cached analysis reads no file...")
+        analyzer.analyze_project(project_dir)
+        assert metrics.phase_duration.count(phase="scan") == 2
+        assert metrics.phase_duration.count(phase="read") == 1
+        assert metrics.analysis_files.value(result="cached") == 11
+
+        print("Testing timings of a process pool are kept...")
+        original_min_files = analyzer.PARALLEL_MIN_FILES
+        analyzer.PARALLEL_MIN_FILES = 1
+        try:
+            analyzer.analyze_project(project_dir, use_cache=False, workers=2)
+        finally:
+            analyzer.PARALLEL_MIN_FILES = original_min_files
+        assert metrics.phase_duration.count(phase="parse") == 2
+        assert metrics.analysis_files.value(result="parsed") == 22
+    finally:
+        shutil.rmtree(project_dir, ignore_errors=True)
+
+def test_metrics_endpoint():
+    metrics.reset()
+    project_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(project_dir, "main.py"), "w", encoding="utf-8") as f:
+            f.write("import utils\n")
+        with open(os.path.join(project_dir, "utils.py"), "w", encoding="utf-8") as f:
+            f.write("")
+        project_id = client.post("/api/projects/add", json={"name": "Metered", "local_path": project_dir}).json()["id"]
+        assert client.post("/api/analyze", json={"project_id": project_id}).status_code == 200
+        assert client.get(f"/api/projects/{project_id}/graph").status_code == 200
+        assert client.get("/api/projects/999/graph").status_code == 404
+        assert client.get("/no/such/route").status_code == 404
+
+        print("Testing /metrics...")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == metrics.CONTENT_TYPE
+        samples = _samples(response.text)
+        route = 'route="/api/projects/{project_id}/graph"'
+        assert samples[f'darktorch_http_requests_total{{method="GET",{route},status="200"}}'] == 1
+        assert samples[f'darktorch_http_requests_total{{method="GET",{route},status="404"}}'] == 1
+        assert samples[f'darktorch_http_request_duration_seconds_count{{method="GET",{route}}}'] == 2
+        assert samples['darktorch_http_requests_total{method="GET",route="unmatched",status="404"}'] == 1
+        assert samples['darktorch_phase_duration_seconds_count{phase="snapshot_write"}'] == 1
+        assert samples['darktorch_phase_duration_seconds_count{phase="parse"}'] == 1
+    finally:
+        shutil.rmtree(project_dir, ignore_errors=True)
+
+def test_sharing_between_workers():
+    # Started by any earlier test that ran the startup handler
+    metrics.stop_sharing()
+    metrics.reset()
+    original_dir = metrics.METRICS_DIR
+    metrics.METRICS_DIR = tempfile.mkdtemp()
+    # Stands in for another worker process: it holds its worker lock
+    other = "elsewhere-1-abcdef12"
+    other_lock = coordination.FileLock(f"worker-{other}").acquire()
+    try:
+        metrics.git_operations.inc(operation="clone", result="success")
+        metrics.start_sharing(interval=60)
+        own_file = os.path.join(metrics.METRICS_DIR, f"{coordination.worker_id()}.json")
+        assert os.path.exists(own_file)
+        with open(own_file, encoding="utf-8") as f:
+            assert f'"{metrics.git_operations.name}"' in f.read()
+
+        with open(os.path.join(metrics.METRICS_DIR, f"{other}.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                metrics.git_operations.name: [[["clone", "success"], 2.0], [["pull", "failed"], 1.0]],
+                metrics.phase_duration.name: [[["clone"], [[0] * 16 + [1], 400.0]]],
+            }, f)
+
+        print("Testing samples of the other workers are added...")
+        samples = _samples(metrics.render())
+        assert samples['darktorch_git_operations_total{operation="clone",result="success"}'] == 3
+        assert samples['darktorch_git_operations_total{operation="pull",result="failed"}'] == 1
+        assert samples['darktorch_phase_duration_seconds_bucket{phase="clone",le="+Inf"}'] == 1
+        assert samples['darktorch_phase_duration_seconds_sum{phase="clone"}'] == 400.0
+
+        print("Testing samples of dead workers are dropped...")
+        other_lock.release()
+        samples = _samples(metrics.render())
+        assert samples['darktorch_git_operations_total{operation="clone",result="success"}'] == 1
+        assert not os.path.exists(os.path.join(metrics.METRICS_DIR, f"{other}.json"))
+
+        metrics.stop_sharing()
+        assert not os.path.exists(own_file)
+        print("SUCCESS: Metrics verified.")
+    finally:
+        other_lock.release()
+        metrics.stop_sharing()
+        shutil.rmtree(metrics.METRICS_DIR, ignore_errors=True)
+        metrics.METRICS_DIR = original_dir
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_exposition_format()
+    test_phase_timer()
+    test_analysis_phases()
+    test_metrics_endpoint()
+    test_sharing_between_workers()
@@ -0,0 +1,149 @@
+import sys
+import os
+import time
+import shutil
+import tempfile
+import git
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import git_service
+import coordination
+from git_service import clone_repo, ensure_mirror, evict_mirrors, mirror_key, mirror_path, pull_repo
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+AUTHOR = git.Actor("t", "t@example.com")
+
+def _commit(repo, rel_path, content):
+    with open(os.path.join(repo.working_tree_dir, rel_path), "w") as f:
+        f.write(content)
+    repo.git.add(A=True)
+    repo.index.commit(f"update {rel_path}", author=AUTHOR, committer=AUTHOR)
+
+def _make_bare(root, name, source=None):
+    bare = os.path.join(root, "remotes", f"{name}.git")
+    git.Repo.clone_from(source or _make_work(root, name), bare, bare=True)
+    return bare
+
+def _make_work(root, name):
+    work = os.path.join(root, "work", name)
+    repo = git.Repo.init(work)
+    for revision in range(3):
+        _commit(repo, "main.py", f"VALUE = {revision}\n" + "x = 1\n" * 200)
+    repo.git.branch("feature")
+    return work
+
+def _own_objects(path):
+    # Objects stored in the clone itself, not borrowed through alternates
+    stats = dict(line.split(": ") for line in git.Repo(path).git.count_objects("-v").splitlines())
+    return int(stats["count"]) + int(stats["in-pack"])
+
+def _alternates(path):
+    alternates = os.path.join(path, ".git", "objects", "info", "alternates")
+    if not os.path.exists(alternates):
+        return None
+    with open(alternates) as f:
+        return os.path.dirname(f.read().strip())
+
+def test_mirror_key():
+    assert mirror_key("https://oauth2:t@GitHub.com/Owner/Repo.git/") == "https://github.com/Owner/Repo"
+    assert mirror_path("https://github.com/Owner/Repo") == mirror_path("https://GITHUB.com/Owner/Repo.git")
+    assert mirror_path("https://github.com/Owner/Repo") != mirror_path("https://github.com/Owner/Fork")
+    assert mirror_key("git@github.com:owner/repo.git") == "git@github.com:owner/repo"
+
+def test_mirror_cache():
+    root = tempfile.mkdtemp()
+    original_projects_dir = git_service.PROJECTS_DIR
+    original_quota = git_service.MIRROR_QUOTA_BYTES
+    git_service.PROJECTS_DIR = os.path.join(root, "projects")
+    try:
+        upstream = _make_bare(root, "upstream")
+        url = "file://" + upstream
+
+        print("Testing clones borrow objects from the mirror...")
+        result = clone_repo(url, "main")
+        assert result["success"], result["message"]
+        mirror = mirror_path(url)
+        assert os.path.dirname(mirror) == os.path.join(root, "mirrors")
+        assert _alternates(result["path"]) == mirror
+        assert _own_objects(result["path"]) == 0
+        assert git.Repo(mirror).git.config("remote.origin.url") == mirror_key(url)
+
+        result = clone_repo(url + "/", "feature", branch="feature", single_branch=True)
+        assert result["success"], result["message"]
+        assert _alternates(result["path"]) == mirror
+        assert os.listdir(os.path.join(root, "mirrors")) == [os.path.basename(mirror)]
+
+        print("Testing a fork only fetches its own objects...")
+        fork_work = git.Repo.clone_from(upstream, os.path.join(root, "work", "fork"))
+        _commit(fork_work, "fork.py", "import main\n")
+        fork = _make_bare(root, "fork", fork_work.working_tree_dir)
+        result = clone_repo("file://" + fork, "fork", upstream_url=url)
+        assert result["success"], result["message"]
+        assert _alternates(result["path"]) == mirror
+        # The fork commit, its tree and the new file
+        assert _own_objects(result["path"]) == 3
+        assert os.path.exists(os.path.join(result["path"], "fork.py"))
+
+        print("Testing pulls keep working on top of the mirror...")
+        upstream_work = git.Repo.clone_from(upstream, os.path.join(root, "work", "pusher"))
+        _commit(upstream_work, "extra.py", "import main\n")
+        upstream_work.git.push("origin", "HEAD")
+        assert pull_repo(os.path.join(git_service.PROJECTS_DIR, "main"))
+        assert os.path.exists(os.path.join(git_service.PROJECTS_DIR, "main", "extra.py"))
+
+        print("Testing shallow and blob-less clones skip the mirror...")
+        other = "file://" + _make_bare(root, "other")
+        result = clone_repo(other, "shallow", depth=1)
+        assert result["success"], result["message"]
+        assert _alternates(result["path"]) is None
+        assert not os.path.exists(mirror_path(other))
+
+        print("Testing a failed fetch leaves no half mirror...")
+        missing = "file://" + os.path.join(root, "remotes", "missing.git")
+        result = clone_repo(missing, "missing")
+        assert not result["success"] and result["retryable"]
+        assert not os.path.exists(os.path.join(git_service.PROJECTS_DIR, "missing"))
+        assert sorted(os.listdir(os.path.join(root, "mirrors"))) == [os.path.basename(mirror)]
+
+        print("Testing LRU eviction of unused mirrors...")
+        other_mirror = ensure_mirror(other)
+        third_mirror = ensure_mirror("file://" + _make_bare(root, "third"))
+        now = time.time()
+        os.utime(other_mirror, (now - 200, now - 200))
+        os.utime(third_mirror, (now - 100, now - 100))
+        os.utime(mirror, (now - 300, now - 300))
+        sizes = {path: git_service._tree_size(path) for path in (mirror, other_mirror, third_mirror)}
+        # Room for everything but one mirror: the oldest unused one goes
+        assert evict_mirrors(sum(sizes.values()) - 1) == [other_mirror]
+        # The mirror still referenced by projects stays, even over quota
+        assert evict_mirrors(0) == [third_mirror]
+        assert os.path.exists(mirror)
+        for name in ("main", "feature", "fork"):
+            shutil.rmtree(os.path.join(git_service.PROJECTS_DIR, name))
+        assert evict_mirrors(0) == [mirror]
+
+        print("Testing lock files of clones and evicted mirrors are removed...")
+        locks = [git_service._mirror_lock(path) for path in (mirror, other_mirror, third_mirror, mirror_path(missing))]
+        locks += [git_service._clone_lock(os.path.join(git_service.PROJECTS_DIR, name))
+                  for name in ("main", "feature", "fork", "shallow", "missing")]
+        assert not any(os.path.exists(os.path.join(coordination.lock_dir(), f"{lock.name}.lock")) for lock in locks)
+
+        print("Testing a zero quota disables mirroring...")
+        git_service.MIRROR_QUOTA_BYTES = 0
+        result = clone_repo(url, "plain")
+        assert result["success"], result["message"]
+        assert _alternates(result["path"]) is None
+        assert os.listdir(os.path.join(root, "mirrors")) == []
+
+        print("SUCCESS: Mirror cache verified.")
+    finally:
+        git_service.PROJECTS_DIR = original_projects_dir
+        git_service.MIRROR_QUOTA_BYTES = original_quota
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_mirror_key()
+    test_mirror_cache()
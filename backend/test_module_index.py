@@ -0,0 +1,79 @@
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+from module_index import ModuleIndex
+
+FILES = [
+    "app.py",
+    "pkg/__init__.py",
+    "pkg/core.py",
+    "pkg/sub/__init__.py",
+    "pkg/sub/leaf.py",
+    "nspkg/tool.py",
+    "src/lib/__init__.py",
+    "src/lib/api.py",
+    "scripts/run.py",
+    "scripts/helper.py",
+]
+
+def test_absolute_imports():
+    index = ModuleIndex(FILES)
+    assert index.resolve("app.py", "pkg.core") == ["pkg/core.py"]
+    assert index.resolve("app.py", "pkg") == ["pkg/__init__.py"]
+    assert index.resolve("app.py", "os") == []
+    # Namespace package without __init__.py
+    assert index.resolve("app.py", "nspkg.tool") == ["nspkg/tool.py"]
+    assert index.resolve("app.py", "nspkg", names=("tool",)) == ["nspkg/tool.py"]
+
+def test_from_imports():
+    index = ModuleIndex(FILES)
+    # Submodules resolve to their own file, other names to the package
+    assert index.resolve("app.py", "pkg", names=("core", "sub")) == ["pkg/core.py", "pkg/sub/__init__.py"]
+    assert index.resolve("app.py", "pkg", names=("some_function",)) == ["pkg/__init__.py"]
+    assert index.resolve("app.py", "pkg.core", names=("a", "b")) == ["pkg/core.py"]
+
+def test_relative_imports():
+    index = ModuleIndex(FILES)
+    assert index.resolve("pkg/sub/leaf.py", "", 1, ("__init__",)) == ["pkg/sub/__init__.py"]
+    assert index.resolve("pkg/sub/leaf.py", "", 2, ("core",)) == ["pkg/core.py"]
+    assert index.resolve("pkg/sub/leaf.py", "core", 2, ("thing",)) == ["pkg/core.py"]
+    assert index.resolve("pkg/__init__.py", "", 1, ("core",)) == ["pkg/core.py"]
+    assert index.resolve("pkg/core.py", "sub.leaf", 1, ("x",)) == ["pkg/sub/leaf.py"]
+    # Above the top-level package
+    assert index.resolve("pkg/core.py", "", 3, ("x",)) == []
+
+def test_src_layout_and_scripts():
+    index = ModuleIndex(FILES)
+    assert index.resolve("app.py", "lib.api") == ["src/lib/api.py"]
+    assert index.resolve("src/lib/api.py", "lib", names=("thing",)) == ["src/lib/__init__.py"]
+    # Modules next to a script are importable from it
+    assert index.resolve("scripts/run.py", "helper") == ["scripts/helper.py"]
+
+def test_package_modules_are_not_siblings():
+    # Absolute imports inside a package never pick a module of that package
+    index = ModuleIndex(["pkg/__init__.py", "pkg/a.py", "pkg/types.py", "pkg/logging.py"])
+    assert index.resolve("pkg/a.py", "types") == []
+    assert index.resolve("pkg/a.py", "logging", names=("getLogger",)) == []
+    assert index.resolve("pkg/a.py", "pkg.types") == ["pkg/types.py"]
+
+def test_src_package_is_not_a_root():
+    index = ModuleIndex(["src/__init__.py", "src/mod.py"])
+    assert index.resolve("app.py", "mod") == []
+    assert index.resolve("app.py", "src.mod") == ["src/mod.py"]
+
+def test_root_package():
+    index = ModuleIndex(["__init__.py", "utils.py"], root_package="mypkg")
+    assert index.resolve("__init__.py", "mypkg.utils") == ["utils.py"]
+    assert index.resolve("utils.py", "mypkg") == ["__init__.py"]
+
+if __name__ == "__main__":
+    test_absolute_imports()
+    test_from_imports()
+    test_relative_imports()
+    test_src_layout_and_scripts()
+    test_package_modules_are_not_siblings()
+    test_src_package_is_not_a_root()
+    test_root_package()
+    print("SUCCESS: Module index verified.")
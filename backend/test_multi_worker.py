@@ -0,0 +1,322 @@
+import sys
+import os
+import time
+import shutil
+import asyncio
+import tempfile
+import threading
+import subprocess
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_multi_worker.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+import main
+from main import app
+from database import init_db
+import jobs
+import coordination
+import snapshots
+from coordination import FileLock, LockBusy, project_lock, worker_id, worker_alive, graph_scope, watch_scope
+from watcher import ProjectWatcher, SnapshotFollower, WatchedElsewhere, watch_manager
+
+client = TestClient(app)
+
+# Other worker processes are plain interpreters sharing the database file
+WORKER_PRELUDE = """
+import sys, os
+sys.path.insert(0, {backend!r})
+import database
+database.DB_PATH = {db!r}
+import coordination
+coordination.LOCK_DIR = {locks!r}
+"""
+
+def _start_worker(body, env=None):
+    code = WORKER_PRELUDE.format(backend=os.path.dirname(os.path.abspath(__file__)),
+                                 db=os.path.abspath(database.DB_PATH), locks=coordination.lock_dir())
+    code += body + "\nprint('ready', flush=True)\nsys.stdin.read()\n"
+    process = subprocess.Popen([sys.executable, "-c", code], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               text=True, env={**os.environ, **(env or {})})
+    output = []
+    for line in process.stdout:
+        if line.strip() == "ready":
+            return process, output
+        output.append(line.strip())
+    raise AssertionError(f"Worker exited early: {output}")
+
+def _stop_worker(process):
+    process.stdin.close()
+    assert process.wait(timeout=30) == 0
+
+def _wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return
+        time.sleep(0.02)
+    raise AssertionError("Condition not reached in time")
+
+def _write(root, rel_path, content):
+    full_path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+def _reset_db():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+def test_file_locks():
+    print("Testing locks between worker processes...")
+    worker, _ = _start_worker("from coordination import project_lock\nlock = project_lock(7).acquire()")
+    try:
+        try:
+            project_lock(7).acquire(blocking=False)
+        except LockBusy:
+            pass
+        else:
+            raise AssertionError("expected the project to be locked")
+        started = time.monotonic()
+        try:
+            project_lock(7).acquire(timeout=0.2)
+        except LockBusy:
+            assert time.monotonic() - started >= 0.2
+        else:
+            raise AssertionError("expected the lock to time out")
+        # Other projects are not affected
+        with project_lock(8):
+            pass
+    finally:
+        _stop_worker(worker)
+    # Released when the holder exits
+    project_lock(7).acquire(blocking=False).release()
+
+    print("Testing locks between threads...")
+    held = threading.Event()
+    release = threading.Event()
+    def hold():
+        with FileLock("shared"):
+            held.set()
+            release.wait()
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait()
+    assert coordination.is_locked("shared")
+    release.set()
+    thread.join()
+    assert not coordination.is_locked("shared")
+
+    print("Testing a removed lock still excludes its waiters...")
+    holder = FileLock("removed").acquire()
+    acquired = threading.Event()
+    waiter = FileLock("removed")
+    def wait():
+        waiter.acquire()
+        acquired.set()
+    thread = threading.Thread(target=wait)
+    thread.start()
+    time.sleep(0.1)
+    holder.remove()
+    assert acquired.wait(10)
+    # The waiter retried on the new file rather than holding the removed one
+    assert coordination.is_locked("removed")
+    waiter.remove()
+    thread.join()
+    assert not os.path.exists(os.path.join(coordination.lock_dir(), "removed.lock"))
+
+def test_worker_liveness():
+    assert worker_alive(worker_id())
+    assert not worker_alive(None)
+    assert not worker_alive("gone-1-deadbeef")
+
+    worker, output = _start_worker("import coordination\nprint(coordination.worker_id(), flush=True)")
+    other = output[0]
+    assert other != worker_id()
+    assert worker_alive(other)
+    _stop_worker(worker)
+    # A worker exiting cleanly removes its lock file
+    assert not os.path.exists(os.path.join(coordination.lock_dir(), f"worker-{other}.lock"))
+    assert not worker_alive(other)
+
+def test_job_deduplication():
+    _reset_db()
+    worker, output = _start_worker("import coordination\nprint(coordination.worker_id(), flush=True)")
+    other = output[0]
+    try:
+        with database.pooled_connection() as conn:
+            conn.execute(
+                "INSERT INTO analysis_jobs (id, project_id, status, created_at, owner) VALUES ('remote', 1, 'running', 0, ?)",
+                (other,)
+            )
+            conn.execute(
+                "INSERT INTO analysis_jobs (id, project_id, status, created_at, owner) VALUES ('orphan', 2, 'queued', 0, 'gone-1-x')"
+            )
+            conn.commit()
+
+        print("Testing a job running in another worker is returned...")
+        manager = jobs.JobManager(workers=1)
+        ran = []
+        assert manager.submit(1, lambda progress: ran.append(1))["id"] == "remote"
+        assert ran == []
+
+        print("Testing recovery only touches jobs of dead workers...")
+        jobs.recover_jobs()
+        assert manager.get("remote")["status"] == "running"
+        assert manager.get("orphan")["status"] == "interrupted"
+
+        print("Testing the job of a worker that died is replaced...")
+        _stop_worker(worker)
+        worker = None
+        job = manager.submit(1, lambda progress: "fresh")
+        assert job["id"] != "remote"
+        assert manager.get("remote")["status"] == "interrupted"
+        _wait_for(lambda: manager.get(job["id"])["status"] == "done")
+        assert manager.get(job["id"])["result"] == "fresh"
+
+        print("Testing the database allows one active job per project...")
+        with database.pooled_connection() as conn:
+            conn.execute("INSERT INTO analysis_jobs (id, project_id, status, created_at) VALUES ('a', 3, 'queued', 0)")
+            try:
+                conn.execute("INSERT INTO analysis_jobs (id, project_id, status, created_at) VALUES ('b', 3, 'running', 0)")
+            except database.sqlite3.IntegrityError:
+                pass
+            else:
+                raise AssertionError("expected a second active job to be rejected")
+            conn.rollback()
+    finally:
+        if worker is not None:
+            _stop_worker(worker)
+        database.pool.close_all()
+
+def test_generations():
+    _reset_db()
+    first = snapshots.save_snapshot(1, {"nodes": [{"id": "a"}], "edges": []})
+    assert first["generation"] == 1
+    # An unchanged graph keeps the snapshot and its generation
+    assert snapshots.save_snapshot(1, {"nodes": [{"id": "a"}], "edges": []})["generation"] == 1
+    assert snapshots.save_snapshot(1, {"nodes": [{"id": "b"}], "edges": []})["generation"] == 2
+    assert snapshots.save_snapshot(2, {"nodes": [], "edges": []})["generation"] == 1
+    with database.pooled_connection() as conn:
+        snapshots.delete_snapshots(conn, 1)
+        conn.commit()
+        assert coordination.read_generations(conn, [graph_scope(1), graph_scope(2), graph_scope(3)]) == {
+            graph_scope(1): 3, graph_scope(2): 1, graph_scope(3): 0,
+        }
+    database.pool.close_all()
+
+def test_watcher_coherence():
+    _reset_db()
+    project_dir = tempfile.mkdtemp()
+    loop = asyncio.new_event_loop()
+    watcher = None
+    try:
+        _write(project_dir, "main.py", "import utils\n")
+        _write(project_dir, "utils.py", "")
+
+        print("Testing a snapshot stored by another worker reaches the watcher...")
+        watcher = ProjectWatcher(1, project_dir, interval=0.05, debounce=0.1)
+        watcher.start()
+        queue = watcher.subscribe(loop)
+        graph = {"nodes": watcher.graph["nodes"] + [{"id": "extra.py", "name": "extra.py", "type": "python"}],
+                 "edges": watcher.graph["edges"]}
+        stored = snapshots.save_snapshot(1, graph)
+        event = loop.run_until_complete(asyncio.wait_for(queue.get(), timeout=5))
+        assert event["etag"] == stored["etag"]
+        assert [node["id"] for node in event["added_nodes"]] == ["extra.py"]
+        assert watcher.graph == graph
+
+        print("Testing a stop requested by another worker...")
+        stopped = []
+        watcher.on_remote_stop = lambda: stopped.append(True)
+        with database.pooled_connection() as conn:
+            coordination.bump_generation(conn, watch_scope(1))
+            conn.commit()
+        _wait_for(lambda: stopped)
+        watcher.stop()
+        watcher = None
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        loop.close()
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+
+def test_watch_in_other_worker():
+    _reset_db()
+    project_dir = tempfile.mkdtemp()
+    worker = None
+    original_interval = main.WATCH_INTERVAL
+    try:
+        _write(project_dir, "main.py", "import utils\n")
+        _write(project_dir, "utils.py", "")
+        project_id = client.post("/api/projects/add", json={"name": "Shared", "local_path": project_dir}).json()["id"]
+        worker, _ = _start_worker(
+            f"from watcher import watch_manager\nwatch_manager.start({project_id}, {project_dir!r})",
+            env={"DARKTORCH_WATCH_INTERVAL": "0.05"}
+        )
+
+        print("Testing a watch run by another worker is reported...")
+        assert watch_manager.watched_elsewhere(project_id)
+        try:
+            watch_manager.start(project_id, project_dir)
+        except WatchedElsewhere:
+            pass
+        else:
+            raise AssertionError("expected the project to be watched elsewhere")
+        response = client.post(f"/api/projects/{project_id}/watch")
+        assert response.status_code == 200
+        assert response.json()["nodes"] == 2 and response.json()["edges"] == 1
+        assert watch_manager.get(project_id) is None
+
+        print("Testing the event stream follows the other worker's snapshots...")
+        main.WATCH_INTERVAL = 0.05
+        follower = SnapshotFollower(project_id)
+        stream = main._follow_events(follower)
+        _write(project_dir, "extra.py", "import main\n")
+        loop = asyncio.new_event_loop()
+        try:
+            event = loop.run_until_complete(asyncio.wait_for(stream.__anext__(), timeout=10))
+            assert event.startswith("event: delta\n")
+            assert '"source": "extra.py", "target": "main.py"' in event
+
+            print("Testing a stop through this worker ends the other worker's watch...")
+            assert client.delete(f"/api/projects/{project_id}/watch").json()["watching"] is False
+            _wait_for(lambda: not watch_manager.watched_elsewhere(project_id))
+            try:
+                loop.run_until_complete(asyncio.wait_for(stream.__anext__(), timeout=10))
+            except StopAsyncIteration:
+                pass
+            else:
+                raise AssertionError("expected the stream to end")
+        finally:
+            loop.close()
+        assert client.delete(f"/api/projects/{project_id}/watch").status_code == 404
+        assert client.get(f"/api/projects/{project_id}/events").status_code == 404
+        print("SUCCESS: Multi-worker coordination verified.")
+    finally:
+        main.WATCH_INTERVAL = original_interval
+        if worker is not None:
+            _stop_worker(worker)
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_file_locks()
+    test_worker_liveness()
+    test_job_deduplication()
+    test_generations()
+    test_watcher_coherence()
+    test_watch_in_other_worker()
@@ -0,0 +1,101 @@
+import sys
+import os
+import tempfile
+import sqlite3
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_notes_batch.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+
+client = TestClient(app)
+
+def _reset_db():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+
+def test_notes_batch():
+    _reset_db()
+    init_db()
+
+    try:
+        project = client.post("/api/projects/add", json={"name": "Notes", "local_path": "notes_project"}).json()
+        other = client.post("/api/projects/add", json={"name": "Other", "local_path": "other_project"}).json()
+        base = f"/api/projects/{project['id']}/notes"
+
+        print("Testing bulk upsert...")
+        notes = [{"file_path": f"pkg/mod{i}.py", "content": f"note {i}"} for i in range(600)]
+        response = client.put(base, json={"notes": notes})
+        assert response.status_code == 200
+        saved = response.json()
+        assert saved["written"] == 600
+        assert len(saved["notes"]) == 600
+
+        print("Testing unchanged notes are not rewritten...")
+        notes[3]["content"] = "changed"
+        saved = client.put(base, json={"notes": notes}).json()
+        assert saved["written"] == 1
+
+        print("Testing bulk fetch...")
+        paths = [n["file_path"] for n in notes] + ["missing.py"]
+        fetched = client.post(f"{base}/query", json={"file_paths": paths}).json()
+        assert len(fetched) == 600
+        by_path = {n["file_path"]: n for n in fetched}
+        assert by_path["pkg/mod3.py"]["content"] == "changed"
+        assert by_path["pkg/mod3.py"]["content_hash"] == saved["notes"][3]["content_hash"]
+
+        print("Testing notes are scoped per project...")
+        client.put(f"/api/projects/{other['id']}/notes", json={"notes": [{"file_path": "pkg/mod3.py", "content": "other"}]})
+        assert client.get(base).json() == sorted(fetched, key=lambda n: n["file_path"])
+        assert [n["content"] for n in client.get(f"/api/projects/{other['id']}/notes").json()] == ["other"]
+        assert client.get("/api/projects/999/notes").status_code == 404
+
+        print("Testing project deletion removes its notes...")
+        client.delete(f"/api/projects/{other['id']}")
+        conn = database.get_db_connection()
+        count = conn.execute("SELECT COUNT(*) FROM notes WHERE project_id = ?", (other["id"],)).fetchone()[0]
+        conn.close()
+        assert count == 0
+
+        print("SUCCESS: Batched notes verified.")
+    finally:
+        _reset_db()
+
+def test_notes_migration():
+    _reset_db()
+    # Database created before notes were scoped per project
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY AUTOINCREMENT, file_path TEXT NOT NULL UNIQUE, content TEXT NOT NULL)")
+    conn.execute("INSERT INTO notes (file_path, content) VALUES ('main.py', 'legacy note')")
+    conn.commit()
+    conn.close()
+
+    try:
+        init_db()
+        response = client.get("/api/notes/main.py")
+        assert response.status_code == 200
+        note = response.json()
+        assert note["content"] == "legacy note"
+        assert note["project_id"] == 0
+        assert note["content_hash"] is not None
+
+        updated = client.post("/api/notes/", json={"file_path": "main.py", "content": "new"}).json()
+        assert updated["id"] == note["id"]
+        print("SUCCESS: Notes migration verified.")
+    finally:
+        _reset_db()
+
+if __name__ == "__main__":
+    test_notes_batch()
+    test_notes_migration()
@@ -1,5 +1,6 @@
 import sys
 import os
+import tempfile
 import sqlite3
 from pydantic import BaseModel
 
@@ -16,19 +17,27 @@ from pydantic import BaseModel
 
 sys.path.append(os.getcwd())
 import database
+import coordination
+import metrics
 
 # Monkeypatch DB_PATH for testing
 database.DB_PATH = "test_darktorch.db"
 
+# Keep lock files and shared metrics out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+metrics.METRICS_DIR = tempfile.mkdtemp()
+
 from main import create_or_update_note, get_note, get_all_notes, NoteIn, on_startup
 
 def test_notes_logic():
     print("Initializing DB...")
     on_startup()
+    # Endpoints receive their connection through Depends(get_db); pass one explicitly
+    conn = database.get_db_connection()
     
     print("Testing Create Note...")
     note_in = NoteIn(file_path="test/file.py", content="This is a test note.")
-    created = create_or_update_note(note_in)
+    created = create_or_update_note(note_in, conn)
     print(f"Created: {created}")
     
     if created["content"] != "This is a test note.":
@@ -36,7 +45,7 @@ def test_notes_logic():
         return
 
     print("Testing Get Note...")
-    fetched = get_note("test/file.py")
+    fetched = get_note("test/file.py", conn)
     print(f"Fetched: {fetched}")
     
     if fetched["content"] != "This is a test note.":
@@ -45,7 +54,7 @@ def test_notes_logic():
 
     print("Testing Update Note...")
     update_in = NoteIn(file_path="test/file.py", content="Updated content.")
-    updated = create_or_update_note(update_in)
+    updated = create_or_update_note(update_in, conn)
     print(f"Updated: {updated}")
     
     if updated["content"] != "Updated content.":
@@ -53,7 +62,7 @@ def test_notes_logic():
         return
         
     print("Testing Get All Notes...")
-    all_notes = get_all_notes()
+    all_notes = get_all_notes(conn)
     print(f"All Notes: {all_notes}")
     
     if len(all_notes) != 1:
@@ -61,6 +70,8 @@ def test_notes_logic():
         return
 
     print("SUCCESS: Notes API logic verified.")
+    conn.close()
+    database.pool.close_all()
     
     # Cleanup
     if os.path.exists("test_darktorch.db"):
@@ -1,15 +1,20 @@
 import sys
 import os
+import tempfile
 import sqlite3
 from fastapi.testclient import TestClient
 
 # Add current directory to path
 sys.path.append(os.getcwd())
 import database
+import coordination
 
 # Monkeypatch DB_PATH for testing
 database.DB_PATH = "test_projects.db"
 
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
 from main import app
 from database import init_db
 import main
@@ -99,6 +104,7 @@ def test_project_crud():
     assert response.status_code == 404
 
     # Cleanup
+    database.pool.close_all()
     if os.path.exists(database.DB_PATH):
         try:
             os.remove(database.DB_PATH)
@@ -0,0 +1,222 @@
+import sys
+import os
+import shutil
+import asyncio
+import tempfile
+import threading
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_project_watcher.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+from snapshots import get_latest_snapshot
+import watcher as watcher_module
+from watcher import ProjectWatcher, watch_manager
+
+client = TestClient(app)
+
+def _write(root, rel_path, content):
+    full_path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+def _next_event(loop, queue):
+    return loop.run_until_complete(asyncio.wait_for(queue.get(), timeout=5))
+
+def test_project_watcher():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    loop = asyncio.new_event_loop()
+    watcher = None
+    try:
+        _write(project_dir, "main.py", "import utils\n")
+        _write(project_dir, "utils.py", "")
+
+        watcher = ProjectWatcher(1, project_dir, interval=0.05, debounce=0.1)
+        watcher.start()
+        queue = watcher.subscribe(loop)
+        assert len(watcher.graph["edges"]) == 1
+
+        print("Testing added file...")
+        _write(project_dir, "extra.py", "import utils\nimport main\n")
+        event = _next_event(loop, queue)
+        assert event["type"] == "delta"
+        # Files whose fan-in changed are reported again with their new metrics
+        added = {n["id"]: n for n in event["added_nodes"]}
+        assert sorted(added) == ["extra.py", "main.py", "utils.py"]
+        assert added["extra.py"]["fan_out"] == 2
+        assert added["utils.py"]["fan_in"] == 2
+        assert sorted((e["source"], e["target"]) for e in event["added_edges"]) == [
+            ("extra.py", "main.py"), ("extra.py", "utils.py")
+        ]
+        assert get_latest_snapshot(1, with_data=False)["etag"] == event["etag"]
+
+        print("Testing modified and deleted files...")
+        _write(project_dir, "main.py", "# no imports left\n")
+        os.remove(os.path.join(project_dir, "utils.py"))
+        event = _next_event(loop, queue)
+        assert event["removed_nodes"] == ["utils.py"]
+        assert sorted((e["source"], e["target"]) for e in event["removed_edges"]) == [
+            ("extra.py", "utils.py"), ("main.py", "utils.py")
+        ]
+        assert {(e["source"], e["target"]) for e in watcher.graph["edges"]} == {("extra.py", "main.py")}
+
+        print("Testing stop ends the event stream...")
+        watcher.stop()
+        assert _next_event(loop, queue) is None
+        watcher = None
+        print("SUCCESS: Project watcher verified.")
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        loop.close()
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+def test_watch_endpoints():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    try:
+        _write(project_dir, "main.py", "import utils\n")
+        _write(project_dir, "utils.py", "")
+        project_id = client.post("/api/projects/add", json={"name": "Watch", "local_path": project_dir}).json()["id"]
+
+        assert client.get(f"/api/projects/{project_id}/events").status_code == 404
+        assert client.delete(f"/api/projects/{project_id}/watch").status_code == 404
+
+        response = client.post(f"/api/projects/{project_id}/watch")
+        assert response.status_code == 200
+        assert response.json()["nodes"] == 2
+        assert response.json()["edges"] == 1
+        assert watch_manager.get(project_id) is not None
+        assert client.get(f"/api/projects/{project_id}/graph").headers["etag"] == response.json()["etag"]
+
+        assert client.delete(f"/api/projects/{project_id}/watch").json()["watching"] is False
+        assert watch_manager.get(project_id) is None
+        print("SUCCESS: Watch endpoints verified.")
+    finally:
+        watch_manager.stop_all()
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+def test_watch_start_is_not_exclusive():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    release = threading.Event()
+    analysing = threading.Event()
+    original_analyze = watcher_module.analyze_project
+    def slow_analyze(*args, **kwargs):
+        analysing.set()
+        release.wait(10)
+        return original_analyze(*args, **kwargs)
+    watcher_module.analyze_project = slow_analyze
+    try:
+        _write(project_dir, "main.py", "import utils\n")
+        _write(project_dir, "utils.py", "")
+
+        print("Testing the manager answers while a watch starts...")
+        started = []
+        starter = threading.Thread(target=lambda: started.append(watch_manager.start(1, project_dir)))
+        starter.start()
+        assert analysing.wait(5)
+        assert watch_manager.get(1) is None
+        assert watch_manager.get(2) is None
+        assert not watch_manager.watched_elsewhere(1)
+
+        print("Testing a second start waits for the same watcher...")
+        joined = []
+        second = threading.Thread(target=lambda: joined.append(watch_manager.start(1, project_dir)))
+        second.start()
+        release.set()
+        starter.join(10)
+        second.join(10)
+        assert started and joined and started[0] is joined[0]
+        assert watch_manager.get(1) is started[0]
+        assert watch_manager.stop(1)
+        assert watch_manager.get(1) is None
+        print("SUCCESS: Watch start verified.")
+    finally:
+        release.set()
+        watcher_module.analyze_project = original_analyze
+        watch_manager.stop_all()
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+def test_delete_watched_project():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    release = threading.Event()
+    updating = threading.Event()
+    original_update = watcher_module.update_analysis
+    def slow_update(*args, **kwargs):
+        updating.set()
+        release.wait(10)
+        return original_update(*args, **kwargs)
+    try:
+        _write(project_dir, "main.py", "import utils\n")
+        _write(project_dir, "utils.py", "")
+        project_id = client.post("/api/projects/add", json={"name": "Deleted", "local_path": project_dir}).json()["id"]
+        assert client.post(f"/api/projects/{project_id}/watch").status_code == 200
+
+        print("Testing a watcher update in flight does not outlive its project...")
+        watcher_module.update_analysis = slow_update
+        _write(project_dir, "other.py", "import utils\n")
+        assert updating.wait(10)
+        deleted = []
+        deleter = threading.Thread(target=lambda: deleted.append(client.delete(f"/api/projects/{project_id}").status_code))
+        deleter.start()
+        deleter.join(0.3)
+        release.set()
+        deleter.join(10)
+        assert deleted == [200]
+        assert watch_manager.get(project_id) is None
+        with database.pooled_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM graph_snapshots WHERE project_id = ?", (project_id,)).fetchone()[0] == 0
+        print("SUCCESS: Deleting a watched project verified.")
+    finally:
+        release.set()
+        watcher_module.update_analysis = original_update
+        watch_manager.stop_all()
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_project_watcher()
+    test_watch_endpoints()
+    test_watch_start_is_not_exclusive()
+    test_delete_watched_project()
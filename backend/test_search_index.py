@@ -0,0 +1,170 @@
+import sys
+import os
+import shutil
+import tempfile
+from fastapi.testclient import TestClient
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+import database
+import coordination
+
+# Monkeypatch DB_PATH for testing
+database.DB_PATH = "test_search_index.db"
+
+# Keep lock files out of the source tree
+coordination.LOCK_DIR = tempfile.mkdtemp()
+
+from main import app
+from database import init_db
+import analyzer
+
+client = TestClient(app)
+
+def _write(root, rel_path, content):
+    full_path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+def _paths(response, kind=None):
+    assert response.status_code == 200
+    return [r["path"] for r in response.json()["results"] if kind is None or r["kind"] == kind]
+
+def test_symbol_extraction():
+    source = (
+        b"import os\n"
+        b"class Store:\n"
+        b"    def inner(self): pass\n"
+        b"async def fetch_all(): pass\n"
+        b"text = '''\n"
+        b"def not_a_function(): pass\n"
+        b"'''\n"
+        b"def load_graph(): pass\n"
+    )
+    for engine in (analyzer._scan_imports, analyzer._walk_imports):
+        symbols = []
+        engine(source, "x.py", symbols)
+        assert symbols == ["Store", "fetch_all", "load_graph"], (engine.__name__, symbols)
+
+    # No imports at all still yields the definitions
+    symbols = []
+    assert analyzer._scan_imports(b"def only(): pass\n", "x.py", symbols) == []
+    assert symbols == ["only"]
+
+def test_search_index():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    other_dir = tempfile.mkdtemp()
+    _write(project_dir, "main.py", "import storage\n\ndef run_server(): pass\n")
+    _write(project_dir, "storage.py", "class GraphStore:\n    pass\n\ndef load_graph(): pass\n")
+    _write(project_dir, "pkg/__init__.py", "")
+    _write(project_dir, "pkg/graph_utils.py", "def helper(): pass\n")
+
+    try:
+        project = client.post("/api/projects/add", json={"name": "Search", "local_path": project_dir}).json()
+        base = f"/api/projects/{project['id']}/search"
+
+        print("Testing files are indexed by analysis...")
+        analyzer.analyze_project(project_dir)
+        assert _paths(client.get(base, params={"q": "GraphStore"})) == ["storage.py"]
+        # Prefix match on a symbol, ranked above the path match
+        assert _paths(client.get(base, params={"q": "graph"}))[:2] == ["storage.py", "pkg/graph_utils.py"]
+        results = client.get(base, params={"q": "load_gr"}).json()["results"]
+        assert results[0]["path"] == "storage.py"
+        assert results[0]["snippet"] == "GraphStore <mark>load_graph</mark>"
+        assert _paths(client.get(base, params={"q": "utils"})) == ["pkg/graph_utils.py"]
+        assert _paths(client.get(base, params={"q": "\"*()"})) == []
+
+        print("Testing other projects stay out of the results...")
+        _write(other_dir, "graph_store.py", "class GraphStore:\n    pass\n")
+        other = client.post("/api/projects/add", json={"name": "Other", "local_path": other_dir}).json()
+        analyzer.analyze_project(other_dir)
+        client.post("/api/notes/", json={"project_id": other["id"], "file_path": "graph_store.py", "content": "GraphStore"})
+        assert _paths(client.get(base, params={"q": "GraphStore"})) == ["storage.py"]
+        assert _paths(client.get(f"/api/projects/{other['id']}/search", params={"q": "GraphStore"})) == [
+            "graph_store.py", "graph_store.py"]
+
+        print("Testing notes are indexed on save...")
+        client.post("/api/notes/", json={"project_id": project["id"], "file_path": "main.py", "content": "Entry point, starts the uvicorn server"})
+        client.put(f"/api/projects/{project['id']}/notes", json={"notes": [
+            {"file_path": "storage.py", "content": "Persists snapshots in sqlite"},
+        ]})
+        results = client.get(base, params={"q": "uvicorn"}).json()["results"]
+        assert [(r["kind"], r["path"]) for r in results] == [("note", "main.py")]
+        assert "<mark>uvicorn</mark>" in results[0]["snippet"]
+        client.put(f"/api/projects/{project['id']}/notes", json={"notes": [
+            {"file_path": "storage.py", "content": "Persists snapshots in postgres"},
+        ]})
+        assert _paths(client.get(base, params={"q": "sqlite"})) == []
+        assert _paths(client.get(base, params={"q": "postgres"}), "note") == ["storage.py"]
+
+        print("Testing incremental updates...")
+        _write(project_dir, "storage.py", "# grown\ndef save_graph(): pass\n")
+        os.remove(os.path.join(project_dir, "pkg/graph_utils.py"))
+        analyzer.analyze_project(project_dir)
+        assert _paths(client.get(base, params={"q": "GraphStore"})) == []
+        assert _paths(client.get(base, params={"q": "save_graph"})) == ["storage.py"]
+        assert _paths(client.get(base, params={"q": "utils"})) == []
+
+        print("Testing project deletion drops the index...")
+        client.delete(f"/api/projects/{project['id']}")
+        client.delete(f"/api/projects/{other['id']}")
+        conn = database.get_db_connection()
+        assert conn.execute("SELECT COUNT(*) FROM search_documents").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM search_index").fetchone()[0] == 0
+        conn.close()
+
+        assert client.get("/api/projects/999/search", params={"q": "x"}).status_code == 404
+
+        print("SUCCESS: Search index verified.")
+    finally:
+        shutil.rmtree(project_dir, ignore_errors=True)
+        shutil.rmtree(other_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+def test_search_index_migration():
+    database.pool.close_all()
+    if os.path.exists(database.DB_PATH):
+        os.remove(database.DB_PATH)
+    init_db()
+
+    project_dir = tempfile.mkdtemp()
+    _write(project_dir, "storage.py", "class GraphStore:\n    pass\n")
+    try:
+        project = client.post("/api/projects/add", json={"name": "Old", "local_path": project_dir}).json()
+        analyzer.analyze_project(project_dir)
+        client.post("/api/notes/", json={"project_id": project["id"], "file_path": "storage.py", "content": "Keeps graphs"})
+
+        print("Testing an index without scopes is rebuilt...")
+        conn = database.get_db_connection()
+        rows = conn.execute("SELECT rowid, path, symbols, content FROM search_index").fetchall()
+        conn.execute("DROP TABLE search_index")
+        conn.execute("CREATE VIRTUAL TABLE search_index USING fts5(path, symbols, content, prefix = '2 3')")
+        conn.executemany("INSERT INTO search_index (rowid, path, symbols, content) VALUES (?, ?, ?, ?)",
+                         [tuple(row) for row in rows])
+        conn.commit()
+        conn.close()
+        database.pool.close_all()
+        init_db()
+
+        base = f"/api/projects/{project['id']}/search"
+        assert _paths(client.get(base, params={"q": "GraphStore"})) == ["storage.py"]
+        assert _paths(client.get(base, params={"q": "graphs"}), "note") == ["storage.py"]
+        print("SUCCESS: Search index migration verified.")
+    finally:
+        shutil.rmtree(project_dir, ignore_errors=True)
+        database.pool.close_all()
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+
+if __name__ == "__main__":
+    test_symbol_extraction()
+    test_search_index()
+    test_search_index_migration()
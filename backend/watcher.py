@@ -0,0 +1,368 @@
+import os
+import time
+import asyncio
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from analyzer import analyze_project, update_analysis, scan_file_states
+from database import pooled_connection
+from git_service import get_head_commit
+from snapshots import save_snapshot, get_latest_snapshot, load_graph
+from coordination import (FileLock, LockBusy, project_lock, is_locked, bump_generation, read_generations,
+                          graph_scope, watch_scope)
+
+# Seconds between two polls of the project tree.
+WATCH_INTERVAL = float(os.environ.get("DARKTORCH_WATCH_INTERVAL", "1.0"))
+# A burst of changes is applied once the tree has been quiet this long...
+WATCH_DEBOUNCE = 0.5
+# ...or at the latest this long after the first change of the burst.
+WATCH_MAX_DELAY = 5.0
+# Events a slow client may fall behind before it is asked to reload the graph.
+SUBSCRIBER_QUEUE_SIZE = 100
+
+def graph_delta(old: Dict[str, List[Dict[str, Any]]], new: Dict[str, List[Dict[str, Any]]]) -> Dict[str, list]:
+    """
+    Returns what changed between two graphs.
+
+    Nodes whose attributes changed are reported again in added_nodes, so a
+    client can apply the delta by removing, then upserting.
+    """
+    old_nodes = {node["id"]: node for node in old["nodes"]}
+    new_nodes = {node["id"]: node for node in new["nodes"]}
+    old_edges = {(edge["source"], edge["target"]) for edge in old["edges"]}
+    new_edges = {(edge["source"], edge["target"]) for edge in new["edges"]}
+
+    return {
+        "added_nodes": [node for node_id, node in new_nodes.items() if old_nodes.get(node_id) != node],
+        "removed_nodes": [node_id for node_id in old_nodes if node_id not in new_nodes],
+        "added_edges": [{"source": s, "target": t} for s, t in new_edges - old_edges],
+        "removed_edges": [{"source": s, "target": t} for s, t in old_edges - new_edges],
+    }
+
+class ProjectWatcher:
+    """
+    Keeps the graph of one local project in step with its files.
+
+    A background thread polls the tree with os.scandir (mtime and size of
+    every .py file), waits for a burst of edits to settle, patches the graph
+    through update_analysis so only the changed files are parsed, stores it
+    as the new snapshot, and pushes the difference to every subscriber.
+
+    Every poll also reads the project's generations: a snapshot stored by
+    another worker (a sync, an analysis) replaces the graph held here and is
+    pushed as a delta too, and a stop requested through another worker ends
+    the watch by calling on_remote_stop.
+    """
+
+    def __init__(self, project_id: int, root_path: str, interval: float = WATCH_INTERVAL,
+                 debounce: float = WATCH_DEBOUNCE, max_delay: float = WATCH_MAX_DELAY,
+                 on_remote_stop: Optional[Callable[[], Any]] = None):
+        self.project_id = project_id
+        self.root_path = root_path
+        self.interval = interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.graph = None
+        self.etag = None
+        self.on_remote_stop = on_remote_stop
+        self._generations = {}
+        self._files = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._subscribers = []  # (loop, asyncio.Queue)
+
+    def start(self):
+        with project_lock(self.project_id):
+            self._generations = self._read_generations()
+            # The first full analysis is mostly served from the analysis cache
+            self._files = scan_file_states(self.root_path)
+            self.graph = analyze_project(self.root_path)
+            self._store(self.graph)
+        self._thread = threading.Thread(target=self._run, name=f"watch-{self.project_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._publish(None)
+
+    def subscribe(self, loop: asyncio.AbstractEventLoop) -> asyncio.Queue:
+        """Returns a queue that receives every delta event; None means the watch ended."""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.append((loop, queue))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers = [(loop, q) for loop, q in self._subscribers if q is not queue]
+
+    def _run(self):
+        last_seen = self._files
+        first_change = last_change = None
+
+        while not self._stop.wait(self.interval):
+            try:
+                if not self._follow_generations():
+                    if self.on_remote_stop is not None:
+                        self.on_remote_stop()
+                    return
+            except Exception as e:
+                print(f"Error checking the generations of watched project {self.project_id}: {e}")
+
+            try:
+                current = scan_file_states(self.root_path)
+            except Exception as e:
+                print(f"Error scanning watched project {self.project_id}: {e}")
+                continue
+
+            now = time.monotonic()
+            if current != last_seen:
+                last_seen = current
+                last_change = now
+                first_change = first_change or now
+                if now - first_change < self.max_delay:
+                    continue
+            if first_change is None or (now - last_change < self.debounce and now - first_change < self.max_delay):
+                continue
+
+            first_change = last_change = None
+            try:
+                self._apply(current)
+            except Exception as e:
+                print(f"Error updating the graph of watched project {self.project_id}: {e}")
+
+    def _apply(self, current: Dict[str, Tuple[int, int]]):
+        changes = [("D", rel_path, rel_path) for rel_path in self._files if rel_path not in current]
+        for rel_path, state in current.items():
+            previous = self._files.get(rel_path)
+            if previous is None:
+                changes.append(("A", rel_path, rel_path))
+            elif previous != state:
+                changes.append(("M", rel_path, rel_path))
+        self._files = current
+        if not changes:
+            return
+
+        with project_lock(self.project_id):
+            generations = self._read_generations()
+            if generations[watch_scope(self.project_id)] != self._generations[watch_scope(self.project_id)]:
+                # Stopped elsewhere, e.g. by deleting the project, while waiting for the lock
+                return
+            # Patch the newest graph, even if another worker stored it a moment ago
+            events = [self._catch_up(generations[graph_scope(self.project_id)])]
+            graph = update_analysis(self.root_path, self.graph, changes)
+            if graph is None:
+                graph = analyze_project(self.root_path)
+
+            delta = graph_delta(self.graph, graph)
+            self.graph = graph
+            # Edits that did not touch any import are not stored
+            if any(delta.values()):
+                self._store(graph)
+                events.append(dict(type="delta", etag=self.etag, **delta))
+        for event in events:
+            if event is not None:
+                self._publish(event)
+
+    def _read_generations(self) -> Dict[str, int]:
+        with pooled_connection() as conn:
+            return read_generations(conn, [graph_scope(self.project_id), watch_scope(self.project_id)])
+
+    def _follow_generations(self) -> bool:
+        # False once a stop was requested elsewhere
+        generations = self._read_generations()
+        if generations[watch_scope(self.project_id)] != self._generations[watch_scope(self.project_id)]:
+            return False
+        generation = generations[graph_scope(self.project_id)]
+        if generation != self._generations[graph_scope(self.project_id)]:
+            with project_lock(self.project_id):
+                event = self._catch_up(generation)
+            if event is not None:
+                self._publish(event)
+        return True
+
+    def _catch_up(self, generation: int) -> Optional[Dict[str, Any]]:
+        # Adopts the latest snapshot if another worker stored it; callers hold the project lock
+        if generation == self._generations[graph_scope(self.project_id)]:
+            return None
+        self._generations[graph_scope(self.project_id)] = generation
+        snapshot = get_latest_snapshot(self.project_id)
+        if snapshot is None or snapshot["etag"] == self.etag:
+            return None
+        graph = load_graph(snapshot)
+        delta = graph_delta(self.graph, graph)
+        self.graph, self.etag = graph, snapshot["etag"]
+        return dict(type="delta", etag=self.etag, **delta)
+
+    def _store(self, graph: Dict[str, Any]):
+        try:
+            snapshot = save_snapshot(self.project_id, graph, get_head_commit(self.root_path))
+            self.etag = snapshot["etag"]
+            self._generations[graph_scope(self.project_id)] = snapshot["generation"]
+        except Exception as e:
+            print(f"Error saving graph snapshot for watched project {self.project_id}: {e}")
+
+    def _publish(self, event: Optional[Dict[str, Any]]):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # Event loop already closed
+                self.unsubscribe(queue)
+
+def _offer(queue: asyncio.Queue, event: Optional[Dict[str, Any]]):
+    # Runs on the subscriber's loop. A client too slow to keep up gets its
+    # backlog replaced by a single request to reload the whole graph.
+    if queue.full():
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait({"type": "resync"})
+    queue.put_nowait(event)
+
+def watch_lock(project_id: int) -> FileLock:
+    # Held by the worker running the project's watcher, for as long as it runs
+    return FileLock(f"watch-{project_id}")
+
+class WatchedElsewhere(Exception):
+    pass
+
+class WatchManager:
+    """
+    Tracks the running watchers, at most one per project across all worker
+    processes. Starting a watch that another worker runs raises
+    WatchedElsewhere; stopping it asks that worker to stop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._watchers: Dict[int, ProjectWatcher] = {}
+        self._watch_locks: Dict[int, FileLock] = {}
+        # Projects whose watcher is running its initial analysis; the event
+        # is set once it is registered (or failed to start)
+        self._starting: Dict[int, threading.Event] = {}
+
+    def start(self, project_id: int, root_path: str) -> ProjectWatcher:
+        """
+        Starts watching the project, or returns its running watcher. The
+        initial analysis runs without holding the manager lock, so get() and
+        the watches of other projects are never held up by it.
+        """
+        while True:
+            with self._lock:
+                watcher = self._watchers.get(project_id)
+                if watcher is not None:
+                    return watcher
+                starting = self._starting.get(project_id)
+                if starting is None:
+                    try:
+                        lock = watch_lock(project_id).acquire(blocking=False)
+                    except LockBusy:
+                        raise WatchedElsewhere(f"Project {project_id} is watched by another worker")
+                    starting = self._starting[project_id] = threading.Event()
+                    break
+            # Started by another request of this worker; use its watcher
+            starting.wait()
+
+        try:
+            watcher = ProjectWatcher(project_id, root_path, on_remote_stop=lambda: self.stop(project_id))
+            watcher.start()
+        except BaseException:
+            with self._lock:
+                del self._starting[project_id]
+            lock.release()
+            starting.set()
+            raise
+        with self._lock:
+            del self._starting[project_id]
+            self._watchers[project_id] = watcher
+            self._watch_locks[project_id] = lock
+        starting.set()
+        return watcher
+
+    def stop(self, project_id: int) -> bool:
+        """Stops the watch, here or in the worker running it; False if nobody watches the project."""
+        while True:
+            with self._lock:
+                starting = self._starting.get(project_id)
+                if starting is None:
+                    watcher = self._watchers.pop(project_id, None)
+                    lock = self._watch_locks.pop(project_id, None)
+                    break
+            # Stopped once it has started, so the stop is not lost
+            starting.wait()
+        if watcher is None:
+            return self._request_stop(project_id)
+        watcher.stop()
+        lock.release()
+        return True
+
+    def _request_stop(self, project_id: int) -> bool:
+        if not is_locked(watch_lock(project_id).name):
+            return False
+        # The owner sees the new generation on its next poll
+        with pooled_connection() as conn:
+            bump_generation(conn, watch_scope(project_id))
+            conn.commit()
+        return True
+
+    def get(self, project_id: int) -> Optional[ProjectWatcher]:
+        with self._lock:
+            return self._watchers.get(project_id)
+
+    def watched_elsewhere(self, project_id: int) -> bool:
+        with self._lock:
+            local = project_id in self._watchers or project_id in self._starting
+        return not local and is_locked(watch_lock(project_id).name)
+
+    def stop_all(self):
+        with self._lock:
+            watchers, self._watchers = list(self._watchers.values()), {}
+            locks, self._watch_locks = list(self._watch_locks.values()), {}
+        for watcher in watchers:
+            watcher.stop()
+        for lock in locks:
+            lock.release()
+
+class SnapshotFollower:
+    """
+    Follows a project watched by another worker process, turning the
+    snapshots its watcher stores into the events a local subscriber gets.
+    """
+
+    def __init__(self, project_id: int):
+        self.project_id = project_id
+        with pooled_connection() as conn:
+            self.generations = read_generations(conn, [graph_scope(project_id), watch_scope(project_id)])
+        snapshot = get_latest_snapshot(project_id)
+        self.graph = load_graph(snapshot) if snapshot is not None else None
+        self.etag = snapshot["etag"] if snapshot is not None else None
+
+    def poll(self) -> Optional[List[Dict[str, Any]]]:
+        """Events since the last poll; None once the watch has ended."""
+        with pooled_connection() as conn:
+            generations = read_generations(conn, list(self.generations))
+        if generations[watch_scope(self.project_id)] != self.generations[watch_scope(self.project_id)]:
+            return None
+        if not is_locked(watch_lock(self.project_id).name):
+            return None
+        if generations == self.generations:
+            return []
+
+        self.generations = generations
+        snapshot = get_latest_snapshot(self.project_id)
+        if snapshot is None or snapshot["etag"] == self.etag:
+            return []
+        graph = load_graph(snapshot)
+        if self.graph is None:
+            event = {"type": "resync"}
+        else:
+            event = dict(type="delta", etag=snapshot["etag"], **graph_delta(self.graph, graph))
+        self.graph, self.etag = graph, snapshot["etag"]
+        return [event]
+
+watch_manager = WatchManager()
@@ -4,9 +4,10 @@ interface NotePanelProps {
     isOpen: boolean;
     onClose: () => void;
     filePath: string;
+    projectId?: number;
 }
 
-const NotePanel: React.FC<NotePanelProps> = ({ isOpen, onClose, filePath }) => {
+const NotePanel: React.FC<NotePanelProps> = ({ isOpen, onClose, filePath, projectId }) => {
     const [noteContent, setNoteContent] = useState('');
     const [aiQuery, setAiQuery] = useState('');
     const [aiResponse, setAiResponse] = useState('');
@@ -48,7 +49,7 @@ const NotePanel: React.FC<NotePanelProps> = ({ isOpen, onClose, filePath }) => {
         fetch('http://localhost:5000/api/ai/query', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ file_path: filePath, query: aiQuery })
+            body: JSON.stringify({ file_path: filePath, query: aiQuery, project_id: projectId })
         })
             .then(res => res.json())
             .then(data => setAiResponse(data.response))
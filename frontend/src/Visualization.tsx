@@ -17,6 +17,7 @@ interface Edge {
 interface GraphData {
     nodes: Node[]
     edges: Edge[]
+    positions?: Record<string, { x: number, y: number }>
 }
 
 function Visualization() {
@@ -31,7 +32,7 @@ function Visualization() {
         const fetchGraphData = async () => {
             if (!projectId) return;
             try {
-                const response = await fetch('http://localhost:5000/api/analyze', {
+                const response = await fetch('http://localhost:5000/api/analyze?layout=true', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
@@ -108,7 +109,12 @@ function Visualization() {
                         }
                     }
                 ],
-                layout: {
+                // Positions precomputed by the backend, cose as a fallback
+                layout: graphData.positions ? {
+                    name: 'preset',
+                    positions: graphData.positions,
+                    padding: 50
+                } : {
                     name: 'cose',
                     animate: false,
                     padding: 50,
@@ -183,6 +189,7 @@ function Visualization() {
                         isOpen={isPanelOpen}
                         onClose={() => setIsPanelOpen(false)}
                         filePath={selectedFile || ''}
+                        projectId={projectId ? parseInt(projectId) : undefined}
                     />
                 </div>
             </div>